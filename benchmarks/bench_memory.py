@@ -0,0 +1,82 @@
+"""Measures the memory used per task by Task objects and by a NodeStore.
+
+Usage::
+
+    python benchmarks/bench_memory.py --tasks 100000
+"""
+
+import argparse
+import gc
+import tempfile
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+from terdo.models.node_store import NodeStore
+from terdo.utils.scan import ScannedTask, scan_tree
+
+
+def generate_vault(root: Path, n_tasks: int, per_dir: int) -> None:
+    """Creates n_tasks tasks, nested in directories of per_dir subtasks."""
+    created = 0
+    dirs = [root]
+    while created < n_tasks:
+        parent = dirs.pop(0)
+        for i in range(min(per_dir, n_tasks - created)):
+            name = f"Task {created}"
+            if i == 0 and created + per_dir < n_tasks:
+                (parent / name).mkdir()
+                (parent / name / "_index.md").touch()
+                dirs.append(parent / name)
+            else:
+                (parent / f"{name}.md").touch()
+            created += 1
+        dirs.append(parent)
+
+
+def materialize_all(tasks: list[ScannedTask]) -> list:
+    """Creates a Task object for every task in the scanned tree."""
+    result = []
+    pending = list(tasks)
+    while pending:
+        task = pending.pop()
+        result.append(task.to_task())
+        pending.extend(task.children)
+    return result
+
+
+def measure[T](build: Callable[[], T]) -> tuple[int, T]:
+    """Returns the memory that is still allocated by the result of build."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--per-dir", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        generate_vault(root, args.tasks, args.per_dir)
+
+        tasks_bytes, tasks = measure(lambda: materialize_all(scan_tree(root)))
+        n_tasks = len(tasks)
+        del tasks
+
+        store_bytes, store = measure(lambda: NodeStore.scan(root))
+        assert len(store) == n_tasks
+
+    print(f"{n_tasks} tasks")
+    print(f"Task objects: {tasks_bytes / n_tasks:8.1f} bytes per task")
+    print(f"NodeStore:    {store_bytes / n_tasks:8.1f} bytes per task")
+
+
+if __name__ == "__main__":
+    main()
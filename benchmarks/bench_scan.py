@@ -0,0 +1,86 @@
+"""Benchmarks the parallel tree scan against a sequential one.
+
+Network filesystems add a round trip to every directory listing. That
+latency is simulated by sleeping before each ``scandir`` call, so the
+benchmark shows how well the scan hides it on a local disk.
+
+Usage::
+
+    python benchmarks/bench_scan.py --latency-ms 5 --workers 1 4 16 32
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from terdo.utils.scan import scan_tree
+
+
+def generate_vault(root: Path, breadth: int, depth: int, files: int) -> int:
+    """Creates a tree of tasks and returns the number of directories."""
+    n_dirs = 1
+    for i in range(files):
+        (root / f"Task {i}.md").write_text(f"Task {i}")
+
+    if depth == 0:
+        return n_dirs
+
+    for i in range(breadth):
+        subdir = root / f"Project {i}"
+        subdir.mkdir()
+        (subdir / "_index.md").write_text(f"Project {i}")
+        n_dirs += generate_vault(subdir, breadth, depth - 1, files)
+    return n_dirs
+
+
+def with_latency(latency: float):
+    """Returns a scandir function that waits before listing a directory."""
+
+    @contextmanager
+    def scandir(dir: Path):
+        time.sleep(latency)
+        with os.scandir(dir) as entries:
+            yield entries
+
+    return scandir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--breadth", type=int, default=6)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 4, 16, 32]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        n_dirs = generate_vault(root, args.breadth, args.depth, args.files)
+        scandir = with_latency(args.latency_ms / 1000)
+        print(f"{n_dirs} directories, {args.latency_ms} ms latency per listing")
+
+        baseline = None
+        for workers in args.workers:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                scan_tree(root, max_workers=workers, scandir=scandir)
+                timings.append(time.perf_counter() - start)
+
+            best = min(timings)
+            baseline = baseline or best
+            print(
+                f"workers={workers:>3}  {best * 1000:8.1f} ms"
+                f"  speedup {baseline / best:5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
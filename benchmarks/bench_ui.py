@@ -0,0 +1,282 @@
+"""Measures keypress-to-render latency of the app in scripted sessions.
+
+Every scenario generates a vault, starts the app headless with Textual's
+pilot and times each key press until the app is idle and has refreshed
+the screen. The p50/p95/p99 latency is reported per interaction, together
+with the peak resident memory of the process and the app's counters.
+
+The soak scenario navigates back and forth thousands of times while
+sampling the memory in use. It fails if memory keeps growing between the
+second and the last quarter of the run.
+
+Usage::
+
+    python benchmarks/bench_ui.py --tasks 5000 --steps 1000 --soak-steps 5000
+    python benchmarks/bench_ui.py --scenario navigate search
+"""
+
+import argparse
+import asyncio
+import gc
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from textual.pilot import Pilot
+from textual.widgets import Input
+
+from terdo.components.note import Note
+from terdo.components.task_list import TaskList
+from terdo.main import Terdo
+from terdo.utils.instrumentation import COUNTERS, reset_counters
+from terdo.utils.io import LARGE_FILE_BYTES, set_root_markdown_dir
+
+Latencies = dict[str, list[float]]
+Scenario = Callable[
+    [Terdo, Pilot, Latencies, argparse.Namespace], Awaitable[None]
+]
+
+
+def generate_flat_vault(root: Path, n_tasks: int) -> None:
+    """Creates n_tasks notes in the root directory."""
+    for i in range(n_tasks):
+        (root / f"Task {i}.md").write_text(f"# Task {i}\n\nSome notes.\n")
+
+
+def generate_nested_vault(root: Path, breadth: int, depth: int) -> None:
+    """Creates a tree in which every task has breadth subtasks."""
+    for i in range(breadth):
+        if depth > 0:
+            subdir = root / f"Project {i}"
+            subdir.mkdir()
+            (subdir / "_index.md").write_text(f"# Project {i}\n")
+            generate_nested_vault(subdir, breadth, depth - 1)
+        else:
+            (root / f"Step {i}.md").write_text(f"# Step {i}\n")
+
+
+def generate_large_note(root: Path, n_bytes: int) -> None:
+    """Creates a note of at least n_bytes, of paragraphs with ten lines each.
+
+    From ``LARGE_FILE_BYTES`` on, the note is loaded into the editor in
+    chunks and saved as a stream of lines.
+    """
+    lines = ["# Large note\n\n"]
+    size = len(lines[0])
+    i = 0
+    while size < n_bytes:
+        line = f"Line {i} of a long running log.\n" + ("\n" * (i % 10 == 9))
+        lines.append(line)
+        size += len(line)
+        i += 1
+    (root / "Large note.md").write_text("".join(lines))
+
+
+async def timed_press(
+    pilot: Pilot, latencies: Latencies, interaction: str, key: str
+) -> None:
+    """Presses a key and records how long it takes until it is rendered."""
+    start = time.perf_counter()
+    await pilot.press(key)
+    await pilot.pause()
+    latencies[interaction].append(time.perf_counter() - start)
+
+
+async def navigate(app, pilot, latencies, args) -> None:
+    """Moves down through all tasks with j, and back up with k."""
+    n_tasks = len(app.query_one(TaskList).children)
+    for _ in range(min(n_tasks - 1, args.steps)):
+        await timed_press(pilot, latencies, "j", "j")
+    for _ in range(min(n_tasks - 1, args.steps)):
+        await timed_press(pilot, latencies, "k", "k")
+
+
+async def drill(app, pilot, latencies, args) -> None:
+    """Opens the subtasks of a task with l and goes back up with h."""
+    for _ in range(args.repeat):
+        for _ in range(args.depth):
+            await timed_press(pilot, latencies, "l", "l")
+        for _ in range(args.depth):
+            await timed_press(pilot, latencies, "h", "h")
+        await timed_press(pilot, latencies, "j", "j")
+
+
+async def search(app, pilot, latencies, args) -> None:
+    """Types a query into the search input, one character at a time."""
+    for _ in range(args.repeat):
+        await timed_press(pilot, latencies, "s (focus search)", "s")
+        for character in "task 12":
+            key = "space" if character == " " else character
+            await timed_press(pilot, latencies, "type in search", key)
+        app.query_one(Input).value = ""
+        await timed_press(pilot, latencies, "escape", "escape")
+
+
+async def edit(app, pilot, latencies, args) -> None:
+    """Opens a large note in the editor, types, saves and closes it."""
+    task_list = app.query_one(TaskList)
+    names = [item.task_instance.name for item in task_list.children]
+    task_list.index = names.index("Large note")
+    app.query_one(Note).query_one("#note-viewer-container").focus()
+    await pilot.pause()
+
+    for _ in range(args.repeat):
+        await timed_press(pilot, latencies, "e (open editor)", "e")
+        for character in "edit":
+            await timed_press(pilot, latencies, "type in editor", character)
+        await timed_press(pilot, latencies, "ctrl+s (save)", "ctrl+s")
+        await app.workers.wait_for_complete()
+        await timed_press(pilot, latencies, "escape (close)", "escape")
+        await app.workers.wait_for_complete()
+        app.query_one(Note).query_one("#note-viewer-container").focus()
+
+
+def live_memory(trace: bool) -> int:
+    """Returns the traced bytes, or the number of live objects by default."""
+    gc.collect()
+    if trace:
+        return tracemalloc.get_traced_memory()[0]
+    return len(gc.get_objects())
+
+
+async def soak(app, pilot, latencies, args) -> None:
+    """Navigates for a long time and checks that memory doesn't grow.
+
+    Counting the live objects is cheap enough to sample during thousands
+    of key presses, while tracing every allocation slows the app down a
+    lot. That is only done with ``--tracemalloc``.
+    """
+    if args.tracemalloc:
+        tracemalloc.start()
+    unit = "KiB" if args.tracemalloc else "objects"
+    scale = 1024 if args.tracemalloc else 1
+
+    samples: list[int] = []
+    n_tasks = len(app.query_one(TaskList).children)
+    sweep = max(1, min(n_tasks - 1, 50))
+    for step in range(args.soak_steps):
+        # Sweep down and up through the first part of the list
+        key = "j" if (step // sweep) % 2 == 0 else "k"
+        await timed_press(pilot, latencies, "soak", key)
+        if step % args.sample_every == 0:
+            samples.append(live_memory(args.tracemalloc))
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    # The first quarter is skipped, because caches fill up while warming up
+    quarter = max(1, len(samples) // 4)
+    second = statistics.mean(samples[quarter : 2 * quarter])
+    last = statistics.mean(samples[-quarter:])
+    growth = (last - second) / scale
+    print(
+        f"  soak: {len(samples)} samples, {second / scale:.0f} -> "
+        f"{last / scale:.0f} {unit} ({growth:+.0f} {unit})"
+    )
+    limit = args.max_growth_kib if args.tracemalloc else args.max_growth_objects
+    if growth > limit:
+        # Reported after the latencies of all scenarios
+        args.failures.append(
+            f"Memory grew by {growth:.0f} {unit} during the soak run"
+        )
+
+
+SCENARIOS: dict[str, tuple[Scenario, str]] = {
+    "navigate": (navigate, "flat"),
+    "drill": (drill, "nested"),
+    "search": (search, "flat"),
+    "edit": (edit, "large"),
+    "soak": (soak, "soak"),
+}
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(name: str, latencies: Latencies) -> None:
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kib //= 1024
+    print(f"{name}: peak RSS {peak_kib / 1024:.0f} MiB")
+    print(f"  {'interaction':<20} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for interaction, values in latencies.items():
+        print(
+            f"  {interaction:<20} {len(values):>6}"
+            + "".join(
+                f" {percentile(values, q) * 1000:>6.1f}ms"
+                for q in (0.5, 0.95, 0.99)
+            )
+        )
+    counters = ", ".join(f"{k}={v}" for k, v in sorted(COUNTERS.items()))
+    print(f"  counters: {counters}")
+
+
+async def run_scenario(name: str, args: argparse.Namespace) -> None:
+    scenario, vault = SCENARIOS[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        if vault == "nested":
+            generate_nested_vault(root, args.breadth, args.depth)
+        elif vault == "soak":
+            generate_flat_vault(root, args.soak_tasks)
+        else:
+            generate_flat_vault(root, args.tasks)
+        if vault == "large":
+            generate_large_note(root, args.note_bytes)
+        set_root_markdown_dir(root)
+
+        app = Terdo(resume_session=False)
+        async with app.run_test(size=(120, 40)) as pilot:
+            # Wait for the background indexing that starts with the app
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            reset_counters()
+
+            latencies: Latencies = defaultdict(list)
+            await scenario(app, pilot, latencies, args)
+            report(name, latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--scenario", nargs="+", choices=list(SCENARIOS), default=None
+    )
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument(
+        "--steps", type=int, default=200, help="Key presses per direction."
+    )
+    parser.add_argument("--breadth", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument(
+        "--note-bytes",
+        type=int,
+        default=2 * LARGE_FILE_BYTES,
+        help="Size of the note in the edit scenario.",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--soak-tasks", type=int, default=200)
+    parser.add_argument("--soak-steps", type=int, default=2000)
+    parser.add_argument("--sample-every", type=int, default=100)
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--max-growth-kib", type=float, default=1024)
+    parser.add_argument("--max-growth-objects", type=float, default=20_000)
+    args = parser.parse_args()
+
+    args.failures = []
+    for name in args.scenario or list(SCENARIOS):
+        asyncio.run(run_scenario(name, args))
+
+    if args.failures:
+        raise SystemExit("\n".join(args.failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import shutil
+import signal
+from pathlib import Path
+
+from terdo.models.sorting import SortOrder, sort_tasks
+from terdo.models.task import Task
+from terdo.utils.compression import (
+    COMPRESSED_SUFFIXES,
+    GZIP_SUFFIX,
+    archive_notes,
+)
+from terdo.utils.daemon import (
+    POLL_INTERVAL,
+    DaemonError,
+    VaultDaemon,
+    connect_to_daemon,
+    get_socket_path,
+)
+from terdo.utils.export import ExportFormat, export_vault
+from terdo.utils.importer import import_outline
+from terdo.utils.io import get_default_export_dir, get_root_markdown_dir
+from terdo.utils.scan import scan_tasks_in_dir
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Builds the parser for the command line interface of Terdo."""
+    parser = argparse.ArgumentParser(
+        prog="terdo", description="A terminal todo app!"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    import_parser = subparsers.add_parser(
+        "import", help="Import tasks from a markdown, todo.txt or CSV file."
+    )
+    import_parser.add_argument("source", type=Path)
+    import_parser.add_argument(
+        "--into",
+        type=Path,
+        default=None,
+        help="Directory to import into (defaults to the root directory).",
+    )
+
+    list_parser = subparsers.add_parser(
+        "list", help="List the tasks in a directory."
+    )
+    list_parser.add_argument(
+        "dir",
+        type=Path,
+        nargs="?",
+        default=None,
+        help="Directory to list (defaults to the root directory).",
+    )
+    list_parser.add_argument(
+        "--sort",
+        type=SortOrder,
+        choices=list(SortOrder),
+        default=SortOrder.LAST_EDITED,
+    )
+    list_parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Number of tasks to show (defaults to the terminal height).",
+    )
+
+    export_parser = subparsers.add_parser(
+        "export", help="Export all notes to HTML pages or JSON files."
+    )
+    export_parser.add_argument(
+        "output",
+        type=Path,
+        nargs="?",
+        default=None,
+        help="Directory to export to (defaults to ./export).",
+    )
+    export_parser.add_argument(
+        "--format",
+        type=ExportFormat,
+        choices=list(ExportFormat),
+        default=ExportFormat.HTML,
+    )
+    export_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (defaults to the number of CPUs).",
+    )
+
+    archive_parser = subparsers.add_parser(
+        "archive", help="Compress the notes that were not edited for a while."
+    )
+    archive_parser.add_argument(
+        "--days",
+        type=float,
+        required=True,
+        help="Compress the notes that were not edited for this many days.",
+    )
+    archive_parser.add_argument(
+        "--format",
+        choices=[suffix.removeprefix(".md.") for suffix in COMPRESSED_SUFFIXES],
+        default=GZIP_SUFFIX.removeprefix(".md."),
+        help="gz, or zst when the zstandard package is installed.",
+    )
+
+    daemon_parser = subparsers.add_parser(
+        "daemon",
+        help="Keep the vault scanned in the background for all instances.",
+    )
+    daemon_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=POLL_INTERVAL,
+        help="Seconds between checks for changes on disk.",
+    )
+
+    return parser
+
+
+def run_import(args: argparse.Namespace) -> int:
+    target_dir = args.into or get_root_markdown_dir()
+    n_created = import_outline(args.source, target_dir)
+    print(f"Imported {n_created} tasks into {target_dir}.")
+    return 0
+
+
+def load_tasks(dir: Path) -> list[Task]:
+    """Loads the tasks in a directory from the daemon, if it runs."""
+    daemon = connect_to_daemon()
+    if daemon is not None:
+        try:
+            return [task.to_task() for task in daemon.scan(dir)]
+        except (DaemonError, OSError):
+            pass
+        finally:
+            daemon.close()
+    return scan_tasks_in_dir(dir)
+
+
+def run_list(args: argparse.Namespace) -> int:
+    dir = args.dir or get_root_markdown_dir()
+    limit = args.limit
+    if limit is None:
+        limit = max(1, shutil.get_terminal_size().lines - 1)
+
+    # Only a screenful is shown, so the first tasks are selected instead of
+    # sorting the whole directory.
+    tasks = sort_tasks(load_tasks(dir), args.sort, limit=limit)
+    for task in tasks:
+        n_subtasks = task.n_subtasks
+        print(task.name + (f" ({n_subtasks})" if n_subtasks else ""))
+    return 0
+
+
+def run_export(args: argparse.Namespace) -> int:
+    output_dir = args.output or get_default_export_dir()
+    result = export_vault(
+        get_root_markdown_dir(), output_dir, args.format, args.workers
+    )
+    print(
+        f"Exported {result.n_rendered} notes to {output_dir} "
+        f"({result.n_unchanged} unchanged, {result.n_removed} removed)."
+    )
+    return 0
+
+
+def run_archive(args: argparse.Namespace) -> int:
+    root = get_root_markdown_dir()
+    try:
+        archived = archive_notes(root, args.days, f".md.{args.format}")
+    except OSError as error:
+        print(error)
+        return 1
+    print(f"Compressed {len(archived)} notes in {root}.")
+    return 0
+
+
+def run_daemon(args: argparse.Namespace) -> int:
+    root = get_root_markdown_dir()
+    try:
+        daemon = VaultDaemon(root, poll_interval=args.poll_interval)
+    except OSError as error:
+        print(error)
+        return 1
+
+    async def serve() -> None:
+        # Shut down cleanly, so that the socket is removed
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, daemon.stop)
+        await daemon.serve()
+
+    print(f"Serving {root} on {get_socket_path(root)}.")
+    try:
+        asyncio.run(serve())
+    except DaemonError as error:
+        print(error)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point of the command line interface.
+
+    Without a subcommand, the Terdo app is started.
+    """
+    args = build_parser().parse_args(argv)
+
+    if args.command == "import":
+        return run_import(args)
+    if args.command == "list":
+        return run_list(args)
+    if args.command == "export":
+        return run_export(args)
+    if args.command == "archive":
+        return run_archive(args)
+    if args.command == "daemon":
+        return run_daemon(args)
+
+    # Imported here so that the subcommands don't need to load Textual
+    from terdo.main import Terdo
+
+    Terdo().run()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
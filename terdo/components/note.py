@@ -1,19 +1,102 @@
+import asyncio
+from pathlib import Path
+from urllib.parse import quote
+
+from markdown_it import MarkdownIt
 from textual.app import ComposeResult
 from textual.widgets import Markdown, TextArea
 from textual.containers import VerticalScroll
 from textual.widget import Widget
 from textual.reactive import reactive
 from textual.message import Message
-from textual import on
+from textual import on, work
+from terdo.models.links import (
+    WIKILINK_SCHEME,
+    get_link_index,
+    task_name_of,
+    wikilink_target,
+    wikilinks_to_markdown,
+)
+from terdo.models.metadata import FRONT_MATTER_DELIMITER
 from terdo.models.task import Task
+from terdo.utils.compression import is_compressed
+from terdo.utils.instrumentation import increment
+from terdo.utils.io import LARGE_FILE_BYTES, iter_text_chunks
+from terdo.utils.mutations import get_mutation_queue
+
+
+# The preview is rendered when no key was pressed for this many seconds
+PREVIEW_DEBOUNCE = 0.3
+
+
+def format_front_matter(content: str) -> str:
+    """Shows the front matter of a note as a YAML block instead of markdown.
+
+    Otherwise the closing delimiter turns the last line of the front matter
+    into a heading.
+    """
+    if not content.startswith(FRONT_MATTER_DELIMITER + "\n"):
+        return content
+
+    end = content.find("\n" + FRONT_MATTER_DELIMITER, 3)
+    if end == -1:
+        return content
+
+    front_matter = content[4 : end + 1]
+    body = content[end + 1 + len(FRONT_MATTER_DELIMITER) :]
+    return f"```yaml\n{front_matter}```\n{body}"
+
+
+def to_viewer_markdown(content: str) -> str:
+    """Prepares the content of a note to be shown by a Markdown widget."""
+    return wikilinks_to_markdown(format_front_matter(content))
+
+
+def split_markdown_blocks(content: str) -> list[str]:
+    """Splits markdown into the source text of its top-level blocks.
+
+    Paragraphs, headings, lists, code blocks and so on each become one
+    block, so a block can be rendered on its own.
+    """
+    lines = content.splitlines(keepends=True)
+    return [
+        "".join(lines[token.map[0] : token.map[1]])
+        for token in MarkdownIt("gfm-like").parse(content)
+        if token.level == 0 and token.map is not None
+    ]
+
+
+def format_backlinks(task: Task) -> str:
+    """Lists the notes that link to a task, as a markdown section."""
+    sources = get_link_index().backlinks(task.name) - {task.path_to_file}
+    if not sources:
+        return ""
+
+    names = sorted({task_name_of(path) for path in sources}, key=str.casefold)
+    links = "\n".join(
+        f"- [{name}]({WIKILINK_SCHEME}{quote(name)})" for name in names
+    )
+    return f"\n\n---\n\n## Backlinks\n\n{links}\n"
 
 
 class NoteEditor(TextArea):
     BINDINGS = [
         ("ctrl+s", "save", "Save"),
         ("escape", "close", "Close editor"),
+        ("ctrl+r", "toggle_preview", "Preview"),
     ]
 
+    class TogglePreview(Message):
+        sender: "NoteEditor"
+
+        def __init__(self, sender: "NoteEditor") -> None:
+            self.sender = sender
+            super().__init__()
+
+        @property
+        def control(self) -> "NoteEditor":
+            return self.sender
+
     class Save(Message):
         sender: "NoteEditor"
         close_editor: bool
@@ -33,6 +116,63 @@ class NoteEditor(TextArea):
     async def action_close(self) -> None:
         self.post_message(self.Save(self, True))
 
+    def action_toggle_preview(self) -> None:
+        self.post_message(self.TogglePreview(self))
+
+
+class NotePreview(VerticalScroll):
+    """Shows the note that is being edited, next to the editor.
+
+    Every top-level block of the note is shown by its own Markdown widget,
+    so after an edit only the blocks that changed are rendered again. Link
+    reference definitions only apply within their own block.
+    """
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._blocks: list[str] = []
+        self._lock = asyncio.Lock()
+
+    async def show_blocks(self, blocks: list[str]) -> None:
+        """Shows the given blocks, rendering only those that changed."""
+        async with self._lock:
+            old_blocks = self._blocks
+            widgets = list(self.query_children(Markdown))
+
+            # Edits usually touch a few blocks, with everything before and
+            # after them unchanged.
+            n_same = min(len(old_blocks), len(blocks))
+            start = 0
+            while start < n_same and old_blocks[start] == blocks[start]:
+                start += 1
+            end = 0
+            while (
+                end < n_same - start
+                and old_blocks[-1 - end] == blocks[-1 - end]
+            ):
+                end += 1
+
+            changed_widgets = widgets[start : len(widgets) - end]
+            changed_blocks = blocks[start : len(blocks) - end]
+            for widget, block in zip(changed_widgets, changed_blocks):
+                await widget.update(block)
+            if len(changed_widgets) > len(changed_blocks):
+                await self.remove_children(
+                    changed_widgets[len(changed_blocks) :]
+                )
+            elif len(changed_blocks) > len(changed_widgets):
+                anchor = widgets[len(widgets) - end] if end else None
+                await self.mount_all(
+                    [
+                        Markdown(block, open_links=False)
+                        for block in changed_blocks[len(changed_widgets) :]
+                    ],
+                    before=anchor,
+                )
+
+            self._blocks = blocks
+            increment("preview.blocks_rendered", len(changed_blocks))
+
 
 class VimVerticalScroll(VerticalScroll):
     """A subclass of VerticalScroll that adds some Vim keybindngs to the keyboard controls."""
@@ -45,6 +185,10 @@ class VimVerticalScroll(VerticalScroll):
 
 class Note(Widget):
     task_item: reactive[Task | None] = reactive(None)
+    # Whether the preview is shown next to the editor, kept between notes
+    preview_open: bool = False
+    # Set while a large note is loaded into the editor, see _load_large_note
+    loading_note: bool = False
 
     can_focus = False
     can_focus_children = True
@@ -54,7 +198,18 @@ class Note(Widget):
     ]
 
     class RerenderTaskList(Message):
-        pass
+        """Sent after the note of a task was saved."""
+
+        def __init__(self, task: Task) -> None:
+            self.task = task
+            super().__init__()
+
+    class OpenTask(Message):
+        """Sent when a link to another task is followed."""
+
+        def __init__(self, task: Task) -> None:
+            self.task = task
+            super().__init__()
 
     def compose(self) -> ComposeResult:
         with VimVerticalScroll(
@@ -63,7 +218,7 @@ class Note(Widget):
             can_maximize=True,
             id="note-viewer-container",
         ):
-            yield Markdown("", id="note-viewer")
+            yield Markdown("", id="note-viewer", open_links=False)
         yield NoteEditor(
             "",
             language="markdown",
@@ -71,16 +226,34 @@ class Note(Widget):
             classes="hidden",
             show_line_numbers=True,
         )
+        yield NotePreview(id="note-preview", classes="hidden")
 
     async def watch_task_item(self) -> None:
         await self.reload_content()
 
     async def reload_content(self) -> None:
+        increment("note.reloads")
         markdown_element = self.query_one("#note-viewer", Markdown)
         if self.task_item is None:
             await markdown_element.update("# No notes found.")
         else:
-            await markdown_element.update(self.task_item.content)
+            await markdown_element.update(
+                to_viewer_markdown(self.task_item.content)
+                + format_backlinks(self.task_item)
+            )
+
+    @on(Markdown.LinkClicked, "#note-viewer")
+    def follow_link(self, event: Markdown.LinkClicked) -> None:
+        name = wikilink_target(event.href)
+        if name is None:
+            self.app.open_url(event.href)
+            return
+
+        path = get_link_index().resolve(name)
+        if path is None:
+            self.app.notify(f"No task named {name} found.", severity="warning")
+            return
+        self.post_message(self.OpenTask(Task.from_note_path(path)))
 
     async def action_edit(self) -> None:
         if self.task_item is None:
@@ -100,24 +273,62 @@ class Note(Widget):
         textarea_element.remove_class("hidden")
 
         # Load the content of the markdown note into the textarea element
-        if textarea_element.text != self.task_item.content:
-            textarea_element.text = self.task_item.content
+        path = self.task_item.path_to_file
+        # Compressed notes are decompressed into the cache when viewed, so
+        # they are loaded from there.
+        if not is_compressed(path) and path.stat().st_size >= LARGE_FILE_BYTES:
+            await self._load_large_note(textarea_element, path)
+        else:
+            self._set_editor_language(textarea_element, "markdown")
+            content = self.task_item.content
+            if textarea_element.text != content:
+                textarea_element.text = content
 
         # Set the cursor to the end of the text. TODO: make it more flexible
         # to place the cursor where the user wants it.
-        lines = self.task_item.content.split("\n")
-        num_lines = len(lines)
-        num_chars_in_last_line = len(lines[-1])
-        textarea_element.cursor_location = (
-            num_lines - 1,
-            num_chars_in_last_line,
-        )
+        textarea_element.cursor_location = textarea_element.document.end
         textarea_element.insert(" ")
+        if self.preview_open:
+            self._show_preview(True)
 
         # Lastly, focus the textarea element so that the user can start typing
         # immediately.
         textarea_element.focus()
 
+    @staticmethod
+    def _set_editor_language(textarea: TextArea, language: str | None) -> None:
+        if textarea.language != language:
+            # Changing the language rebuilds the document from its text, so
+            # the previous note is dropped first.
+            textarea.load_text("")
+            textarea.language = language
+
+    async def _load_large_note(self, textarea: TextArea, path: Path) -> None:
+        """Loads a large note into the editor one chunk at a time.
+
+        The note is read from a memory map, and the app can repaint between
+        chunks. Syntax highlighting is turned off, because it would parse
+        the whole document again after every chunk.
+
+        The note can't be saved until all chunks are loaded, because that
+        would cut it off at the chunks that are loaded so far.
+        """
+        self._set_editor_language(textarea, None)
+        self.loading_note = True
+        textarea.read_only = True
+        try:
+            chunks = iter_text_chunks(path)
+            textarea.load_text(next(chunks, ""))
+            for chunk in chunks:
+                textarea.insert(chunk, textarea.document.end)
+                # Loading is not an edit that can be undone, and the history
+                # would keep a second copy of every chunk.
+                textarea.history.clear()
+                await asyncio.sleep(0)
+        finally:
+            textarea.read_only = False
+            self.loading_note = False
+
     @on(NoteEditor.Save, "#note-editor")
     async def save(self, event: NoteEditor.Save) -> None:
         textarea_element = self.query_one("#note-editor", TextArea)
@@ -125,26 +336,108 @@ class Note(Widget):
             self.app.notify(
                 "Can't save because no note is selected.", severity="warning"
             )
+            return
+        if self.loading_note:
+            self.app.notify(
+                "Can't save while the note is still loading.",
+                severity="warning",
+            )
+            return
+
+        # The lines are written as they are, instead of joining them into
+        # one string, which matters for large notes. They are copied because
+        # the editor can change while the note is written in the background.
+        lines = list(textarea_element.document.lines)
+        # The line endings of the note are kept, e.g. \r\n
+        newline = textarea_element.document.newline
+
+        if event.close_editor:
+            # Hide the textarea element, and show the markdown element again
+            # without waiting for the note to be written.
+            self._show_editor(False)
+
+        self.run_worker(
+            self._write_note(
+                self.task_item, lines, newline, event.close_editor
+            ),
+            group="vault-mutations",
+        )
 
-        self.task_item.write(textarea_element.text.strip())  # type: ignore
+    def _show_editor(self, show: bool) -> None:
+        markdown_element = self.query_one(
+            "#note-viewer-container", VimVerticalScroll
+        )
+        textarea_element = self.query_one("#note-editor", TextArea)
+        markdown_element.set_class(show, "hidden")
+        textarea_element.set_class(not show, "hidden")
+        self._show_preview(show and self.preview_open)
+        if show:
+            textarea_element.focus()
+
+    def _show_preview(self, show: bool) -> None:
+        preview = self.query_one("#note-preview", NotePreview)
+        if show == preview.has_class("hidden"):
+            preview.set_class(not show, "hidden")
+            self.set_class(show, "previewing")
+            if show:
+                self.render_preview(debounce=False)
+
+    @on(NoteEditor.TogglePreview, "#note-editor")
+    def toggle_preview(self) -> None:
+        self.preview_open = not self.preview_open
+        self._show_preview(self.preview_open)
+
+    @on(TextArea.Changed, "#note-editor")
+    def schedule_preview(self) -> None:
+        if self.has_class("previewing"):
+            self.render_preview()
+
+    @work(exclusive=True, group="note-preview")
+    async def render_preview(self, debounce: bool = True) -> None:
+        """Renders the text in the editor in the preview.
+
+        Starting another render cancels this one, so while typing only the
+        last edit is rendered, and the result of a render that was overtaken
+        by a newer edit is dropped. The text is split into blocks in a
+        thread, away from the event loop.
+        """
+        preview = self.query_one("#note-preview", NotePreview)
+        if debounce:
+            await asyncio.sleep(PREVIEW_DEBOUNCE)
+        text = self.query_one("#note-editor", TextArea).text
+        blocks = await asyncio.to_thread(
+            lambda: split_markdown_blocks(to_viewer_markdown(text))
+        )
+        # Once started, showing the blocks is finished even if a newer edit
+        # cancels this render, so the preview knows which blocks it shows.
+        await asyncio.shield(preview.show_blocks(blocks))
 
-        if not event.close_editor:
+    async def _write_note(
+        self, task: Task, lines: list[str], newline: str, close_editor: bool
+    ) -> None:
+        try:
+            await get_mutation_queue().run(
+                lambda: task.write_lines(lines, newline)
+            )
+        except (OSError, ValueError) as error:
+            self.app.notify(
+                str(error), title="Could not save the note", severity="error"
+            )
+            if close_editor:
+                # The text is still in the editor, so nothing is lost
+                self._show_editor(True)
+            return
+
+        if not close_editor:
             # When only saving but not closing the editor, we want to
             # display a notification so that the user has a visual
             # confirmation that the note was saved.
             self.app.notify("Note saved successfully!")
+            return
 
-        if event.close_editor:
-            # Hide the textarea element, and show the markdown element again
-            markdown_element = self.query_one(
-                "#note-viewer-container", VimVerticalScroll
-            )
-            markdown_element.remove_class("hidden")
-            textarea_element.add_class("hidden")
-
-            # Reload the task list, because that is ordered by the last
-            # modified date of the note. This is needed because the
-            # markdown file was modified, and the task list needs to be
-            # updated to reflect that.
-            self.post_message(self.RerenderTaskList())
-            await self.reload_content()
+        # Reload the task list, because that is ordered by the last
+        # modified date of the note. This is needed because the
+        # markdown file was modified, and the task list needs to be
+        # updated to reflect that.
+        self.post_message(self.RerenderTaskList(task))
+        await self.reload_content()
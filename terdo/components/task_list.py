@@ -1,20 +1,48 @@
+from bisect import bisect_left
+from collections.abc import Callable
+from datetime import datetime
 from pathlib import Path
 
 from textual.widget import Widget
 from textual.widgets import ListView, ListItem, Label, Button, Input
 from textual.screen import ModalScreen
-from textual.containers import Grid, Horizontal
+from textual.containers import Grid, Horizontal, Vertical
 from textual.app import ComposeResult
 from textual.message import Message
 from textual import on
 from textual.events import Blur
 
+from terdo.models.links import get_link_index, replace_wikilinks
+from terdo.models.metadata import get_metadata_index
 from terdo.models.task import Task
+from terdo.utils.importer import import_outline
+from terdo.utils.instrumentation import increment
 from terdo.utils.io import (
     create_new_markdown_file,
     get_default_new_file_name,
     get_root_markdown_dir,
 )
+from terdo.utils.mutations import get_mutation_queue
+
+
+def format_age(when: datetime, now: datetime | None = None) -> str:
+    """Formats a time as a short age, like ``5m``, ``3h`` or ``2d``."""
+    seconds = ((now or datetime.now()) - when).total_seconds()
+    for unit, length in (("y", 365 * 86400), ("d", 86400), ("h", 3600)):
+        if seconds >= length:
+            return f"{int(seconds // length)}{unit}"
+    return f"{max(0, int(seconds // 60))}m"
+
+
+def format_size(size: int) -> str:
+    """Formats a number of bytes, like ``512 B`` or ``3.4 kB``."""
+    if size < 1000:
+        return f"{size} B"
+    for unit in ("kB", "MB"):
+        size /= 1000
+        if size < 1000:
+            return f"{size:.1f} {unit}"
+    return f"{size / 1000:.1f} GB"
 
 
 class ChangeNameInput(Input):
@@ -43,8 +71,10 @@ class ChangeNameInput(Input):
         def __init__(
             self,
             sender: "ChangeNameInput",
+            new_name: str,
         ) -> None:
             self.sender: "ChangeNameInput" = sender
+            self.new_name: str = new_name
             super().__init__()
 
         @property
@@ -56,8 +86,8 @@ class ChangeNameInput(Input):
         super().__init__(value=task_instance.name, **kwargs)
 
     async def action_submit(self) -> None:
-        self.task_instance.rename(self.value)
-        self.post_message(self.ConfirmChangeName(self))
+        # The task itself is renamed by the task list, in the background
+        self.post_message(self.ConfirmChangeName(self, self.value))
 
     def action_cancel_change_name(self) -> None:
         self.post_message(
@@ -98,11 +128,168 @@ class DeleteTaskModal(ModalScreen[bool]):
         self.dismiss(True)
 
 
+class RewriteLinksModal(ModalScreen[bool]):
+    """Screen with a dialog to rewrite the links to a renamed task."""
+
+    def __init__(self, new_name: str, n_notes: int, **kwargs) -> None:
+        self.new_name = new_name
+        self.n_notes = n_notes
+        super().__init__(**kwargs)
+
+    def compose(self) -> ComposeResult:
+        notes = "note links" if self.n_notes == 1 else "notes link"
+        yield Grid(
+            Label(
+                f"{self.n_notes} {notes} to the old name. Rewrite to:",
+                id="question",
+            ),
+            Label(self.new_name, id="new-name"),
+            Button("Keep", variant="primary", id="cancel"),
+            Button("Rewrite", variant="success", id="rewrite"),
+            id="dialog",
+        )
+
+    @on(Button.Pressed, "#cancel")
+    def close_modal(self) -> None:
+        self.dismiss(False)
+
+    @on(Button.Pressed, "#rewrite")
+    def confirm_rewrite(self) -> None:
+        self.dismiss(True)
+
+
+def run_vault_mutation[T](
+    widget: Widget,
+    description: str,
+    mutation: Callable[[], T],
+    on_success: Callable[[T], object] | None = None,
+    on_failure: Callable[[], object] | None = None,
+) -> None:
+    """Applies a change to the vault in the background, for a widget.
+
+    The change goes through the mutation queue, so the event loop never
+    waits for the disk. ``on_success`` gets the result of the change. If the
+    change fails, the user is notified and ``on_failure`` is called, e.g. to
+    reload what the widget shows from disk.
+    """
+
+    async def apply() -> None:
+        try:
+            result = await get_mutation_queue().run(mutation)
+        except (OSError, ValueError) as error:
+            widget.app.notify(
+                str(error), title=f"Could not {description}", severity="error"
+            )
+            if on_failure is not None:
+                on_failure()
+            return
+
+        if on_success is not None:
+            on_success(result)
+
+    widget.run_worker(apply(), group="vault-mutations")
+
+
+def offer_to_rewrite_links(
+    widget: Widget,
+    old_name: str,
+    new_name: str,
+    on_rewritten: Callable[[], None] | None = None,
+) -> None:
+    """Asks whether the links to a renamed task should follow the new name.
+
+    The notes are rewritten in the background, through the mutation queue.
+    ``on_rewritten`` is called afterwards, e.g. to show the changed notes,
+    also when rewriting failed halfway.
+    """
+    if old_name == new_name:
+        return
+    sources = get_link_index().backlinks(old_name)
+    if not sources:
+        return
+
+    app = widget.app
+
+    def rewrite() -> None:
+        for path in sources:
+            task = Task.from_note_path(path)
+            task.write(replace_wikilinks(task.content, old_name, new_name))
+
+    def rewritten(_: None) -> None:
+        app.notify(f"Rewrote the links in {len(sources)} notes.")
+        if on_rewritten is not None:
+            on_rewritten()
+
+    def rewrite_links(confirmed: bool | None) -> None:
+        if confirmed:
+            run_vault_mutation(
+                widget, "rewrite the links", rewrite, rewritten, on_rewritten
+            )
+
+    app.push_screen(RewriteLinksModal(new_name, len(sources)), rewrite_links)
+
+
+class ImportOutlineModal(ModalScreen[Path | None]):
+    """Screen with a dialog to import tasks from an outline file."""
+
+    def compose(self) -> ComposeResult:
+        yield Grid(
+            Label(
+                "Import tasks from a markdown, todo.txt or CSV file:",
+                id="question",
+            ),
+            Input(placeholder="Path to file...", id="import-path"),
+            Button("Cancel", variant="primary", id="cancel"),
+            Button("Import", variant="success", id="import"),
+            id="dialog",
+        )
+
+    @on(Button.Pressed, "#cancel")
+    def close_modal(self) -> None:
+        self.dismiss(None)
+
+    @on(Button.Pressed, "#import")
+    @on(Input.Submitted, "#import-path")
+    def confirm_import(self) -> None:
+        path = self.query_one("#import-path", Input).value.strip()
+        self.dismiss(Path(path).expanduser() if path else None)
+
+
+def _longest_increasing_subsequence(values: list[int]) -> set[int]:
+    """Returns the positions of a longest increasing subsequence of values."""
+    # tails[i] is the position of the smallest value that ends an increasing
+    # subsequence of length i + 1, and previous links back through it.
+    tails: list[int] = []
+    tail_values: list[int] = []
+    previous: list[int] = [-1] * len(values)
+
+    for position, value in enumerate(values):
+        length = bisect_left(tail_values, value)
+        if length > 0:
+            previous[position] = tails[length - 1]
+        if length == len(tails):
+            tails.append(position)
+            tail_values.append(value)
+        else:
+            tails[length] = position
+            tail_values[length] = value
+
+    result: set[int] = set()
+    position = tails[-1] if tails else -1
+    while position != -1:
+        result.add(position)
+        position = previous[position]
+    return result
+
+
 class TaskListItem(ListItem):
     task_instance: Task
+    # What the row currently shows, so that it is only rebuilt on a change
+    row_signature: tuple | None
 
     def __init__(self, task: Task, *children: Widget, **kwargs) -> None:
         self.task_instance = task
+        self.row_signature = None
         super().__init__(*children, **kwargs)
 
     def set_task(self, task: Task) -> "TaskListItem":
@@ -173,42 +360,223 @@ class TaskList(ListView):
         ("M", "move_task_to", "Move Into"),
         ("P", "move_task_to_parent", "Move To Parent"),
         ("c", "cancel_action", "Cancel Action"),
+        ("i", "import_outline", "Import"),
     ]
 
     markdown_dir: Path
     task_to_move: Task | None
+    # Shown instead of the excerpt, e.g. the matching line of a content search
+    match_context: dict[Path, str]
 
     def __init__(self, markdown_dir: Path, **kwargs) -> None:
         self.markdown_dir = markdown_dir
         self.task_to_move = None
+        self.match_context = {}
         super().__init__(**kwargs)
 
-    @staticmethod
-    def _create_task_list_item_children(task: Task) -> Horizontal:
-        labels = [Label(" "), Label(task.name)]
+    def _create_task_list_item_children(
+        self, task: Task, name: str | None = None
+    ) -> Horizontal:
+        labels = [Label(" "), Label(task.name if name is None else name)]
         n_subtasks = task.n_subtasks
         if n_subtasks > 0:
             labels.append(Label(f"({n_subtasks})", classes="task-info"))
 
-        return Horizontal(*labels, classes="task-description")
+        excerpt, stats = self._row_details(task)
+        return Vertical(
+            Horizontal(*labels, classes="task-description"),
+            Horizontal(
+                Label(excerpt, classes="task-excerpt"),
+                Label(stats, classes="task-stats"),
+                classes="task-details",
+            ),
+            classes="task-row",
+        )
+
+    def _row_details(self, task: Task) -> tuple[str, str]:
+        """Returns the excerpt and the age and size shown below the name.
+
+        The excerpt comes from the metadata index, which only reads the head
+        of a note that isn't indexed yet, so a row never reads a whole note.
+        """
+        stats = f"{format_age(task.last_edited)} · {format_size(task.size)}"
+        context = self.match_context.get(self.task_key(task))
+        if context is not None:
+            return context, stats
+        metadata = get_metadata_index().get_or_read(task.path_to_file)
+        return metadata.excerpt, stats
+
+    def _row_signature(self, task: Task) -> tuple:
+        return (
+            task.name,
+            task.n_subtasks,
+            self._row_details(task),
+            self.task_to_move == task,
+        )
 
     def _create_task_list_item(self, task: Task) -> TaskListItem:
         additional_classes = ""
         if self.task_to_move == task:
             additional_classes += " task-to-move"
 
-        return TaskListItem(
+        item = TaskListItem(
             task,
             self._create_task_list_item_children(task),
             name=task.name,
             classes="task" + additional_classes,
         )
+        item.row_signature = self._row_signature(task)
+        return item
+
+    def _update_task_list_item(self, item: TaskListItem, task: Task) -> None:
+        """Points an existing row to a new task and rebuilds it if needed."""
+        item.set_task(task)
+        signature = self._row_signature(task)
+        if item.row_signature == signature:
+            return
+
+        item.remove_children()
+        item.mount(self._create_task_list_item_children(task))
+        item.add_class("task").remove_class("task-rename")
+        item.set_class(self.task_to_move == task, "task-to-move")
+        item.row_signature = signature
+
+    def run_mutation(
+        self,
+        description: str,
+        mutation: Callable[[], object],
+        on_success: Callable[[], object] | None = None,
+    ) -> None:
+        """Applies a change to the vault in the background.
+
+        The rows already show the result of the change when it is queued. If
+        the change fails, the user is notified and the list is reloaded from
+        disk, which rolls the rows back.
+        """
+        run_vault_mutation(
+            self,
+            description,
+            mutation,
+            None if on_success is None else lambda _: on_success(),
+            self._rerender,
+        )
+
+    def _remove_row_of(self, task: Task) -> None:
+        """Removes the row of a task, if it is shown."""
+        key = self.task_key(task)
+        for item in self.query_children(TaskListItem):
+            if self.task_key(item.task_instance) == key:
+                item.remove()
+                return
+
+    def _rerender(self) -> None:
+        self.post_message(self.RerenderTaskList(self))
 
     async def append_task(self, task: Task) -> None:
         await self.append(
             self._create_task_list_item(task),
         )
 
+    async def append_tasks(self, tasks: list[Task]) -> None:
+        """Adds rows for tasks after the shown ones, which stay as they are."""
+        if not tasks:
+            return
+        increment("task_list.rows_created", len(tasks))
+        await self.extend(self._create_task_list_item(task) for task in tasks)
+        if self.index is None:
+            self.index = 0
+
+    @staticmethod
+    def task_key(task: Task) -> Path:
+        """Returns the key that identifies the row of a task."""
+        return task.dir / task.name
+
+    def highlight_task(self, task: Task) -> None:
+        """Highlights the row of a task, if it is shown."""
+        key = self.task_key(task)
+        for index, item in enumerate(self.query_children(TaskListItem)):
+            if self.task_key(item.task_instance) == key:
+                self.index = index
+                return
+
+    async def reconcile_tasks(self, tasks: list[Task]) -> None:
+        """Updates the rows to show the given tasks, keeping the highlight.
+
+        Rows are matched to tasks by their path. Rows of tasks that are gone
+        are removed, new tasks get a new row, and only rows that are out of
+        order are moved, while all other rows stay mounted as they are.
+        """
+        highlighted = self.highlighted_child
+        highlighted_key = (
+            None
+            if highlighted is None
+            else self.task_key(highlighted.task_instance)
+        )
+        if highlighted is not None:
+            highlighted.highlighted = False
+
+        new_keys = [self.task_key(task) for task in tasks]
+        new_key_set = set(new_keys)
+        items: dict[Path, TaskListItem] = {}
+        stale_items: list[TaskListItem] = []
+        for item in self.query_children(TaskListItem):
+            key = self.task_key(item.task_instance)
+            if key in new_key_set and key not in items:
+                items[key] = item
+            else:
+                stale_items.append(item)
+        if stale_items:
+            await self.remove_children(stale_items)
+
+        # Rows whose old positions form a longest increasing subsequence in
+        # the new order can stay where they are. All others are moved.
+        old_positions = {key: i for i, key in enumerate(items)}
+        kept = [key for key in new_keys if key in items]
+        stay_positions = _longest_increasing_subsequence(
+            [old_positions[key] for key in kept]
+        )
+        staying = {kept[i] for i in stay_positions}
+
+        # Walk backwards, so that the row after the current one is always in
+        # its final place and can be used as an anchor.
+        anchor: TaskListItem | None = None
+        mounts = []
+        for key, task in zip(reversed(new_keys), reversed(tasks)):
+            item = items.get(key)
+            if item is None:
+                increment("task_list.rows_created")
+                item = self._create_task_list_item(task)
+                if anchor is None:
+                    mounts.append(self.mount(item))
+                else:
+                    mounts.append(self.mount(item, before=anchor))
+            else:
+                self._update_task_list_item(item, task)
+                if key not in staying:
+                    if anchor is None:
+                        self.move_child(item, after=self._nodes[-1])
+                    else:
+                        self.move_child(item, before=anchor)
+            anchor = item
+        for mount in mounts:
+            await mount
+
+        if not tasks:
+            if self.index is None:
+                self.post_message(self.Highlighted(self, None))
+            else:
+                self.index = None
+            return
+
+        new_index = 0
+        if highlighted_key in new_key_set:
+            new_index = new_keys.index(highlighted_key)
+        if self.index == new_index:
+            # The index itself didn't change, but the row at it might have
+            self.watch_index(None, new_index)
+        else:
+            self.index = new_index
+
     def set_index(self, index: int) -> "TaskList":
         self.index = index
         return self
@@ -240,10 +608,13 @@ class TaskList(ListView):
 
         def confirm_delete(delete: bool | None) -> None:
             if delete:
-                task.delete()
-                # Since we deleted a file, we want the main app to reload and
-                # rerender the list of tasks that is shown to the user.
-                self.post_message(self.RerenderTaskList(self))
+                # The row is removed right away. Once the file is deleted, we
+                # want the main app to reload and rerender the list of tasks
+                # that is shown to the user.
+                self._remove_row_of(task)
+                self.run_mutation(
+                    "delete the task", task.delete, self._rerender
+                )
 
         # Show the modal screen for confirming the delete action
         self.app.push_screen(
@@ -263,9 +634,19 @@ class TaskList(ListView):
             return None
 
     def action_new_task(self) -> None:
-        new_file_name = get_default_new_file_name(self.markdown_dir)
-        create_new_markdown_file(self.markdown_dir, new_file_name)
-        self.post_message(self.RerenderTaskList(self, rename_first_item=True))
+        markdown_dir = self.markdown_dir
+
+        def create_task() -> None:
+            new_file_name = get_default_new_file_name(markdown_dir)
+            create_new_markdown_file(markdown_dir, new_file_name)
+
+        self.run_mutation(
+            "create a task",
+            create_task,
+            lambda: self.post_message(
+                self.RerenderTaskList(self, rename_first_item=True)
+            ),
+        )
 
     def action_rename_task(self) -> None:
         highlighted = self.highlighted_child
@@ -274,6 +655,7 @@ class TaskList(ListView):
 
         task_instance = highlighted.task_instance
         highlighted.remove_children()
+        highlighted.row_signature = None
 
         new_input_element = ChangeNameInput(task_instance=task_instance)
         highlighted.mount(new_input_element)
@@ -293,6 +675,9 @@ class TaskList(ListView):
             self._create_task_list_item_children(event.task_instance)
         )
         list_item_element.add_class("task").remove_class("task-rename")
+        list_item_element.row_signature = self._row_signature(
+            event.task_instance
+        )
 
         if event.focus_list_view:
             list_view = list_item_element.query_ancestor(ListView)
@@ -302,7 +687,32 @@ class TaskList(ListView):
     def submit_rename_task(
         self, event: ChangeNameInput.ConfirmChangeName
     ) -> None:
-        self.post_message(self.RerenderTaskList(self))
+        task = event.sender.task_instance
+        old_name = task.name
+        new_name = event.new_name
+
+        # Show the new name right away, while the files are renamed. The
+        # row is rebuilt from the task when the list is reloaded.
+        list_item_element = event.sender.query_ancestor(TaskListItem)
+        list_item_element.remove_children()
+        list_item_element.mount(
+            self._create_task_list_item_children(task, name=new_name)
+        )
+        list_item_element.add_class("task").remove_class("task-rename")
+        list_item_element.row_signature = None
+        self.focus()
+
+        # The rows use the task as it is until the files were renamed
+        renamed_task = task.model_copy()
+
+        def renamed() -> None:
+            task.update_from(renamed_task)
+            self._rerender()
+            offer_to_rewrite_links(self, old_name, new_name, self._rerender)
+
+        self.run_mutation(
+            "rename the task", lambda: renamed_task.rename(new_name), renamed
+        )
 
     def action_new_subtask(self) -> None:
         highlighted = self.highlighted_child
@@ -310,12 +720,18 @@ class TaskList(ListView):
             return
 
         task = highlighted.task_instance
-
-        task.create_subtask()
-        self.post_message(
-            self.SetDirectory(
-                self, task.path_to_children, rename_first_item=True
+        changed_task = task.model_copy()
+
+        def open_subtasks() -> None:
+            task.update_from(changed_task)
+            self.post_message(
+                self.SetDirectory(
+                    self, task.path_to_children, rename_first_item=True
+                )
             )
+
+        self.run_mutation(
+            "create a subtask", changed_task.create_subtask, open_subtasks
         )
 
     def action_move_task(self) -> None:
@@ -345,9 +761,25 @@ class TaskList(ListView):
             return
 
         target_task = highlighted.task_instance
-        target_task.add_task_as_subtask(self.task_to_move)
-        self.post_message(self.SetDirectory(self, target_task.path_to_children))
+        task_to_move = self.task_to_move
         self.task_to_move = None
+        self._remove_row_of(task_to_move)
+
+        changed_target = target_task.model_copy()
+        moved_task = task_to_move.model_copy()
+
+        def moved() -> None:
+            target_task.update_from(changed_target)
+            task_to_move.update_from(moved_task)
+            self.post_message(
+                self.SetDirectory(self, target_task.path_to_children)
+            )
+
+        self.run_mutation(
+            "move the task",
+            lambda: changed_target.add_task_as_subtask(moved_task),
+            moved,
+        )
 
     def action_move_task_to_parent(self):
         highlighted = self.highlighted_child
@@ -368,9 +800,21 @@ class TaskList(ListView):
             )
             return
 
-        self.task_to_move.move_to_dir(self.task_to_move.path_to_parent)
-        self.post_message(self.SetDirectory(self, self.task_to_move.dir))
+        task_to_move = self.task_to_move
+        parent_dir = task_to_move.path_to_parent
         self.task_to_move = None
+        self._remove_row_of(task_to_move)
+        moved_task = task_to_move.model_copy()
+
+        def moved() -> None:
+            task_to_move.update_from(moved_task)
+            self.post_message(self.SetDirectory(self, parent_dir))
+
+        self.run_mutation(
+            "move the task",
+            lambda: moved_task.move_to_dir(parent_dir),
+            moved,
+        )
 
     def action_cancel_action(self) -> None:
         task_to_move = self.task_to_move
@@ -386,3 +830,30 @@ class TaskList(ListView):
                 "No action currently enabled.",
                 severity="warning",
             )
+
+    def action_import_outline(self) -> None:
+        markdown_dir = self.markdown_dir
+
+        def confirm_import(source: Path | None) -> None:
+            if source is None:
+                return
+
+            def imported(n_created: int) -> None:
+                self.app.notify(
+                    f"Imported {n_created} tasks from {source.name}."
+                )
+                # All files are created at this point, so the task list only
+                # needs to be reloaded once.
+                self._rerender()
+
+            # Outlines can have thousands of items, which are written in the
+            # background. Tasks that were created before a failure are shown.
+            run_vault_mutation(
+                self,
+                "import the outline",
+                lambda: import_outline(source, markdown_dir),
+                imported,
+                self._rerender,
+            )
+
+        self.app.push_screen(ImportOutlineModal(), confirm_import)
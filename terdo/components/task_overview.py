@@ -1,32 +1,90 @@
+import asyncio
+import time
 from pathlib import Path
 
 from textual.app import ComposeResult
 from textual.widgets import Input
 from textual.widget import Widget
 from textual.reactive import reactive
-from textual import on
+from textual.worker import Worker, get_current_worker
+from textual import on, work
 
+from terdo.models.links import task_name_of
+from terdo.models.metadata import MetadataQuery, get_metadata_index
+from terdo.models.sorting import SortOrder, sort_tasks
 from terdo.models.task import Task
 from terdo.components.search import Search
 from terdo.components.task_list import TaskList
+from terdo.utils.grep import (
+    MAX_GREP_RESULTS,
+    GrepResult,
+    compile_grep_pattern,
+    iter_grep_rounds,
+)
+from terdo.utils.io import get_root_markdown_dir
+from terdo.utils.scan import scan_note_task
+
+
+# Searches starting with this grep the content of all notes in the vault
+GREP_PREFIX = "/"
+# Matches found within this many seconds are added to the list together
+GREP_BATCH_INTERVAL = 0.05
+# Rows are shown a page at a time, so a huge directory only needs the first
+# tasks in the sort order selected before it is shown.
+TASK_PAGE_SIZE = 200
+# The next page is shown when the highlight gets this close to the last row
+TASK_PAGE_MARGIN = 20
+
+
+def format_grep_context(result: GrepResult, root: Path) -> str:
+    """Returns the file and line of a match, like grep prints them."""
+    context = f"{result.path.relative_to(root)}:{result.line_number}: "
+    context += result.line
+    if result.n_matches > 1:
+        context += f" (+{result.n_matches - 1})"
+    return context
+
+
+def load_matches(results: list[GrepResult]) -> list[tuple[Task, GrepResult]]:
+    """Loads the tasks of the notes that matched a content search."""
+    return [
+        (task, result)
+        for result in results
+        if (task := scan_note_task(result.path)) is not None
+    ]
 
 
 class TaskOverview(Widget):
-    all_tasks: list[Task] = []
     markdown_dir: reactive[Path] = reactive(Path.cwd() / "markdown")
+    task_sort_order: SortOrder = SortOrder.LAST_EDITED
 
     BINDINGS = [
         ("s", "search_tasks", "Search Tasks"),
         ("n", "new_task", "New Tasks"),
+        ("o", "cycle_sort_order", "Sort"),
     ]
 
     def __init__(self, markdown_dir: Path, **kwargs) -> None:
         super().__init__(**kwargs)
         self.markdown_dir = markdown_dir
+        # The notes found by the running content search, in the order found
+        self.grep_tasks: list[Task] = []
+        # The tasks in the directory as they were scanned, and the directory
+        # they were scanned in
+        self._tasks: list[Task] = []
+        self._tasks_dir: Path | None = None
+        self._sorted_tasks: list[Task] | None = None
+        self.n_shown = TASK_PAGE_SIZE
+        # Counts the searches, so a search that was overtaken by the next
+        # one while it loaded its matches doesn't show them
+        self._n_searches = 0
 
     def compose(self) -> ComposeResult:
         yield Search(
-            placeholder="Search for tasks...",
+            placeholder=(
+                "Search for tasks... (tag:ops due:<7d status:open, "
+                "/regex searches all notes)"
+            ),
             id="task-list-search-input",
         )
         yield TaskList(markdown_dir=self.markdown_dir, id="task-list")
@@ -34,13 +92,63 @@ class TaskOverview(Widget):
     def on_mount(self) -> None:
         self.get_task_view_element().focus().set_index(0)
 
+    @property
+    def all_tasks(self) -> list[Task]:
+        """All tasks in the directory, in the current sort order."""
+        if self._sorted_tasks is None:
+            self._sorted_tasks = sort_tasks(self._tasks, self.task_sort_order)
+        return self._sorted_tasks
+
+    def shown_tasks(self) -> list[Task]:
+        """Returns the tasks on the pages that are shown.
+
+        Until all tasks are needed, e.g. to search them, the shown tasks are
+        selected with a heap instead of sorting the whole directory.
+        """
+        if self._sorted_tasks is None and self.n_shown < len(self._tasks):
+            return sort_tasks(
+                self._tasks, self.task_sort_order, limit=self.n_shown
+            )
+        return self.all_tasks[: self.n_shown]
+
     async def set_tasks(self, tasks: list[Task]) -> None:
+        if self._tasks_dir != self.markdown_dir:
+            # Reloads of the same directory keep the pages that were shown
+            self.n_shown = TASK_PAGE_SIZE
+            self._tasks_dir = self.markdown_dir
+        self._tasks = tasks
+        self._sorted_tasks = None
+        await self.get_task_view_element().reconcile_tasks(self.shown_tasks())
+
+    async def highlight_task(self, task: Task) -> None:
+        """Highlights a task, showing more pages until its row is shown."""
         task_view_element = self.get_task_view_element()
-        task_view_element.clear()
-        for task in tasks:
-            await task_view_element.append_task(task)
-        task_view_element.set_index(0)
-        self.all_tasks = tasks
+        key = task_view_element.task_key(task)
+        index = next(
+            (
+                index
+                for index, other in enumerate(self.all_tasks)
+                if task_view_element.task_key(other) == key
+            ),
+            None,
+        )
+        if index is not None and index >= self.n_shown:
+            self.n_shown = (index // TASK_PAGE_SIZE + 1) * TASK_PAGE_SIZE
+            await task_view_element.reconcile_tasks(self.shown_tasks())
+        task_view_element.highlight_task(task)
+
+    @on(TaskList.Highlighted)
+    async def show_next_page(self, event: TaskList.Highlighted) -> None:
+        """Shows the next page of tasks when the highlight nears the end."""
+        if (
+            self.n_shown >= len(self._tasks)
+            or self.get_search_input_element().value
+            or event.list_view.index is None
+            or event.list_view.index < self.n_shown - TASK_PAGE_MARGIN
+        ):
+            return
+        self.n_shown += TASK_PAGE_SIZE
+        await self.get_task_view_element().reconcile_tasks(self.shown_tasks())
 
     @on(Search.Changed, "#task-list-search-input")
     async def search_task_trigger(self, event: Input.Changed) -> None:
@@ -51,30 +159,148 @@ class TaskOverview(Widget):
         self.get_task_view_element().focus().set_index(0)
 
     async def search_tasks(self, search_term: str) -> None:
-        relevant_tasks = [
-            task
-            for task in self.all_tasks
-            if search_term.lower() in task.name.lower()
-        ]
         task_view_element = self.get_task_view_element()
-        task_view_element.clear()
-        for task in relevant_tasks:
-            await task_view_element.append_task(task)
+        self._n_searches += 1
+        n_searches = self._n_searches
+        self.stop_grep()
+        if search_term.startswith(GREP_PREFIX):
+            await task_view_element.reconcile_tasks([])
+            pattern = search_term.removeprefix(GREP_PREFIX)
+            if pattern:
+                self.grep_notes(pattern)
+            return
 
-        task_view_element.set_index(0)
+        query = MetadataQuery.parse(search_term)
+        text = query.text.lower()
+        if query.has_filters:
+            # Metadata filters search the whole vault, using only the index.
+            # The matching notes can be anywhere, so their tasks are loaded
+            # with their statistics in a thread.
+            paths = [
+                path
+                for path in get_metadata_index().query(query)
+                if text in task_name_of(path).lower()
+            ]
+            relevant_tasks = await asyncio.to_thread(
+                self._load_tasks, paths, self.task_sort_order
+            )
+            if n_searches != self._n_searches:
+                return
+        else:
+            relevant_tasks = [
+                task for task in self.all_tasks if text in task.name.lower()
+            ]
+
+        await task_view_element.reconcile_tasks(relevant_tasks)
+
+    @staticmethod
+    def _load_tasks(paths: list[Path], order: SortOrder) -> list[Task]:
+        tasks = [
+            task for path in paths if (task := scan_note_task(path)) is not None
+        ]
+        return sort_tasks(tasks, order)
+
+    def stop_grep(self) -> None:
+        """Cancels the running content search and forgets its matches."""
+        self.workers.cancel_group(self, "content-grep")
+        self.grep_tasks = []
+        self.get_task_view_element().match_context = {}
+
+    @work(thread=True, exclusive=True, group="content-grep")
+    def grep_notes(self, pattern: str) -> None:
+        """Searches the content of all notes, streaming matches to the list.
+
+        Matches are sent to the list in small batches while the search runs.
+        The search returns every time notes finish, also without matches, so
+        a match is never held back for longer than the batch interval and
+        the time to search one note. Sending a batch waits until the list
+        shows it, so a slow list slows down the search instead of queueing
+        up matches. The tasks of the matches are loaded here, with their
+        statistics, so the list doesn't walk their subtrees to show them.
+        """
+        worker = get_current_worker()
+        root = get_root_markdown_dir()
+        batch: list[GrepResult] = []
+        last_sent = 0.0
+        n_results = 0
+        for results in iter_grep_rounds(
+            root,
+            compile_grep_pattern(pattern),
+            is_cancelled=lambda: worker.is_cancelled,
+        ):
+            batch.extend(results)
+            n_results += len(results)
+            if batch and time.monotonic() - last_sent >= GREP_BATCH_INTERVAL:
+                self.app.call_from_thread(
+                    self.show_grep_results, worker, load_matches(batch), root
+                )
+                batch = []
+                last_sent = time.monotonic()
+
+        if worker.is_cancelled:
+            return
+        if batch:
+            self.app.call_from_thread(
+                self.show_grep_results, worker, load_matches(batch), root
+            )
+        if n_results >= MAX_GREP_RESULTS:
+            self.app.notify(
+                f"Showing the first {MAX_GREP_RESULTS} matching notes.",
+                severity="warning",
+            )
+
+    async def show_grep_results(
+        self,
+        worker: Worker,
+        matches: list[tuple[Task, GrepResult]],
+        root: Path,
+    ) -> None:
+        if worker.is_cancelled:
+            # The query changed while these were on their way
+            return
+        task_view_element = self.get_task_view_element()
+        match_context = task_view_element.match_context
+        new_tasks = []
+        for task, result in matches:
+            key = task_view_element.task_key(task)
+            if key in match_context:
+                # A note that was found twice, e.g. while it was compressed
+                continue
+            match_context[key] = format_grep_context(result, root)
+            new_tasks.append(task)
+        # Matches are only ever added, so the rows shown so far stay as they
+        # are instead of being reconciled again for every batch.
+        self.grep_tasks.extend(new_tasks)
+        await task_view_element.append_tasks(new_tasks)
 
     @on(Search.SearchCancelled, "#task-list-search-input")
     async def cancel_search(self, event: Search.SearchCancelled) -> None:
+        self.stop_grep()
         task_view_element = self.get_task_view_element()
-        task_view_element.clear()
-        for task in self.all_tasks:
-            await task_view_element.append_task(task)
-
+        await task_view_element.reconcile_tasks(self.shown_tasks())
         task_view_element.focus()
-        task_view_element.set_index(0)
 
         self.get_search_input_element().clear()
 
+    async def action_cycle_sort_order(self) -> None:
+        """Switches to the next sort order, without reloading the tasks.
+
+        The tasks come from a scan that already computed every sort key, so
+        they are only sorted again in memory.
+        """
+        self.task_sort_order = self.task_sort_order.next()
+        self._sorted_tasks = None
+
+        search_term = self.get_search_input_element().value
+        if search_term:
+            await self.search_tasks(search_term)
+        else:
+            await self.get_task_view_element().reconcile_tasks(
+                self.shown_tasks()
+            )
+
+        self.app.notify(f"Sorted by {self.task_sort_order.label}.")
+
     async def action_search_tasks(self) -> None:
         search_input_element = self.get_search_input_element()
         search_input_element.focus()
@@ -0,0 +1,428 @@
+from collections.abc import Callable
+from pathlib import Path
+from typing import ClassVar
+
+from textual import on
+from textual.app import ComposeResult
+from textual.binding import BindingType
+from textual.containers import Grid
+from textual.screen import ModalScreen
+from textual.widgets import Button, Input, Label, Tree
+from textual.widgets.tree import NodeID, TreeNode
+
+from terdo.components.task_list import (
+    DeleteTaskModal,
+    offer_to_rewrite_links,
+    run_vault_mutation,
+)
+from terdo.models.task import Task, load_tasks_in_dir
+from terdo.utils.io import (
+    create_new_markdown_file,
+    get_default_new_file_name,
+)
+
+
+class RenameTaskModal(ModalScreen[str | None]):
+    """Screen with a dialog to rename a task in the tree view."""
+
+    task_to_rename: Task
+
+    def __init__(self, task_to_rename: Task, **kwargs) -> None:
+        self.task_to_rename = task_to_rename
+        super().__init__(**kwargs)
+
+    def compose(self) -> ComposeResult:
+        yield Grid(
+            Label("Rename task:", id="question"),
+            Input(value=self.task_to_rename.name, id="new-task-name"),
+            Button("Cancel", variant="primary", id="cancel"),
+            Button("Rename", variant="success", id="rename"),
+            id="dialog",
+        )
+
+    @on(Button.Pressed, "#cancel")
+    def close_modal(self) -> None:
+        self.dismiss(None)
+
+    @on(Button.Pressed, "#rename")
+    @on(Input.Submitted, "#new-task-name")
+    def confirm_rename(self) -> None:
+        new_name = self.query_one("#new-task-name", Input).value.strip()
+        self.dismiss(new_name or None)
+
+
+TaskTreeNode = TreeNode[Task]
+
+
+class TaskTree(Tree[Task]):
+    """Shows the whole task hierarchy as an expandable tree.
+
+    The subtasks of a node are only loaded when the node is expanded for the
+    first time, after which they are kept until a change in that directory
+    requires them to be reloaded.
+
+    Like in the task list, changes are applied to the vault in the
+    background. The nodes are updated once a change is done, and the tree is
+    reloaded from disk when it fails.
+    """
+
+    BINDINGS: ClassVar[list[BindingType]] = [
+        ("j", "cursor_down", "Next"),
+        ("k", "cursor_up", "Previous"),
+        ("l", "expand_task", "Expand"),
+        ("h", "collapse_task", "Collapse"),
+        ("d", "delete_task", "Delete"),
+        ("n", "new_task", "New Task"),
+        ("r", "rename_task", "Rename Task"),
+        ("N", "new_subtask", "New Subtask"),
+        ("m", "move_task", "Move Task"),
+        ("M", "move_task_to", "Move Into"),
+        ("P", "move_task_to_parent", "Move To Parent"),
+        ("c", "cancel_action", "Cancel Action"),
+    ]
+
+    markdown_dir: Path
+    node_to_move: TaskTreeNode | None
+    _loaded_nodes: set[NodeID]
+
+    def __init__(self, markdown_dir: Path, **kwargs) -> None:
+        self.markdown_dir = markdown_dir
+        self.node_to_move = None
+        self._loaded_nodes = set()
+        super().__init__(markdown_dir.name, **kwargs)
+        self.show_root = False
+        self.auto_expand = False
+
+    def _dir_of_node(self, node: TaskTreeNode) -> Path:
+        """Returns the directory that holds the subtasks of a node."""
+        if node.is_root or node.data is None:
+            return self.markdown_dir
+        return node.data.path_to_children
+
+    def _add_task_node(
+        self, parent: TaskTreeNode, task: Task, before: int | None = None
+    ) -> TaskTreeNode:
+        return parent.add(
+            task.name,
+            task,
+            before=before,
+            allow_expand=bool(task._is_directory),
+        )
+
+    def load_children(self, node: TaskTreeNode) -> None:
+        """Loads the subtasks of a node, if they are not loaded yet."""
+        if node.id in self._loaded_nodes:
+            return
+
+        node.remove_children()
+        for task in load_tasks_in_dir(self._dir_of_node(node)):
+            self._add_task_node(node, task)
+        self._loaded_nodes.add(node.id)
+
+    def reload_children(self, node: TaskTreeNode) -> None:
+        """Reloads the subtasks of a single node, keeping expanded subtrees."""
+        expanded = {
+            child.data.name
+            for child in node.children
+            if child.is_expanded and child.data is not None
+        }
+        self._forget_subtree(node)
+        self.load_children(node)
+
+        for child in node.children:
+            if child.data is not None and child.data.name in expanded:
+                self.load_children(child)
+                child.expand()
+
+    def _forget_subtree(self, node: TaskTreeNode) -> None:
+        """Marks a node and all its loaded descendants as not loaded."""
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            self._loaded_nodes.discard(current.id)
+            pending.extend(current.children)
+
+    def reset(self) -> None:
+        """Reloads the loaded parts of the tree from disk."""
+        self.reload_children(self.root)
+
+    def reload_siblings(self, task: Task) -> None:
+        """Reloads the node that holds a task, e.g. after its note changed.
+
+        The cursor stays on the task, which may have moved because the
+        subtasks are ordered by when they were last edited.
+        """
+        path = task.path_to_file
+        pending = [self.root]
+        while pending:
+            parent = pending.pop()
+            for child in parent.children:
+                if child.data is not None and child.data.path_to_file == path:
+                    break
+                pending.append(child)
+            else:
+                continue
+
+            cursor = self.cursor_node
+            follow_cursor = (
+                cursor is not None
+                and cursor.data is not None
+                and cursor.data.path_to_file == path
+            )
+            self.reload_children(parent)
+            if follow_cursor:
+                for child in parent.children:
+                    if child.data is not None and child.data.name == task.name:
+                        self.call_after_refresh(self.move_cursor, child)
+            return
+
+    def run_mutation[T](
+        self,
+        description: str,
+        mutation: Callable[[], T],
+        on_success: Callable[[T], object] | None = None,
+    ) -> None:
+        """Applies a change to the vault in the background."""
+        run_vault_mutation(self, description, mutation, on_success, self.reset)
+
+    @on(Tree.NodeExpanded)
+    def _load_expanded_node(self, event: Tree.NodeExpanded[Task]) -> None:
+        self.load_children(event.node)
+
+    def _highlighted_node(self) -> TaskTreeNode | None:
+        node = self.cursor_node
+        if node is None or node.data is None:
+            return None
+        return node
+
+    def _parent_node(self, node: TaskTreeNode) -> TaskTreeNode:
+        assert node.parent is not None, "Task nodes always have a parent."
+        return node.parent
+
+    def action_expand_task(self) -> None:
+        node = self._highlighted_node()
+        if node is None:
+            return
+
+        if not node.allow_expand:
+            self.app.notify(
+                "This task does not have any subtasks.", severity="warning"
+            )
+            return
+
+        self.load_children(node)
+        node.expand()
+
+    def action_collapse_task(self) -> None:
+        node = self._highlighted_node()
+        if node is None:
+            return
+
+        if node.is_expanded:
+            node.collapse()
+        elif not self._parent_node(node).is_root:
+            self.move_cursor(node.parent)
+
+    def action_delete_task(self) -> None:
+        node = self._highlighted_node()
+        if node is None:
+            return
+
+        task = node.data
+        assert task is not None
+
+        def confirm_delete(delete: bool | None) -> None:
+            if not delete:
+                return
+            parent = self._parent_node(node)
+            node.remove()
+
+            def deleted(_: None) -> None:
+                if not parent.children and not parent.is_root:
+                    # The parent no longer has subtasks, so it is turned back
+                    # into a single file when it is loaded again.
+                    self.reload_children(self._parent_node(parent))
+
+            self.run_mutation("delete the task", task.delete, deleted)
+
+        self.app.push_screen(DeleteTaskModal(task), confirm_delete)
+
+    def action_new_task(self) -> None:
+        node = self._highlighted_node()
+        parent = self.root if node is None else self._parent_node(node)
+        directory = self._dir_of_node(parent)
+
+        def create_task() -> str:
+            new_file_name = get_default_new_file_name(directory)
+            create_new_markdown_file(directory, new_file_name)
+            return new_file_name
+
+        def created(new_file_name: str) -> None:
+            new_node = self._add_task_node(
+                parent, Task(name=new_file_name, dir=directory), before=0
+            )
+            self._rename_after_refresh(new_node)
+
+        self.run_mutation("create a task", create_task, created)
+
+    def action_rename_task(self) -> None:
+        node = self._highlighted_node()
+        if node is None:
+            return
+
+        task = node.data
+        assert task is not None
+
+        def confirm_rename(new_name: str | None) -> None:
+            if new_name is None or new_name == task.name:
+                return
+            old_name = task.name
+            # Show the new name right away, while the files are renamed
+            node.set_label(new_name)
+            renamed_task = task.model_copy()
+
+            def renamed(_: None) -> None:
+                task.update_from(renamed_task)
+                node.set_label(task.name)
+                if node.id in self._loaded_nodes:
+                    # The subtasks of a renamed directory now live elsewhere
+                    self.reload_children(node)
+                offer_to_rewrite_links(self, old_name, new_name)
+
+            self.run_mutation(
+                "rename the task",
+                lambda: renamed_task.rename(new_name),
+                renamed,
+            )
+
+        self.app.push_screen(RenameTaskModal(task), confirm_rename)
+
+    def action_new_subtask(self) -> None:
+        node = self._highlighted_node()
+        if node is None:
+            return
+
+        task = node.data
+        assert task is not None
+        changed_task = task.model_copy()
+
+        def created(_: None) -> None:
+            task.update_from(changed_task)
+            node.allow_expand = True
+            self.reload_children(node)
+            node.expand()
+            self._rename_after_refresh(node.children[0])
+
+        self.run_mutation(
+            "create a subtask", changed_task.create_subtask, created
+        )
+
+    def _rename_after_refresh(self, node: TaskTreeNode) -> None:
+        """Moves the cursor to a new node and starts renaming it.
+
+        The lines of the tree are only rebuilt on the next refresh, so the
+        cursor can't be moved to a node that was just added before that.
+        """
+
+        def rename_node() -> None:
+            self.move_cursor(node)
+            self.action_rename_task()
+
+        self.call_after_refresh(rename_node)
+
+    def action_move_task(self) -> None:
+        node = self._highlighted_node()
+        if node is None:
+            return
+
+        assert node.data is not None
+        self.node_to_move = node
+        self.app.notify(node.data.name, title="Selected for moving:")
+
+    def _finish_move(
+        self, node: TaskTreeNode, target_parent: TaskTreeNode
+    ) -> None:
+        """Shows a task in its new parent, once its files were moved."""
+        source_parent = self._parent_node(node)
+        node.remove()
+
+        target_parent.allow_expand = True
+        self.reload_children(target_parent)
+        target_parent.expand()
+
+        if not source_parent.children and not source_parent.is_root:
+            self.reload_children(self._parent_node(source_parent))
+
+    def action_move_task_to(self) -> None:
+        node = self._highlighted_node()
+        if node is None:
+            return
+
+        if self.node_to_move is None:
+            self.app.notify("No task selected for moving.", severity="warning")
+            return
+
+        target_task = node.data
+        source_task = self.node_to_move.data
+        assert target_task is not None and source_task is not None
+        # The task can't end up inside its own subtree
+        if (target_task.dir / target_task.name).is_relative_to(
+            source_task.dir / source_task.name
+        ):
+            self.app.notify(
+                "Cannot move a task into itself or one of its subtasks.",
+                severity="warning",
+            )
+            return
+
+        node_to_move, self.node_to_move = self.node_to_move, None
+        # The nodes keep using the tasks as they are until the files moved
+        changed_target = target_task.model_copy()
+        moved_task = source_task.model_copy()
+
+        def moved(_: None) -> None:
+            target_task.update_from(changed_target)
+            source_task.update_from(moved_task)
+            self._finish_move(node_to_move, node)
+
+        self.run_mutation(
+            "move the task",
+            lambda: changed_target.add_task_as_subtask(moved_task),
+            moved,
+        )
+
+    def action_move_task_to_parent(self) -> None:
+        if self.node_to_move is None:
+            self.app.notify("No task selected for moving.", severity="warning")
+            return
+
+        source_parent = self._parent_node(self.node_to_move)
+        if source_parent.is_root:
+            self.app.notify(
+                "Cannot move to parent directory of the root markdown directory.",
+                severity="warning",
+            )
+            return
+
+        task = self.node_to_move.data
+        assert task is not None
+        parent_dir = task.path_to_parent
+        node_to_move, self.node_to_move = self.node_to_move, None
+        moved_task = task.model_copy()
+
+        def moved(_: None) -> None:
+            task.update_from(moved_task)
+            self._finish_move(node_to_move, self._parent_node(source_parent))
+
+        self.run_mutation(
+            "move the task", lambda: moved_task.move_to_dir(parent_dir), moved
+        )
+
+    def action_cancel_action(self) -> None:
+        if self.node_to_move is None:
+            self.app.notify("No action currently enabled.", severity="warning")
+            return
+
+        assert self.node_to_move.data is not None
+        self.notify(self.node_to_move.data.name, title="Cancelled moving task.")
+        self.node_to_move = None
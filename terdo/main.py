@@ -1,14 +1,45 @@
+import asyncio
+from dataclasses import dataclass
 from pathlib import Path
 
 from textual.app import App, ComposeResult
-from textual.widgets import Footer
+from textual.widgets import Footer, Input, TextArea
 from textual.containers import VerticalScroll, Grid
-from textual import on
+from textual import on, work
 
 from terdo.components.task_overview import TaskList, TaskOverview
 from terdo.components.note import Note
-from terdo.utils.io import get_root_markdown_dir
-from terdo.models.task import load_tasks_in_dir
+from terdo.components.task_tree import TaskTree
+from terdo.models.links import get_link_index, read_task_links
+from terdo.models.metadata import get_metadata_index, read_task_metadata
+from terdo.utils.daemon import DaemonClient, DaemonError, connect_to_daemon
+from terdo.utils.export import export_vault
+from terdo.utils.instrumentation import increment
+from terdo.utils.io import get_default_export_dir, get_root_markdown_dir
+from terdo.utils.mutations import get_mutation_queue
+from terdo.utils.session import Session, load_session, save_session
+from terdo.utils.scan import (
+    ScannedTask,
+    VisitFunction,
+    combine_visitors,
+    scan_tree,
+)
+
+
+@dataclass
+class RefreshRequest:
+    """A reload of the task list that is waiting for the next frame."""
+
+    markdown_dir: Path
+    # The directory that was shown when the reload was requested
+    shown_dir: Path
+    focus_task_list: bool = False
+    rename_first_task: bool = False
+
+    def merge(self, other: "RefreshRequest") -> None:
+        """Takes over the flags of another request for the same directory."""
+        self.focus_task_list |= other.focus_task_list
+        self.rename_first_task |= other.rename_first_task
 
 
 class Terdo(App):
@@ -20,10 +51,35 @@ class Terdo(App):
 
     BINDINGS = [
         ("q", "quit", "Quit Terdo"),
+        ("t", "toggle_tree_view", "Tree View"),
+        ("x", "export_vault", "Export"),
     ]
 
     CSS_PATH = "styles.tcss"
-    markdown_dir: Path = get_root_markdown_dir()
+    markdown_dir: Path
+    tree_needs_reset: bool = False
+    # Connected when a daemon runs for the vault, see ``terdo daemon``
+    daemon: DaemonClient | None = None
+    # The reload that runs after the next refresh of the screen, if any
+    pending_refresh: RefreshRequest | None = None
+
+    def __init__(self, resume_session: bool = True, **kwargs) -> None:
+        """
+        Parameters
+        ----------
+        resume_session
+            Whether to start where the previous session of the vault ended,
+            and to store the session on quit.
+        """
+        # Read when the app is created, so that the root can be changed
+        # before that with set_root_markdown_dir.
+        root = get_root_markdown_dir()
+        self.resume_session = resume_session
+        self.session = load_session(root) if resume_session else None
+        self.markdown_dir = root
+        if self.session is not None:
+            self.markdown_dir = root / self.session.dir
+        super().__init__(**kwargs)
 
     def compose(self) -> ComposeResult:
         """Compose the main UI layout.
@@ -39,6 +95,13 @@ class Terdo(App):
                     markdown_dir=self.markdown_dir, id="task-list-search"
                 )
 
+            # The tree view replaces the task list when it is toggled on.
+            yield TaskTree(
+                markdown_dir=get_root_markdown_dir(),
+                id="task-tree",
+                classes="hidden",
+            )
+
             # The Note element contains either a Markdown element showing the
             # contents of a note or a Textarea element in which the contents
             # can edited, depending on the state of the app.
@@ -50,7 +113,219 @@ class Terdo(App):
 
     async def on_mount(self) -> None:
         """Sets up the app when the app is mounted."""
+        # The session may start in a subdirectory, the daemon serves the vault
+        self.daemon = connect_to_daemon(get_root_markdown_dir())
+        if self.daemon is not None:
+            get_mutation_queue().add_listener(self.notify_daemon)
+            self.watch_daemon()
+
+        # Only the directory of the session is scanned before it is shown,
+        # the rest of the vault is indexed in the background afterwards.
         await self.set_directory(self.markdown_dir)
+        if self.session is not None:
+            await self.restore_session(self.session)
+        self.index_vault()
+
+    async def restore_session(self, session: Session) -> None:
+        """Highlights the task of a session and reopens its editor."""
+        task_list = self.query_one(TaskList)
+        task_overview = self.query_one(TaskOverview)
+        for task in task_overview.all_tasks:
+            if task.name == session.highlighted_task:
+                await task_overview.highlight_task(task)
+                break
+        else:
+            return
+
+        note = self.query_one("#note-content", Note)
+        note.preview_open = session.preview_open
+        # Set here instead of by the highlight message, so that the editor
+        # opens on the right note.
+        note.task_item = task
+        if session.editing:
+            await note.action_edit()
+            editor = note.query_one("#note-editor", TextArea)
+            editor.cursor_location = session.editor_cursor
+
+        def restore_scroll() -> None:
+            task_list.scroll_to(y=session.task_list_scroll, animate=False)
+            note.query_one("#note-viewer-container").scroll_to(
+                y=session.note_scroll, animate=False
+            )
+            if session.editing:
+                x, y = session.editor_scroll
+                editor.scroll_to(x, y, animate=False)
+
+        # The rows and the note need to be laid out before they can scroll
+        self.call_after_refresh(restore_scroll)
+
+    def current_session(self) -> Session:
+        """Returns where the user is in the app, to resume there later."""
+        task_list = self.query_one(TaskList)
+        highlighted = task_list.highlighted_child
+        note = self.query_one("#note-content", Note)
+        editor = note.query_one("#note-editor", TextArea)
+        return Session(
+            dir=self.markdown_dir.relative_to(get_root_markdown_dir()),
+            highlighted_task=(
+                None if highlighted is None else highlighted.task_instance.name
+            ),
+            task_list_scroll=task_list.scroll_y,
+            note_scroll=note.query_one("#note-viewer-container").scroll_y,
+            editing=not editor.has_class("hidden"),
+            editor_cursor=editor.cursor_location,
+            editor_scroll=(editor.scroll_x, editor.scroll_y),
+            preview_open=note.preview_open,
+        )
+
+    def on_unmount(self) -> None:
+        if self.daemon is not None:
+            get_mutation_queue().remove_listener(self.notify_daemon)
+            self.daemon.close()
+            self.daemon = None
+
+    def scan_vault(
+        self,
+        dir: Path,
+        visit: VisitFunction | None = None,
+        recursive: bool = False,
+    ) -> list[ScannedTask]:
+        """Scans a directory of the vault, through the daemon if it runs.
+
+        The daemon already has the scanned tree in memory, including the
+        metadata and links of every note. It only sends the subtrees of the
+        tasks if ``recursive`` is set. Without a daemon, or when it can't
+        answer, the directory is scanned directly.
+
+        Waits for the daemon or the filesystem, so this runs in a thread.
+        """
+        daemon = self.daemon
+        if daemon is not None:
+            try:
+                return daemon.scan(dir, recursive)
+            except DaemonError:
+                # E.g. a directory that was created after its last rescan
+                pass
+            except OSError:
+                self.disconnect_daemon()
+        return scan_tree(dir, visit=visit)
+
+    def notify_daemon(self) -> None:
+        """Lets the daemon pick up a change before the list is reloaded.
+
+        Called after every change from the task list and the note editor.
+        Only sends a message, the daemon rescans on its own.
+        """
+        daemon = self.daemon
+        if daemon is None:
+            return
+        try:
+            daemon.touched()
+        except (DaemonError, OSError):
+            self.disconnect_daemon()
+
+    def disconnect_daemon(self) -> None:
+        """Falls back to the filesystem after the daemon went away."""
+        daemon, self.daemon = self.daemon, None
+        if daemon is None:
+            return
+        get_mutation_queue().remove_listener(self.notify_daemon)
+        daemon.close()
+        self.notify(
+            "Lost the connection to the daemon, reading the vault directly.",
+            severity="warning",
+        )
+
+    @work(thread=True, exclusive=True, group="daemon-events")
+    def watch_daemon(self) -> None:
+        """Applies the changes that the daemon reports, e.g. of other apps.
+
+        The changed notes are read into the indexes in this thread, only the
+        shown tasks are updated on the event loop.
+        """
+        daemon = self.daemon
+        if daemon is None:
+            return
+        try:
+            for changed in daemon.subscribe():
+                self.index_vault_changes(changed)
+                self.call_from_thread(self.apply_vault_changes, changed)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def index_vault_changes(changed: set[Path]) -> None:
+        """Reads the notes that changed into the indexes."""
+        metadata_index = get_metadata_index()
+        link_index = get_link_index()
+        for path in changed:
+            if path.exists():
+                metadata_index.update(path, read_task_metadata(path))
+                link_index.update(path, read_task_links(path))
+            else:
+                metadata_index.remove(path)
+                link_index.remove(path)
+
+    async def apply_vault_changes(self, changed: set[Path]) -> None:
+        """Updates the shown tasks after notes changed."""
+        # Don't pull the list or the note away while the user is typing
+        if isinstance(self.focused, (Input, TextArea)):
+            return
+        if any(path.is_relative_to(self.markdown_dir) for path in changed):
+            self.tree_needs_reset = True
+            self.request_refresh(self.markdown_dir, focus_task_list=False)
+
+        note = self.query_one("#note-content", Note)
+        shown = note.task_item
+        if (
+            shown is not None
+            and shown.path_to_file in changed
+            and shown.path_to_file.exists()
+        ):
+            await note.reload_content()
+
+    @work(thread=True, exclusive=True, group="index-vault")
+    def index_vault(self) -> None:
+        """Scans the whole vault in the background to build the indexes.
+
+        Notes that are changed in the app while the scan runs keep what the
+        app put in the indexes, because the scan may have read them before
+        the change.
+        """
+        metadata_index = get_metadata_index()
+        link_index = get_link_index()
+        with (
+            metadata_index.track_changes() as metadata_changes,
+            link_index.track_changes() as link_changes,
+        ):
+            tasks = self.scan_vault(
+                get_root_markdown_dir(),
+                visit=combine_visitors(
+                    metadata=read_task_metadata, links=read_task_links
+                ),
+                recursive=True,
+            )
+
+            def load_index() -> None:
+                metadata_index.replace_scanned(tasks, metadata_changes)
+                link_index.replace_scanned(tasks, link_changes)
+
+            self.call_from_thread(load_index)
+
+    @work(thread=True, exclusive=True, group="export-vault")
+    def action_export_vault(self) -> None:
+        """Exports the vault to HTML in the background."""
+        output_dir = get_default_export_dir()
+        try:
+            result = export_vault(get_root_markdown_dir(), output_dir)
+        except OSError as error:
+            self.notify(f"Export failed: {error}", severity="error")
+            return
+
+        self.notify(
+            f"Exported {result.n_rendered} notes to {output_dir} "
+            f"({result.n_unchanged} unchanged)."
+        )
 
     async def set_directory(
         self,
@@ -66,8 +341,21 @@ class Terdo(App):
             The directory to show in the app.
         focus_task_list
             Whether to focus the task list after loading the tasks.
+        rename_first_task
+            Whether to rename the newest task after loading the tasks.
         """
-        tasks = load_tasks_in_dir(markdown_dir)
+        increment("app.set_directory")
+        pending = self.pending_refresh
+        if pending is not None and pending.markdown_dir == markdown_dir:
+            # A direct load makes a pending reload of the directory redundant
+            increment("refresh.coalesced")
+            self.pending_refresh = None
+            focus_task_list |= pending.focus_task_list
+            rename_first_task |= pending.rename_first_task
+        # The subtrees of all tasks are scanned in parallel, which gives the
+        # ordering and the number of subtasks without walking them one by one.
+        scanned = await asyncio.to_thread(self.scan_vault, markdown_dir)
+        tasks = [task.to_task() for task in scanned]
         if len(tasks) == 0:
             if markdown_dir == get_root_markdown_dir():
                 self.app.notify(
@@ -93,6 +381,13 @@ class Terdo(App):
             task_list_component = task_overview_component.query_one(TaskList)
             task_list_component.focus()
             if rename_first_task:
+                # New tasks are the most recently edited ones, which are not
+                # necessarily first in the current sort order.
+                newest_task = max(
+                    task_overview_component.all_tasks,
+                    key=lambda task: task.last_edited,
+                )
+                await task_overview_component.highlight_task(newest_task)
                 task_list_component.action_rename_task()
 
     @on(TaskList.Highlighted)
@@ -114,37 +409,104 @@ class Terdo(App):
         task = item.task_instance
         note.task_item = task
 
+    @on(TaskTree.NodeHighlighted)
+    def load_note_from_tree(self, event: TaskTree.NodeHighlighted) -> None:
+        """Loads the note content for the task highlighted in the tree view."""
+        note = self.query_one("#note-content", Note)
+        note.task_item = event.node.data
+
+    @on(Note.OpenTask)
+    async def open_linked_task(self, event: Note.OpenTask) -> None:
+        """Shows the directory of a linked task, with that task highlighted."""
+        task_tree = self.query_one(TaskTree)
+        if not task_tree.has_class("hidden"):
+            task_tree.add_class("hidden")
+            self.query_one("#task-list-container").remove_class("hidden")
+
+        self.markdown_dir = event.task.dir
+        await self.set_directory(self.markdown_dir)
+        await self.query_one(TaskOverview).highlight_task(event.task)
+
     @on(TaskList.Selected)
+    @on(TaskTree.NodeSelected)
     def item_selected(self, event: TaskList.Highlighted) -> None:
         """Focuses the Note element when a task is selected."""
         note = self.query_one("#note-content", Note)
         note.focus()
 
-    @on(TaskList.RerenderTaskList)
-    async def rerender_from_task_list(
-        self, event: TaskList.RerenderTaskList
+    def request_refresh(
+        self,
+        markdown_dir: Path,
+        focus_task_list: bool = True,
+        rename_first_task: bool = False,
     ) -> None:
-        """Reloads the task list when a task is added or removed."""
+        """Reloads a directory once the current burst of changes is over.
+
+        The reload runs after the next refresh of the screen. Requests for
+        the same directory that come in before that are merged into it,
+        keeping every flag that any of them set. A request for another
+        directory replaces the pending one, whose directory is no longer
+        shown anyway. A direct ``set_directory`` of the same directory takes
+        over the pending request.
+        """
+        increment("refresh.requested")
+        request = RefreshRequest(
+            markdown_dir, self.markdown_dir, focus_task_list, rename_first_task
+        )
+        pending = self.pending_refresh
+        if pending is not None:
+            if pending.markdown_dir == markdown_dir:
+                increment("refresh.coalesced")
+                pending.merge(request)
+            else:
+                increment("refresh.replaced")
+                self.pending_refresh = request
+            return
+
+        self.pending_refresh = request
+        self.call_after_refresh(self.run_pending_refresh)
+
+    async def run_pending_refresh(self) -> None:
+        request, self.pending_refresh = self.pending_refresh, None
+        if request is None:
+            return
+        if request.shown_dir != self.markdown_dir:
+            # Another directory was opened directly in the meantime
+            increment("refresh.stale")
+            return
+        increment("refresh.run")
+        self.markdown_dir = request.markdown_dir
         await self.set_directory(
-            self.markdown_dir,
-            focus_task_list=True,
-            rename_first_task=event.rename_first_item,
+            request.markdown_dir,
+            focus_task_list=request.focus_task_list,
+            rename_first_task=request.rename_first_task,
+        )
+
+    @on(TaskList.RerenderTaskList)
+    def rerender_from_task_list(self, event: TaskList.RerenderTaskList) -> None:
+        """Reloads the task list when a task is added or removed."""
+        self.tree_needs_reset = True
+        self.request_refresh(
+            self.markdown_dir, rename_first_task=event.rename_first_item
         )
 
     @on(Note.RerenderTaskList)
-    async def rerender_from_note(self):
-        """Reloads the task list when the note is saved."""
-        await self.set_directory(self.markdown_dir)
+    def rerender_from_note(self, event: Note.RerenderTaskList) -> None:
+        """Reloads the task list or the tree when the note is saved."""
+        task_tree = self.query_one(TaskTree)
+        if not task_tree.has_class("hidden"):
+            # The task list is reloaded anyway when it is shown again
+            task_tree.reload_siblings(event.task)
+            return
+        self.tree_needs_reset = True
+        self.request_refresh(self.markdown_dir)
 
     @on(TaskList.SetDirectory)
-    async def set_directory_from_task_list(
+    def set_directory_from_task_list(
         self, event: TaskList.SetDirectory
     ) -> None:
-        self.markdown_dir = event.markdown_dir
-        await self.set_directory(
-            event.markdown_dir,
-            focus_task_list=True,
-            rename_first_task=event.rename_first_item,
+        self.request_refresh(
+            event.markdown_dir, rename_first_task=event.rename_first_item
         )
 
     @on(TaskList.OpenParentDirectory)
@@ -160,8 +522,37 @@ class Terdo(App):
         self.markdown_dir = new_dir
         await self.set_directory(new_dir)
 
+    async def action_toggle_tree_view(self) -> None:
+        """Switches between the task list of a directory and the tree view."""
+        task_list_container = self.query_one("#task-list-container")
+        task_tree = self.query_one(TaskTree)
+
+        if task_tree.has_class("hidden"):
+            # The tree is loaded lazily and only reloaded when tasks were
+            # changed from the task list since it was last shown.
+            if self.tree_needs_reset or not task_tree.root.children:
+                task_tree.reset()
+                self.tree_needs_reset = False
+            task_list_container.add_class("hidden")
+            task_tree.remove_class("hidden")
+            task_tree.focus()
+        else:
+            task_tree.add_class("hidden")
+            task_list_container.remove_class("hidden")
+            # Changes made in the tree view are not known to the task list
+            await self.set_directory(self.markdown_dir)
+
     async def action_quit(self) -> None:
-        """Exits the program by calling the exit method."""
+        """Exits the program by calling the exit method.
+
+        The session is stored first, so the next start can resume it.
+        """
+        if self.resume_session:
+            try:
+                save_session(self.current_session(), get_root_markdown_dir())
+            except (OSError, ValueError):
+                # E.g. a directory outside of the vault, or no home directory
+                pass
         self.exit()
 
 
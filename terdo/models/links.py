@@ -0,0 +1,262 @@
+import re
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import quote, unquote
+
+from terdo.utils.compression import (
+    INDEX_FILE_NAME,
+    open_note,
+    strip_note_suffix,
+)
+
+if TYPE_CHECKING:
+    from terdo.utils.scan import ScannedTask
+
+
+# Matches [[Task name]], [[Task name|shown text]] and [[Task name#heading]]
+WIKILINK_PATTERN = re.compile(
+    r"\[\[(?P<target>[^\[\]|#\n]+)(?P<suffix>[|#][^\[\]\n]*)?\]\]"
+)
+# Wikilinks are turned into markdown links with this scheme to view them
+WIKILINK_SCHEME = "wikilink:"
+
+
+def _link_key(name: str) -> str:
+    return name.strip().casefold()
+
+
+def task_name_of(path: Path) -> str:
+    """Returns the name of the task that a note belongs to."""
+    if path.name == INDEX_FILE_NAME:
+        return path.parent.name
+    return strip_note_suffix(path.name)
+
+
+def parse_wikilinks(content: str) -> frozenset[str]:
+    """Returns the names of the tasks that a note links to."""
+    return frozenset(
+        match.group("target").strip()
+        for match in WIKILINK_PATTERN.finditer(content)
+    )
+
+
+def read_task_links(path: Path) -> frozenset[str]:
+    """Reads the links in a note line by line. Used as visitor in scans."""
+    links: set[str] = set()
+    try:
+        with open_note(path) as file:
+            for line in file:
+                if "[[" in line:
+                    links.update(parse_wikilinks(line))
+    except OSError:
+        pass
+    return frozenset(links)
+
+
+def replace_wikilinks(content: str, old_name: str, new_name: str) -> str:
+    """Points the links to a task to its new name, keeping shown texts."""
+
+    def replace(match: re.Match[str]) -> str:
+        if _link_key(match.group("target")) != _link_key(old_name):
+            return match.group(0)
+        return f"[[{new_name}{match.group('suffix') or ''}]]"
+
+    return WIKILINK_PATTERN.sub(replace, content)
+
+
+def wikilinks_to_markdown(content: str) -> str:
+    """Turns wikilinks into markdown links, so they can be clicked."""
+
+    def replace(match: re.Match[str]) -> str:
+        target = match.group("target").strip()
+        suffix = match.group("suffix") or ""
+        text = suffix[1:] if suffix.startswith("|") else target
+        return f"[{text}]({WIKILINK_SCHEME}{quote(target)})"
+
+    return WIKILINK_PATTERN.sub(replace, content)
+
+
+def wikilink_target(href: str) -> str | None:
+    """Returns the task name of a link made by ``wikilinks_to_markdown``."""
+    if not href.startswith(WIKILINK_SCHEME):
+        return None
+    return unquote(href.removeprefix(WIKILINK_SCHEME))
+
+
+class LinkIndex:
+    """Graph of the wikilinks between all notes in the vault.
+
+    Both directions are kept: the links of every note, and for every task
+    name the notes that link to it, so the backlinks of a task are a single
+    dictionary lookup. The notes are also indexed by the name of their task,
+    to follow a link without searching the vault.
+
+    Tasks are changed from a background thread, so all access goes through
+    a lock and lookups return copies.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._links: dict[Path, frozenset[str]] = {}
+        # The indexed notes by the directory they are in
+        self._by_dir: dict[Path, set[Path]] = {}
+        self._backlinks: dict[str, set[Path]] = {}
+        self._by_name: dict[str, set[Path]] = {}
+        # Paths changed while scans were running, see ``track_changes``
+        self._trackers: list[set[Path]] = []
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    def __contains__(self, path: Path) -> bool:
+        return path in self._links
+
+    def links(self, path: Path) -> frozenset[str]:
+        """Returns the names of the tasks that a note links to."""
+        with self._lock:
+            return self._links.get(path, frozenset())
+
+    def backlinks(self, name: str) -> set[Path]:
+        """Returns the notes that link to the task with the given name."""
+        with self._lock:
+            return set(self._backlinks.get(_link_key(name), ()))
+
+    def resolve(self, name: str) -> Path | None:
+        """Returns the note of the task with the given name, if it exists."""
+        with self._lock:
+            paths = self._by_name.get(_link_key(name))
+            if not paths:
+                return None
+            # Several tasks can have the same name, in different directories
+            return min(paths, key=lambda path: (len(path.parts), path))
+
+    def update(self, path: Path, links: frozenset[str]) -> None:
+        """Sets the links of a note, replacing what was indexed before."""
+        with self._lock:
+            self._track(path)
+            self._update(path, links)
+
+    def _update(self, path: Path, links: frozenset[str]) -> None:
+        self._remove(path)
+        self._links[path] = links
+        self._by_dir.setdefault(path.parent, set()).add(path)
+        self._by_name.setdefault(_link_key(task_name_of(path)), set()).add(path)
+        for link in links:
+            self._backlinks.setdefault(_link_key(link), set()).add(path)
+
+    def update_from_content(self, path: Path, content: str) -> None:
+        """Updates the links of a note from its new content."""
+        self.update(path, parse_wikilinks(content))
+
+    def remove(self, path: Path) -> None:
+        """Removes a note from the index."""
+        with self._lock:
+            self._track(path)
+            self._remove(path)
+
+    def _remove(self, path: Path) -> None:
+        links = self._links.pop(path, None)
+        if links is None:
+            return
+
+        self._discard(self._by_dir, path.parent, path)
+        self._discard(self._by_name, _link_key(task_name_of(path)), path)
+        for link in links:
+            self._discard(self._backlinks, _link_key(link), path)
+
+    @staticmethod
+    def _discard[K](index: dict[K, set[Path]], key: K, path: Path) -> None:
+        paths = index.get(key)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del index[key]
+
+    def move(self, old_path: Path, new_path: Path) -> None:
+        """Moves the links of a note, or of all notes in a directory."""
+        with self._lock:
+            moved = [old_path] if old_path in self._links else []
+            for dir in list(self._by_dir):
+                if dir.is_relative_to(old_path):
+                    moved.extend(self._by_dir[dir])
+            for path in moved:
+                links = self._links[path]
+                self.remove(path)
+                self.update(new_path / path.relative_to(old_path), links)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._links.clear()
+            self._by_dir.clear()
+            self._backlinks.clear()
+            self._by_name.clear()
+
+    def add_scanned(self, tasks: list["ScannedTask"]) -> None:
+        """Adds the results of a scan to the index.
+
+        The scan must visit notes with ``read_task_links``, combined under the
+        name ``links``.
+        """
+        with self._lock:
+            pending = list(tasks)
+            while pending:
+                task = pending.pop()
+                self.update(task.path, task.visited("links") or frozenset())
+                pending.extend(task.children)
+
+    def _track(self, path: Path) -> None:
+        for changed in self._trackers:
+            changed.add(path)
+
+    @contextmanager
+    def track_changes(self) -> Iterator[set[Path]]:
+        """Collects the paths of the notes that change, e.g. during a scan.
+
+        The paths are collected in the yielded set until the block ends.
+        """
+        changed: set[Path] = set()
+        with self._lock:
+            self._trackers.append(changed)
+        try:
+            yield changed
+        finally:
+            with self._lock:
+                self._trackers = [
+                    tracker
+                    for tracker in self._trackers
+                    if tracker is not changed
+                ]
+
+    def replace_scanned(
+        self, tasks: list["ScannedTask"], changed: set[Path]
+    ) -> None:
+        """Replaces the index by the results of a scan of the whole vault.
+
+        Like ``MetadataIndex.replace_scanned``, the notes in ``changed`` keep
+        what they have now, and all other notes that the scan didn't find
+        are removed.
+        """
+        with self._lock:
+            seen: set[Path] = set()
+            pending = list(tasks)
+            while pending:
+                task = pending.pop()
+                path = task.path
+                seen.add(path)
+                if path not in changed:
+                    self._update(path, task.visited("links") or frozenset())
+                pending.extend(task.children)
+
+            for path in list(self._links):
+                if path not in seen and path not in changed:
+                    self._remove(path)
+
+
+_LINK_INDEX = LinkIndex()
+
+
+def get_link_index() -> LinkIndex:
+    return _LINK_INDEX
@@ -0,0 +1,527 @@
+import re
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, TextIO
+
+from terdo.utils.compression import open_note
+
+if TYPE_CHECKING:
+    from terdo.utils.scan import ScannedTask
+
+
+FRONT_MATTER_DELIMITER = "---"
+# Front matter is read line by line and never further than this
+MAX_FRONT_MATTER_BYTES = 64 * 1024
+# The excerpt of a note is taken from this much of the text after the front
+# matter, and cut to this length.
+EXCERPT_SOURCE_CHARS = 4 * 1024
+MAX_EXCERPT_LENGTH = 120
+
+_RELATIVE_DATE_PATTERN = re.compile(r"^(?P<amount>-?\d+)(?P<unit>[dw])$")
+_DUE_FILTER_PATTERN = re.compile(r"^(?P<operator><=|>=|<|>|=)?(?P<value>.+)$")
+# Markdown syntax at the start of a line: headings, quotes, list markers and
+# task checkboxes
+_LINE_MARKUP_PATTERN = re.compile(
+    r"^(?:#+\s|>\s?|[-*+]\s+(?:\[[ xX]\]\s+)?|\d+[.)]\s+)*"
+)
+
+
+def _parse_scalar(value: str) -> object:
+    """Parses a single YAML scalar value."""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    if value.lower() in ("true", "yes"):
+        return True
+    if value.lower() in ("false", "no"):
+        return False
+    if re.fullmatch(r"-?\d+", value):
+        return int(value)
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return value
+
+
+def parse_front_matter_lines(lines: list[str]) -> dict[str, object]:
+    """Parses the lines between the front matter delimiters.
+
+    Only the subset of YAML that is used for note metadata is supported:
+    ``key: value`` pairs, where a value is a scalar, a ``[flow, list]`` or a
+    block list of ``- item`` lines below the key.
+    """
+    metadata: dict[str, object] = {}
+    current_list: list[object] | None = None
+
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+
+        if stripped.startswith("- ") and current_list is not None:
+            current_list.append(_parse_scalar(stripped[2:]))
+            continue
+
+        key, separator, value = stripped.partition(":")
+        if not separator:
+            continue
+
+        key = key.strip().lower()
+        value = value.strip()
+        if not value:
+            current_list = []
+            metadata[key] = current_list
+        elif value.startswith("[") and value.endswith("]"):
+            current_list = None
+            metadata[key] = [
+                _parse_scalar(item) for item in value[1:-1].split(",") if item
+            ]
+        else:
+            current_list = None
+            metadata[key] = _parse_scalar(value)
+
+    return metadata
+
+
+def split_front_matter(content: str) -> tuple[dict[str, object], str]:
+    """Splits the content of a note into its front matter and its body."""
+    if not content.startswith(FRONT_MATTER_DELIMITER):
+        return {}, content
+
+    lines = content.split("\n")
+    if lines[0].strip() != FRONT_MATTER_DELIMITER:
+        return {}, content
+
+    for i, line in enumerate(lines[1:], start=1):
+        if line.strip() in (FRONT_MATTER_DELIMITER, "..."):
+            metadata = parse_front_matter_lines(lines[1:i])
+            return metadata, "\n".join(lines[i + 1 :])
+
+    return {}, content
+
+
+def _read_front_matter_lines(file: TextIO) -> dict[str, object]:
+    """Reads front matter up to the closing delimiter from an open note."""
+    lines: list[str] = []
+    n_bytes = 0
+    for line in file:
+        if line.strip() in (FRONT_MATTER_DELIMITER, "..."):
+            return parse_front_matter_lines(lines)
+        lines.append(line)
+        n_bytes += len(line)
+        if n_bytes > MAX_FRONT_MATTER_BYTES:
+            break
+    return {}
+
+
+def read_front_matter(path: Path) -> dict[str, object]:
+    """Reads the front matter of a note, without reading the rest of it."""
+    with open_note(path) as file:
+        if file.readline().strip() != FRONT_MATTER_DELIMITER:
+            return {}
+        return _read_front_matter_lines(file)
+
+
+def make_excerpt(text: str) -> str:
+    """Returns the first line of text of a note, without markdown syntax.
+
+    Headings are only used when the note has no other text, because they
+    usually repeat the name of the task.
+    """
+    heading = ""
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("```"):
+            continue
+        content = _LINE_MARKUP_PATTERN.sub("", stripped).strip()
+        if not content:
+            continue
+        if stripped.startswith("#"):
+            heading = heading or content
+            continue
+        return content[:MAX_EXCERPT_LENGTH]
+    return heading[:MAX_EXCERPT_LENGTH]
+
+
+def read_note_head(path: Path) -> tuple[dict[str, object], str]:
+    """Reads the front matter and the excerpt of a note.
+
+    Only the front matter and the first few KB after it are read, so this
+    is cheap even for very large notes.
+    """
+    with open_note(path) as file:
+        first_line = file.readline()
+        if first_line.strip() == FRONT_MATTER_DELIMITER:
+            front_matter = _read_front_matter_lines(file)
+            head = file.read(EXCERPT_SOURCE_CHARS)
+        else:
+            front_matter = {}
+            head = first_line + file.read(EXCERPT_SOURCE_CHARS)
+    return front_matter, make_excerpt(head)
+
+
+@dataclass(frozen=True)
+class TaskMetadata:
+    """The indexed metadata of a single note."""
+
+    tags: frozenset[str] = frozenset()
+    due: date | None = None
+    status: str | None = None
+    pin: int | None = None
+    # The first line of text of the note, shown in the task list
+    excerpt: str = ""
+
+    @classmethod
+    def from_front_matter(
+        cls, front_matter: dict[str, object], excerpt: str = ""
+    ) -> "TaskMetadata":
+        tags = front_matter.get("tags", front_matter.get("tag", []))
+        if isinstance(tags, str):
+            tags = [tag.strip() for tag in tags.split(",")]
+        if not isinstance(tags, list):
+            tags = [tags]
+
+        due = front_matter.get("due")
+        status = front_matter.get("status")
+        pin = front_matter.get("pin")
+        return cls(
+            tags=frozenset(str(tag).lower() for tag in tags if tag),
+            due=due if isinstance(due, date) else None,
+            status=None if status is None else str(status).lower(),
+            pin=pin if type(pin) is int else None,
+            excerpt=excerpt,
+        )
+
+
+def _parse_date(value: str, today: date) -> date:
+    """Parses an ISO date, a relative date like ``7d`` or ``2w``, or a name."""
+    value = value.lower()
+    if value == "today":
+        return today
+    if value == "tomorrow":
+        return today + timedelta(days=1)
+    if value == "yesterday":
+        return today - timedelta(days=1)
+
+    relative = _RELATIVE_DATE_PATTERN.match(value)
+    if relative is not None:
+        days = int(relative.group("amount"))
+        if relative.group("unit") == "w":
+            days *= 7
+        return today + timedelta(days=days)
+
+    return date.fromisoformat(value)
+
+
+@dataclass
+class MetadataQuery:
+    """A search query with metadata filters, like ``tag:ops due:<7d``.
+
+    Supported filters are ``tag:`` (all given tags must match), ``status:``
+    and ``due:``, which takes an optional comparison (``<``, ``<=``, ``>``,
+    ``>=`` or ``=``) followed by a date, ``today``, ``tomorrow`` or a relative
+    date like ``7d`` or ``2w``. All other words are matched against the
+    names of the tasks.
+    """
+
+    text: str = ""
+    tags: list[str] = field(default_factory=list)
+    status: str | None = None
+    due_from: date | None = None
+    due_until: date | None = None
+
+    @property
+    def has_filters(self) -> bool:
+        return bool(
+            self.tags
+            or self.status is not None
+            or self.due_from is not None
+            or self.due_until is not None
+        )
+
+    @classmethod
+    def parse(cls, query: str, today: date | None = None) -> "MetadataQuery":
+        today = today or date.today()
+        result = cls()
+        words: list[str] = []
+
+        for word in query.split():
+            key, separator, value = word.partition(":")
+            key = key.lower()
+            if not separator or not value:
+                words.append(word)
+            elif key == "tag":
+                result.tags.append(value.lower())
+            elif key == "status":
+                result.status = value.lower()
+            elif key == "due":
+                try:
+                    result._add_due_filter(value, today)
+                except ValueError:
+                    words.append(word)
+            else:
+                words.append(word)
+
+        result.text = " ".join(words)
+        return result
+
+    def _add_due_filter(self, value: str, today: date) -> None:
+        match = _DUE_FILTER_PATTERN.match(value)
+        assert match is not None
+        operator = match.group("operator") or "="
+        day = _parse_date(match.group("value"), today)
+
+        if operator in ("<", "<="):
+            self.due_until = day - timedelta(days=operator == "<")
+        elif operator in (">", ">="):
+            self.due_from = day + timedelta(days=operator == ">")
+        else:
+            self.due_from = self.due_until = day
+
+
+class MetadataIndex:
+    """Index of the front matter metadata of all notes in the vault.
+
+    Notes are found by tag and status with a dictionary lookup, and by due
+    date with a binary search in a sorted list, so no note has to be read to
+    answer a query. Tasks are changed from a background thread, so all
+    access goes through a lock.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._by_path: dict[Path, TaskMetadata] = {}
+        # The indexed notes by the directory they are in, so that moving a
+        # directory doesn't have to look at every note.
+        self._by_dir: dict[Path, set[Path]] = {}
+        self._by_tag: dict[str, set[Path]] = {}
+        self._by_status: dict[str, set[Path]] = {}
+        # Sorted (due date, path) pairs
+        self._due: list[tuple[date, str]] = []
+        # Paths changed while scans were running, see ``track_changes``
+        self._trackers: list[set[Path]] = []
+        # The modification time and size of notes when their metadata was
+        # last looked up, to notice changes made outside of the app
+        self._stats: dict[Path, tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_path)
+
+    def __contains__(self, path: Path) -> bool:
+        return path in self._by_path
+
+    def get(self, path: Path) -> TaskMetadata | None:
+        return self._by_path.get(path)
+
+    def get_or_read(self, path: Path) -> TaskMetadata:
+        """Returns the metadata of a note, reading its head if not indexed.
+
+        What is read is stored with the modification time and size of the
+        note, so showing the same note again only takes a ``stat`` call,
+        while a note that changed outside of the app is read again.
+        """
+        try:
+            stat = path.stat()
+        except OSError:
+            return self._by_path.get(path) or TaskMetadata()
+        stats = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            metadata = self._by_path.get(path)
+            # Metadata that was indexed by a scan or by the app itself is
+            # current, so only the stats are recorded for it.
+            if metadata is not None and self._stats.get(path, stats) == stats:
+                self._stats[path] = stats
+                return metadata
+
+        metadata = read_task_metadata(path)
+        with self._lock:
+            self.update(path, metadata)
+            self._stats[path] = stats
+        return metadata
+
+    def update(self, path: Path, metadata: TaskMetadata) -> None:
+        """Sets the metadata of a note, replacing what was indexed before."""
+        with self._lock:
+            self._track(path)
+            self._update(path, metadata)
+
+    def _update(self, path: Path, metadata: TaskMetadata) -> None:
+        self._remove(path)
+        self._stats.pop(path, None)
+        self._by_path[path] = metadata
+        self._by_dir.setdefault(path.parent, set()).add(path)
+        for tag in metadata.tags:
+            self._by_tag.setdefault(tag, set()).add(path)
+        if metadata.status is not None:
+            self._by_status.setdefault(metadata.status, set()).add(path)
+        if metadata.due is not None:
+            insort(self._due, (metadata.due, str(path)))
+
+    def update_from_content(self, path: Path, content: str) -> None:
+        """Updates the metadata of a note from its new content."""
+        front_matter, body = split_front_matter(content)
+        excerpt = make_excerpt(body[:EXCERPT_SOURCE_CHARS])
+        self.update(path, TaskMetadata.from_front_matter(front_matter, excerpt))
+
+    def remove(self, path: Path) -> None:
+        """Removes a note from the index."""
+        with self._lock:
+            self._track(path)
+            self._remove(path)
+
+    def _remove(self, path: Path) -> None:
+        self._stats.pop(path, None)
+        metadata = self._by_path.pop(path, None)
+        if metadata is None:
+            return
+
+        self._discard(self._by_dir, path.parent, path)
+        for tag in metadata.tags:
+            self._discard(self._by_tag, tag, path)
+        if metadata.status is not None:
+            self._discard(self._by_status, metadata.status, path)
+        if metadata.due is not None:
+            position = bisect_left(self._due, (metadata.due, str(path)))
+            if self._due[position : position + 1] == [
+                (metadata.due, str(path))
+            ]:
+                del self._due[position]
+
+    @staticmethod
+    def _discard[K](index: dict[K, set[Path]], key: K, path: Path) -> None:
+        paths = index.get(key)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del index[key]
+
+    def move(self, old_path: Path, new_path: Path) -> None:
+        """Moves the metadata of a note, or of all notes in a directory."""
+        with self._lock:
+            moved = [old_path] if old_path in self._by_path else []
+            for dir in list(self._by_dir):
+                if dir.is_relative_to(old_path):
+                    moved.extend(self._by_dir[dir])
+            for path in moved:
+                metadata = self._by_path[path]
+                self.remove(path)
+                self.update(new_path / path.relative_to(old_path), metadata)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._by_path.clear()
+            self._stats.clear()
+            self._by_dir.clear()
+            self._by_tag.clear()
+            self._by_status.clear()
+            self._due.clear()
+
+    def add_scanned(self, tasks: list["ScannedTask"]) -> None:
+        """Adds the results of a scan to the index.
+
+        The scan must visit notes with ``read_task_metadata``, combined under the
+        name ``metadata``.
+        """
+        with self._lock:
+            pending = list(tasks)
+            while pending:
+                task = pending.pop()
+                metadata = task.visited("metadata")
+                if metadata is not None:
+                    self.update(task.path, metadata)
+                pending.extend(task.children)
+
+    def _track(self, path: Path) -> None:
+        for changed in self._trackers:
+            changed.add(path)
+
+    @contextmanager
+    def track_changes(self) -> Iterator[set[Path]]:
+        """Collects the paths of the notes that change, e.g. during a scan.
+
+        The paths are collected in the yielded set until the block ends.
+        """
+        changed: set[Path] = set()
+        with self._lock:
+            self._trackers.append(changed)
+        try:
+            yield changed
+        finally:
+            with self._lock:
+                self._trackers = [
+                    tracker
+                    for tracker in self._trackers
+                    if tracker is not changed
+                ]
+
+    def replace_scanned(
+        self, tasks: list["ScannedTask"], changed: set[Path]
+    ) -> None:
+        """Replaces the index by the results of a scan of the whole vault.
+
+        The notes in ``changed``, which were tracked since the scan started,
+        were changed while the scan ran, so they keep what they have now.
+        All other notes that the scan didn't find are removed.
+        """
+        with self._lock:
+            seen: set[Path] = set()
+            pending = list(tasks)
+            while pending:
+                task = pending.pop()
+                path = task.path
+                seen.add(path)
+                metadata = task.visited("metadata")
+                if metadata is not None and path not in changed:
+                    self._update(path, metadata)
+                pending.extend(task.children)
+
+            for path in list(self._by_path):
+                if path not in seen and path not in changed:
+                    self._remove(path)
+
+    def query(self, query: MetadataQuery) -> set[Path]:
+        """Returns the paths of the notes that match all filters of a query."""
+        with self._lock:
+            results: set[Path] | None = None
+
+            def narrow(paths: set[Path]) -> None:
+                nonlocal results
+                results = set(paths) if results is None else results & paths
+
+            for tag in query.tags:
+                narrow(self._by_tag.get(tag, set()))
+            if query.status is not None:
+                narrow(self._by_status.get(query.status, set()))
+            if query.due_from is not None or query.due_until is not None:
+                start = 0
+                end = len(self._due)
+                if query.due_from is not None:
+                    start = bisect_left(self._due, (query.due_from, ""))
+                if query.due_until is not None:
+                    end = bisect_right(
+                        self._due, (query.due_until + timedelta(days=1), "")
+                    )
+                narrow({Path(path) for _, path in self._due[start:end]})
+
+            return results or set()
+
+
+def read_task_metadata(path: Path) -> TaskMetadata:
+    """Reads the indexed metadata of a note. Used as visitor in scans."""
+    try:
+        return TaskMetadata.from_front_matter(*read_note_head(path))
+    except OSError:
+        return TaskMetadata()
+
+
+_METADATA_INDEX = MetadataIndex()
+
+
+def get_metadata_index() -> MetadataIndex:
+    return _METADATA_INDEX
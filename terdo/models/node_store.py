@@ -0,0 +1,203 @@
+import sys
+from array import array
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+
+from terdo.models.task import Task
+from terdo.utils.compression import NOTE_SUFFIXES
+from terdo.utils.scan import ScannedTask, scan_tree
+
+ROOT_INDEX = -1
+
+
+class NodeStore:
+    """Compact storage for the tasks of a whole vault.
+
+    Instead of one Task object per task, every attribute is kept in its own
+    column, and a task is identified by its index in those columns. Names are
+    interned, the location of a task is stored as the index of its parent,
+    and the numeric columns are arrays. Task objects are only created when
+    they are asked for.
+
+    The tasks are stored breadth first, so the subtasks of every task (and
+    the tasks in the root) are stored next to each other.
+    """
+
+    root: Path
+    names: list[str]
+    parents: array
+    is_directory: bytearray
+    mtime: array
+    last_edited: array
+    created: array
+    # For directories, the size of the whole subtree
+    size: array
+    n_subtasks: array
+    n_descendants: array
+    first_child: array
+    # The index of the suffix of the note in NOTE_SUFFIXES
+    suffixes: bytearray
+    # The result of the visit function of the scan, for every task
+    data: list[object]
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.names = []
+        self.parents = array("i")
+        self.is_directory = bytearray()
+        self.mtime = array("d")
+        self.last_edited = array("d")
+        self.created = array("d")
+        self.size = array("q")
+        self.n_subtasks = array("I")
+        self.n_descendants = array("I")
+        self.first_child = array("i")
+        self.suffixes = bytearray()
+        self.data = []
+        self._n_root_tasks = 0
+
+    @classmethod
+    def from_scan(cls, root: Path, tasks: list[ScannedTask]) -> "NodeStore":
+        """Builds a store from the result of a tree scan."""
+        store = cls(root)
+        store._n_root_tasks = len(tasks)
+
+        # Breadth first, so that the children of a task get adjacent indices
+        level: list[tuple[int, ScannedTask]] = [
+            (ROOT_INDEX, task) for task in tasks
+        ]
+        while level:
+            # The next level is stored right after the current one
+            next_level_start = len(store.names) + len(level)
+            next_level: list[tuple[int, ScannedTask]] = []
+            for parent, task in level:
+                index = store._append(parent, task)
+                store.first_child.append(
+                    next_level_start + len(next_level)
+                    if task.children
+                    else ROOT_INDEX
+                )
+                next_level.extend((index, child) for child in task.children)
+            level = next_level
+
+        return store
+
+    @classmethod
+    def scan(cls, root: Path, max_workers: int | None = None) -> "NodeStore":
+        """Scans a directory and stores all tasks below it."""
+        return cls.from_scan(root, scan_tree(root, max_workers))
+
+    def _append(self, parent: int, task: ScannedTask) -> int:
+        self.names.append(sys.intern(task.name))
+        self.parents.append(parent)
+        self.is_directory.append(task.is_directory)
+        self.mtime.append(task.mtime)
+        self.last_edited.append(task.last_edited)
+        self.created.append(task.created)
+        self.size.append(task.size)
+        self.n_subtasks.append(len(task.children))
+        self.n_descendants.append(task.n_descendants)
+        self.suffixes.append(NOTE_SUFFIXES.index(task.suffix))
+        self.data.append(task.data)
+        return len(self.names) - 1
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def children(self, index: int = ROOT_INDEX) -> range:
+        """Returns the indices of the subtasks of a task, or the root tasks."""
+        if index == ROOT_INDEX:
+            return range(self._n_root_tasks)
+
+        start = self.first_child[index]
+        if start == ROOT_INDEX:
+            return range(0)
+        return range(start, start + self.n_subtasks[index])
+
+    def find_dir(self, dir: Path) -> int | None:
+        """Returns the index of the task whose subtasks are in dir.
+
+        Returns ``ROOT_INDEX`` for the root, and None if dir is not the
+        directory of a stored task.
+        """
+        if not dir.is_relative_to(self.root):
+            return None
+        index = ROOT_INDEX
+        for name in dir.relative_to(self.root).parts:
+            for child in self.children(index):
+                if self.names[child] == name and self.is_directory[child]:
+                    index = child
+                    break
+            else:
+                return None
+        return index
+
+    def dir_of(self, index: int) -> Path:
+        """Returns the directory that contains a task."""
+        parts: list[str] = []
+        parent = self.parents[index]
+        while parent != ROOT_INDEX:
+            parts.append(self.names[parent])
+            parent = self.parents[parent]
+        return self.root.joinpath(*reversed(parts))
+
+    def task(self, index: int) -> Task:
+        """Creates the Task object for a stored task."""
+        if self.is_directory[index] and self.n_subtasks[index] == 0:
+            # Same as ScannedTask.to_task: validation turns this into a file
+            return Task(name=self.names[index], dir=self.dir_of(index))
+
+        return Task.from_scan(
+            name=self.names[index],
+            dir=self.dir_of(index),
+            is_directory=bool(self.is_directory[index]),
+            last_edited=datetime.fromtimestamp(self.last_edited[index]),
+            n_subtasks=self.n_subtasks[index],
+            created=datetime.fromtimestamp(self.created[index]),
+            size=self.size[index],
+            suffix=NOTE_SUFFIXES[self.suffixes[index]],
+        )
+
+    def scanned(
+        self, index: int, dir: Path | None = None, recursive: bool = True
+    ) -> ScannedTask:
+        """Rebuilds the scanned task for a stored task.
+
+        Parameters
+        ----------
+        index
+            The index of the task.
+        dir
+            The directory of the task, if it is already known.
+        recursive
+            Whether to rebuild the subtree too. Otherwise the children are
+            left empty, and only their number is kept.
+        """
+        name = self.names[index]
+        if dir is None:
+            dir = self.dir_of(index)
+        children = (
+            [self.scanned(child, dir / name) for child in self.children(index)]
+            if recursive
+            else []
+        )
+        return ScannedTask(
+            name=name,
+            dir=dir,
+            is_directory=bool(self.is_directory[index]),
+            mtime=self.mtime[index],
+            created=self.created[index],
+            size=self.size[index],
+            children=children,
+            last_edited=self.last_edited[index],
+            n_descendants=self.n_descendants[index],
+            data=self.data[index],
+            suffix=NOTE_SUFFIXES[self.suffixes[index]],
+            n_subtasks=None if recursive else self.n_subtasks[index],
+        )
+
+    def tasks(self, index: int = ROOT_INDEX) -> Iterator[Task]:
+        """Creates the Task objects for the subtasks of a task."""
+        for child in self.children(index):
+            yield self.task(child)
@@ -0,0 +1,78 @@
+import heapq
+from collections.abc import Callable
+from enum import StrEnum
+from typing import TYPE_CHECKING
+
+from terdo.models.metadata import get_metadata_index
+
+if TYPE_CHECKING:
+    from terdo.models.task import Task
+
+
+class SortOrder(StrEnum):
+    """The orders in which the tasks in a directory can be shown."""
+
+    LAST_EDITED = "last-edited"
+    NAME = "name"
+    CREATED = "created"
+    SIZE = "size"
+    SUBTASKS = "subtasks"
+    PINNED = "pinned"
+
+    @property
+    def label(self) -> str:
+        """Returns the name of the order as it is shown to the user."""
+        return self.value.replace("-", " ")
+
+    def next(self) -> "SortOrder":
+        """Returns the order after this one, to cycle through all orders."""
+        orders = list(SortOrder)
+        return orders[(orders.index(self) + 1) % len(orders)]
+
+
+SortKey = Callable[["Task"], object]
+
+
+def _pinned_key(task: "Task") -> object:
+    # Pinned tasks come first, in the order of their pin number, followed by
+    # all other tasks from the most recently edited one.
+    metadata = get_metadata_index().get(task.path_to_file)
+    if metadata is not None and metadata.pin is not None:
+        return (0, metadata.pin, 0.0)
+    return (1, 0, -task.last_edited.timestamp())
+
+
+# Every key sorts ascending, so orders that show the largest value first
+# negate it.
+SORT_KEYS: dict[SortOrder, SortKey] = {
+    SortOrder.LAST_EDITED: lambda task: -task.last_edited.timestamp(),
+    SortOrder.NAME: lambda task: task.name.casefold(),
+    SortOrder.CREATED: lambda task: -task.created.timestamp(),
+    SortOrder.SIZE: lambda task: -task.size,
+    SortOrder.SUBTASKS: lambda task: -task.n_subtasks,
+    SortOrder.PINNED: _pinned_key,
+}
+
+
+def sort_tasks(
+    tasks: list["Task"],
+    order: SortOrder = SortOrder.LAST_EDITED,
+    limit: int | None = None,
+) -> list["Task"]:
+    """Sorts tasks, computing the sort key of every task only once.
+
+    Tasks that come from a scan already carry the values the keys are based
+    on, so sorting them again in another order doesn't touch the disk. When
+    only the first ``limit`` tasks are needed, they are selected with a heap
+    instead of sorting all tasks.
+    """
+    keys = [SORT_KEYS[order](task) for task in tasks]
+    positions = range(len(tasks))
+
+    if limit is not None and limit < len(tasks):
+        # The position breaks ties, so the selection is stable like sorted
+        selected = heapq.nsmallest(limit, positions, key=lambda i: (keys[i], i))
+    else:
+        selected = sorted(positions, key=keys.__getitem__)
+
+    return [tasks[i] for i in selected]
@@ -1,20 +1,36 @@
+from collections.abc import Sequence
 from pathlib import Path
 from pydantic import BaseModel, model_validator, ValidationError
 from pydantic_core import PydanticCustomError
 from datetime import datetime
 
+from terdo.models.links import get_link_index, read_task_links
+from terdo.models.metadata import get_metadata_index, read_task_metadata
+from terdo.models.sorting import SortOrder, sort_tasks
+from terdo.utils.compression import (
+    INDEX_FILE_NAME,
+    MARKDOWN_SUFFIX,
+    is_compressed,
+    note_size,
+    note_suffix,
+    read_note,
+    strip_note_suffix,
+    write_note,
+)
 from terdo.utils.io import (
     add_markdown_extension,
+    find_note_file,
     get_root_markdown_dir,
     create_new_markdown_file,
     get_default_new_file_name,
+    strip_lines,
+    write_lines,
 )
 
 
-INDEX_FILE_NAME = add_markdown_extension("_index")
-
-
-def load_tasks_in_dir(dir: Path) -> list["Task"]:
+def load_tasks_in_dir(
+    dir: Path, order: SortOrder = SortOrder.LAST_EDITED
+) -> list["Task"]:
     children: list["Task"] = []
     for file_or_dir in dir.iterdir():
         try:
@@ -27,8 +43,7 @@ def load_tasks_in_dir(dir: Path) -> list["Task"]:
         except ValidationError:
             # Ignore files that are not tasks
             pass
-    children = sorted(children, key=lambda x: x.last_edited, reverse=True)
-    return children
+    return sort_tasks(children, order)
 
 
 class Task(BaseModel):
@@ -38,9 +53,60 @@ class Task(BaseModel):
     _is_directory: bool | None = None
     _path_to_file: Path | None = None
 
+    # Filled in when the task comes from a tree scan, or else the first time
+    # they are needed, so that sorting and showing the task don't walk its
+    # subtree again.
+    _last_edited: datetime | None = None
+    _n_subtasks: int | None = None
+    _created: datetime | None = None
+    _size: int | None = None
+
+    @classmethod
+    def from_scan(
+        cls,
+        name: str,
+        dir: Path,
+        is_directory: bool,
+        last_edited: datetime | None = None,
+        n_subtasks: int | None = None,
+        created: datetime | None = None,
+        size: int | None = None,
+        suffix: str = MARKDOWN_SUFFIX,
+    ) -> "Task":
+        """Creates a task from the results of a scan without validating it.
+
+        The scan already established that the task exists, so the
+        filesystem is not checked again. Statistics that are not given are
+        computed when they are needed. The suffix of the note tells whether
+        it is compressed.
+        """
+        task = cls.model_construct(name=name, dir=dir)
+        task._is_directory = is_directory
+        if is_directory:
+            task._path_to_file = dir / name / INDEX_FILE_NAME
+        else:
+            task._path_to_file = dir / f"{name}{suffix}"
+        task._last_edited = last_edited
+        task._n_subtasks = n_subtasks
+        task._created = created
+        task._size = size
+        return task
+
+    @classmethod
+    def from_note_path(cls, path: Path) -> "Task":
+        """Creates a task from the path to its note, e.g. from an index."""
+        if path.name == INDEX_FILE_NAME:
+            return cls.from_scan(path.parent.name, path.parent.parent, True)
+        return cls.from_scan(
+            strip_note_suffix(path.name),
+            path.parent,
+            False,
+            suffix=note_suffix(path.name) or MARKDOWN_SUFFIX,
+        )
+
     @model_validator(mode="after")
     def _validate_path(self) -> "Task":
-        self.name = self.name.removesuffix(".md")
+        self.name = strip_note_suffix(self.name)
 
         # Hypothesis: the task is a directory that contains subtasks
         full_dir_path = self.dir / self.name
@@ -68,9 +134,10 @@ class Task(BaseModel):
                 "TaskInvalidName",
                 "Task name cannot be the same as the index file name.",
             )
-        full_file_path = self.dir / add_markdown_extension(self.name)
+        # Notes can also be compressed, like name.md.gz
+        full_file_path = find_note_file(self.dir, self.name)
 
-        if full_file_path.exists() and full_file_path.is_file():
+        if full_file_path is not None:
             self._is_directory = False
             self._path_to_file = full_file_path
             return self
@@ -86,21 +153,63 @@ class Task(BaseModel):
     def last_edited(self) -> datetime:
         """Returns the last edited time of the task."""
         assert self._path_to_file is not None, "Path to file is not set."
+        if self._last_edited is not None:
+            return self._last_edited
 
         # If the task is a directory, recursively get the last modified time of the latest subtask
         if self._is_directory:
             subtasks = self.children
-            latest_modified_time = max(
-                subtask.last_edited for subtask in subtasks
+            self._last_edited = max(subtask.last_edited for subtask in subtasks)
+        else:
+            self._last_edited = datetime.fromtimestamp(
+                self._path_to_file.stat().st_mtime
             )
-            return latest_modified_time
-        return datetime.fromtimestamp(self._path_to_file.stat().st_mtime)
+        return self._last_edited
+
+    @property
+    def created(self) -> datetime:
+        """Returns the time the note of the task was created.
+
+        Falls back to the last metadata change on systems that don't record
+        the creation time of files.
+        """
+        assert self._path_to_file is not None, "Path to file is not set."
+        if self._created is not None:
+            return self._created
+
+        stat = self._path_to_file.stat()
+        return datetime.fromtimestamp(
+            getattr(stat, "st_birthtime", stat.st_ctime)
+        )
+
+    @property
+    def size(self) -> int:
+        """Returns the size in bytes of the task, including its subtasks."""
+        assert self._path_to_file is not None, "Path to file is not set."
+        if self._size is not None:
+            return self._size
+
+        size = note_size(self._path_to_file, self._path_to_file.stat().st_size)
+        self._size = size + sum(subtask.size for subtask in self.children)
+        return self._size
+
+    @property
+    def path_to_file(self) -> Path:
+        """Returns the path to the file that holds the note of the task."""
+        assert self._path_to_file is not None, "Path to file is not set."
+        return self._path_to_file
+
+    @property
+    def _note_suffix(self) -> str:
+        """Returns the extension of the note, e.g. ``.md`` or ``.md.gz``."""
+        assert self._path_to_file is not None, "Path to file is not set."
+        return note_suffix(self._path_to_file.name) or MARKDOWN_SUFFIX
 
     @property
     def content(self) -> str:
         """Returns the content of the task."""
         assert self._path_to_file is not None, "Path to file is not set."
-        return self._path_to_file.read_text()
+        return read_note(self._path_to_file)
 
     @property
     def path_to_parent(self) -> Path:
@@ -129,55 +238,129 @@ class Task(BaseModel):
     @property
     def n_subtasks(self) -> int:
         """Returns the number of subtasks in the task."""
+        if self._n_subtasks is not None:
+            return self._n_subtasks
         return len(self.children)
 
+    def _clear_scanned_stats(self) -> None:
+        """Forgets the scanned statistics after the task was changed."""
+        self._last_edited = None
+        self._n_subtasks = None
+        self._created = None
+        self._size = None
+
+    def update_from(self, changed: "Task") -> None:
+        """Takes over the state of a copy of the task that was changed.
+
+        Changes are applied to a copy in the background, while the rows of
+        the app keep using the original. The original follows on the event
+        loop once the change is done.
+        """
+        self.name = changed.name
+        self.dir = changed.dir
+        self._is_directory = changed._is_directory
+        self._path_to_file = changed._path_to_file
+        self._clear_scanned_stats()
+
     def write(self, content: str) -> None:
         """Writes the content to the task."""
         assert self._path_to_file is not None, "Path to file is not set."
-        self._path_to_file.write_text(content)
+        self._clear_scanned_stats()
+        write_note(self._path_to_file, content)
+        get_metadata_index().update_from_content(self._path_to_file, content)
+        get_link_index().update_from_content(self._path_to_file, content)
+
+    def write_lines(self, lines: Sequence[str], newline: str = "\n") -> None:
+        """Writes the lines of an edited note, stripped like ``write``.
+
+        The lines are streamed to disk, so a large note is not joined into
+        one string first, and are separated by ``newline``. The indexes are
+        updated by reading the note back, for the metadata only its head.
+        """
+        assert self._path_to_file is not None, "Path to file is not set."
+        self._clear_scanned_stats()
+        write_lines(self._path_to_file, strip_lines(lines), newline)
+        get_metadata_index().update(
+            self._path_to_file, read_task_metadata(self._path_to_file)
+        )
+        get_link_index().update(
+            self._path_to_file, read_task_links(self._path_to_file)
+        )
 
     def delete(self) -> None:
         """Deletes the task."""
         assert self._path_to_file is not None, "Path to file is not set."
         self._path_to_file.unlink()
+        get_metadata_index().remove(self._path_to_file)
+        get_link_index().remove(self._path_to_file)
 
     def rename(self, new_name: str) -> None:
         """Renames the task."""
         assert self._path_to_file is not None, "Path to file is not set."
+        self._clear_scanned_stats()
         if self._is_directory:
             full_dir_path = self.dir / self.name
             full_dir_path.rename(self.dir / new_name).touch()
-            self._path_to_file = full_dir_path / INDEX_FILE_NAME
+            self._path_to_file = self.dir / new_name / INDEX_FILE_NAME
+            get_metadata_index().move(full_dir_path, self.dir / new_name)
+            get_link_index().move(full_dir_path, self.dir / new_name)
 
         else:
-            new_path = self.dir / add_markdown_extension(new_name)
+            new_path = self.dir / f"{new_name}{self._note_suffix}"
             self._path_to_file.rename(new_path).touch()
+            get_metadata_index().move(self._path_to_file, new_path)
+            get_link_index().move(self._path_to_file, new_path)
             self._path_to_file = new_path
 
+        if self._path_to_file not in get_link_index():
+            # New tasks are renamed right after they are created, which is
+            # when they become known under their name.
+            get_link_index().update(
+                self._path_to_file, read_task_links(self._path_to_file)
+            )
         self.name = new_name
 
     def move_to_dir(self, dir: Path) -> None:
+        self._clear_scanned_stats()
         if self._is_directory:
             full_dir_path = self.dir / self.name
             full_dir_path.rename(dir / self.name)
+            get_metadata_index().move(full_dir_path, dir / self.name)
+            get_link_index().move(full_dir_path, dir / self.name)
             self.dir = dir
 
             self._path_to_file = self.dir / self.name / INDEX_FILE_NAME
             self._path_to_file.touch()
         else:
             assert self._path_to_file is not None, "Path to file is not set."
-            new_path = dir / add_markdown_extension(self.name)
+            new_path = dir / f"{self.name}{self._note_suffix}"
             self._path_to_file.rename(new_path).touch()
+            get_metadata_index().move(self._path_to_file, new_path)
+            get_link_index().move(self._path_to_file, new_path)
             self._path_to_file = new_path
             self.dir = dir
 
     def _change_into_dir(self) -> None:
         assert self._path_to_file is not None, "Path to file is not set."
+        self._clear_scanned_stats()
         full_dir_path = self.dir / self.name
 
         if not self._is_directory:
             full_dir_path.mkdir()
-            self._path_to_file.rename(full_dir_path / INDEX_FILE_NAME)
+            if is_compressed(self._path_to_file):
+                # Index notes are never compressed
+                (full_dir_path / INDEX_FILE_NAME).write_text(
+                    read_note(self._path_to_file)
+                )
+                self._path_to_file.unlink()
+            else:
+                self._path_to_file.rename(full_dir_path / INDEX_FILE_NAME)
+            get_metadata_index().move(
+                self._path_to_file, full_dir_path / INDEX_FILE_NAME
+            )
+            get_link_index().move(
+                self._path_to_file, full_dir_path / INDEX_FILE_NAME
+            )
 
             self._is_directory = True
             self._path_to_file = full_dir_path / INDEX_FILE_NAME
@@ -0,0 +1,315 @@
+import gzip
+import io
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, TextIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MARKDOWN_SUFFIX = ".md"
+GZIP_SUFFIX = ".md.gz"
+ZSTD_SUFFIX = ".md.zst"
+COMPRESSED_SUFFIXES = (GZIP_SUFFIX, ZSTD_SUFFIX)
+NOTE_SUFFIXES = (MARKDOWN_SUFFIX, *COMPRESSED_SUFFIXES)
+# The note of a task with subtasks, in the directory of the task
+INDEX_FILE_NAME = "_index" + MARKDOWN_SUFFIX
+
+# Decompressed notes are kept in memory up to this many characters in total
+NOTE_CACHE_CHARS = 32 * 1024 * 1024
+# Enough of the start of a zstandard frame to read the size of its content
+ZSTD_HEADER_BYTES = 18
+
+
+class CompressionUnavailableError(OSError):
+    """Raised for zstandard compressed notes when it is not installed."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            "Notes compressed with zstandard need the zstandard package."
+        )
+
+
+def note_suffix(file_name: str) -> str | None:
+    """Returns the markdown suffix of a file name, or None for other files."""
+    for suffix in COMPRESSED_SUFFIXES:
+        if file_name.endswith(suffix):
+            return suffix
+    if file_name.endswith(MARKDOWN_SUFFIX):
+        return MARKDOWN_SUFFIX
+    return None
+
+
+def strip_note_suffix(file_name: str) -> str:
+    """Returns the name of the task that a note file belongs to."""
+    suffix = note_suffix(file_name)
+    return file_name if suffix is None else file_name.removesuffix(suffix)
+
+
+def is_compressed(path: Path) -> bool:
+    return path.name.endswith(COMPRESSED_SUFFIXES)
+
+
+def _zstandard() -> object:
+    if zstandard is None:
+        raise CompressionUnavailableError()
+    return zstandard
+
+
+def open_note_binary(
+    path: Path, mode: str = "rb", suffix: str | None = None
+) -> BinaryIO:
+    """Opens a note as a stream of its uncompressed bytes.
+
+    The compression is taken from the suffix of the path, unless another
+    suffix is given, e.g. for a temporary file.
+    """
+    suffix = suffix or note_suffix(path.name)
+    if suffix == GZIP_SUFFIX:
+        return gzip.open(path, mode)
+    if suffix == ZSTD_SUFFIX:
+        return _zstandard().open(path, mode)
+    return open(path, mode)
+
+
+def open_note(
+    path: Path,
+    mode: str = "r",
+    suffix: str | None = None,
+    newline: str | None = None,
+) -> TextIO:
+    """Opens a note as text, decompressing it while it is read."""
+    suffix = suffix or note_suffix(path.name)
+    if suffix not in COMPRESSED_SUFFIXES:
+        return open(
+            path, mode, encoding="utf-8", errors="replace", newline=newline
+        )
+    return io.TextIOWrapper(
+        open_note_binary(path, mode + "b", suffix),
+        encoding="utf-8",
+        errors="replace",
+        newline=newline,
+    )
+
+
+class NoteCache:
+    """The decompressed text of the most recently read compressed notes.
+
+    An entry is only used while the size and the modification time of the
+    note are unchanged, so notes changed on disk are read again.
+    """
+
+    def __init__(self, max_chars: int = NOTE_CACHE_CHARS) -> None:
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._notes: OrderedDict[Path, tuple[tuple[int, int], str]] = (
+            OrderedDict()
+        )
+        self._n_chars = 0
+
+    def read(self, path: Path) -> str:
+        stat = path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._notes.get(path)
+            if cached is not None and cached[0] == key:
+                self._notes.move_to_end(path)
+                return cached[1]
+
+        with open_note(path) as file:
+            content = file.read()
+
+        with self._lock:
+            self._forget(path)
+            if len(content) <= self.max_chars:
+                self._notes[path] = (key, content)
+                self._n_chars += len(content)
+                while self._n_chars > self.max_chars:
+                    _, (_, evicted) = self._notes.popitem(last=False)
+                    self._n_chars -= len(evicted)
+        return content
+
+    def forget(self, path: Path) -> None:
+        with self._lock:
+            self._forget(path)
+
+    def _forget(self, path: Path) -> None:
+        cached = self._notes.pop(path, None)
+        if cached is not None:
+            self._n_chars -= len(cached[1])
+
+
+_NOTE_CACHE = NoteCache()
+
+
+def get_note_cache() -> NoteCache:
+    return _NOTE_CACHE
+
+
+def read_note(path: Path) -> str:
+    """Reads the whole text of a note, compressed notes through the cache."""
+    if is_compressed(path):
+        return get_note_cache().read(path)
+    return path.read_text()
+
+
+def note_size(path: Path, file_size: int) -> int:
+    """Returns the size of the text of a note, given the size of its file.
+
+    For compressed notes, this is the size of the text before it was
+    compressed, as stored by gzip (modulo 4 GiB) or in the header of a
+    zstandard frame. Notes that don't store it are measured by decompressing
+    them.
+    """
+    suffix = note_suffix(path.name)
+    if suffix not in COMPRESSED_SUFFIXES:
+        return file_size
+    try:
+        if suffix == GZIP_SUFFIX:
+            with open(path, "rb") as file:
+                file.seek(-4, os.SEEK_END)
+                return struct.unpack("<I", file.read(4))[0]
+        return _zstd_content_size(path)
+    except OSError:
+        return file_size
+
+
+def _zstd_content_size(path: Path) -> int:
+    zstd = _zstandard()
+    try:
+        with open(path, "rb") as file:
+            size = zstd.frame_content_size(file.read(ZSTD_HEADER_BYTES))
+        if size >= 0:
+            return size
+        # Only notes that were written as a stream lack the size
+        with open_note_binary(path) as file:
+            return sum(map(len, iter(lambda: file.read(1024 * 1024), b"")))
+    except zstd.ZstdError as error:
+        raise OSError(f"{path} is not a valid zstandard file.") from error
+
+
+@contextmanager
+def replace_atomically(path: Path) -> Iterator[Path]:
+    """Yields a temporary path next to a file, which replaces the file once
+    the block finished, so the file is never left half written."""
+    fd, temporary_path = tempfile.mkstemp(
+        dir=path.parent, prefix=".", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        yield Path(temporary_path)
+        if path.exists():
+            shutil.copymode(path, temporary_path)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def write_note(path: Path, content: str) -> None:
+    """Writes the text of a note, compressing it like it was stored."""
+    if not is_compressed(path):
+        path.write_text(content)
+        return
+
+    get_note_cache().forget(path)
+    suffix = note_suffix(path.name)
+    with replace_atomically(path) as temporary_path:
+        if suffix == ZSTD_SUFFIX:
+            # Compressed at once, which stores the size of the text
+            temporary_path.write_bytes(
+                _zstandard()
+                .ZstdCompressor()
+                .compress(content.encode("utf-8", errors="replace"))
+            )
+        else:
+            with open_note(temporary_path, "w", suffix=suffix) as file:
+                file.write(content)
+
+
+def compress_note(path: Path, suffix: str = GZIP_SUFFIX) -> Path:
+    """Replaces a plain note by a compressed one, and returns its path.
+
+    The compressed note keeps the modification time of the original, so
+    the task keeps its place in the list.
+
+    Raises
+    ------
+    FileExistsError
+        If the note already has a compressed version, which would make two
+        notes of the same task.
+    """
+    target = path.with_name(strip_note_suffix(path.name) + suffix)
+    if compressed_version(path) is not None:
+        raise FileExistsError(f"{path} already has a compressed version.")
+    stat = path.stat()
+    with replace_atomically(target) as temporary_path:
+        with open(path, "rb") as source:
+            if suffix == ZSTD_SUFFIX:
+                # Stores the size of the text in the frame, see note_size
+                with open(temporary_path, "wb") as output:
+                    _zstandard().ZstdCompressor().copy_stream(
+                        source, output, size=stat.st_size
+                    )
+            else:
+                with open_note_binary(temporary_path, "wb", suffix) as output:
+                    shutil.copyfileobj(source, output)
+        shutil.copymode(path, temporary_path)
+        os.utime(temporary_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    path.unlink()
+    return target
+
+
+def compressed_version(path: Path) -> Path | None:
+    """Returns a compressed note of the same task as a plain note, if any."""
+    name = strip_note_suffix(path.name)
+    for suffix in COMPRESSED_SUFFIXES:
+        compressed = path.with_name(name + suffix)
+        if compressed.exists():
+            return compressed
+    return None
+
+
+def iter_cold_notes(root: Path, days: float) -> Iterator[Path]:
+    """Yields the plain notes below root that were not changed for days.
+
+    Index notes are skipped, because they mark directories as tasks, and so
+    are notes that already have a compressed version.
+    """
+    cutoff = time.time() - days * 24 * 60 * 60
+    for dir, subdirs, files in os.walk(root):
+        subdirs[:] = [name for name in subdirs if not name.startswith(".")]
+        for name in files:
+            if name == INDEX_FILE_NAME or not name.endswith(MARKDOWN_SUFFIX):
+                continue
+            path = Path(dir) / name
+            if (
+                path.stat().st_mtime < cutoff
+                and compressed_version(path) is None
+            ):
+                yield path
+
+
+def archive_notes(
+    root: Path, days: float, suffix: str = GZIP_SUFFIX
+) -> list[Path]:
+    """Compresses all notes that were not changed for the given days.
+
+    Returns the paths of the compressed notes.
+    """
+    if suffix == ZSTD_SUFFIX:
+        # Fail before any note is touched
+        _zstandard()
+    cold_notes = list(iter_cold_notes(root, days))
+    return [compress_note(path, suffix) for path in cold_notes]
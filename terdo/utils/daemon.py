@@ -0,0 +1,436 @@
+"""A background process that keeps the scanned vault in memory.
+
+The daemon scans the vault once, keeps the tree together with the metadata
+and links of every note, and rescans it when a client reports a change or
+when polling finds one. Only notes that changed since the last scan are
+read again. Clients connect over a Unix domain socket, which lives in
+``get_state_dir()`` and is named after the root of the vault, so several
+vaults can each have their own daemon.
+
+Requests and responses are JSON objects, one per line:
+
+``{"method": "scan", "dir": ..., "recursive": false}``
+    Returns the tasks in a directory of the vault, with the number of their
+    subtasks, or with their whole subtrees when ``recursive`` is true.
+    Rescans that were asked for before are waited for.
+``{"method": "touched"}``
+    Starts a rescan of the vault. There is no response, so a client doesn't
+    wait for the rescan.
+``{"method": "subscribe"}``
+    Keeps the connection open and sends ``{"changed": [...]}`` with the
+    paths of the notes that changed after every rescan.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import threading
+from collections.abc import Iterator
+from datetime import date
+from pathlib import Path
+from typing import BinaryIO
+
+from terdo.models.links import read_task_links
+from terdo.models.metadata import TaskMetadata, read_task_metadata
+from terdo.models.node_store import NodeStore
+from terdo.utils.io import get_root_markdown_dir, get_state_dir
+from terdo.utils.scan import ScannedTask, combine_visitors, scan_tree
+
+# Changes made outside of any client are found by rescanning this often.
+# Every rescan stats all notes, which adds up for large or remote vaults.
+POLL_INTERVAL = 5.0
+# Connecting to a daemon that doesn't respond quickly is not worth waiting
+# for, the vault can be scanned directly instead.
+CONNECT_TIMEOUT = 0.5
+REQUEST_TIMEOUT = 30.0
+
+_visit = combine_visitors(metadata=read_task_metadata, links=read_task_links)
+
+
+class DaemonError(Exception):
+    """Raised when the daemon can't answer a request."""
+
+
+def get_socket_path(root: Path) -> Path:
+    """Returns the path of the socket of the daemon for a vault."""
+    digest = hashlib.sha256(str(root).encode()).hexdigest()[:16]
+    return get_state_dir() / f"daemon-{digest}.sock"
+
+
+def _metadata_to_json(metadata: TaskMetadata | None) -> dict | None:
+    if metadata is None:
+        return None
+    return {
+        "tags": sorted(metadata.tags),
+        "due": None if metadata.due is None else metadata.due.isoformat(),
+        "status": metadata.status,
+        "pin": metadata.pin,
+        "excerpt": metadata.excerpt,
+    }
+
+
+def _metadata_from_json(data: dict | None) -> TaskMetadata | None:
+    if data is None:
+        return None
+    return TaskMetadata(
+        tags=frozenset(data["tags"]),
+        due=None if data["due"] is None else date.fromisoformat(data["due"]),
+        status=data["status"],
+        pin=data["pin"],
+        excerpt=data["excerpt"],
+    )
+
+
+def task_to_json(task: ScannedTask) -> dict:
+    """Turns a scanned task and its subtree, if it has one, into JSON data."""
+    links = task.visited("links")
+    return {
+        "name": task.name,
+        "is_directory": task.is_directory,
+        "mtime": task.mtime,
+        "created": task.created,
+        "size": task.size,
+        "last_edited": task.last_edited,
+        "n_descendants": task.n_descendants,
+        "suffix": task.suffix,
+        "metadata": _metadata_to_json(task.visited("metadata")),
+        "links": None if links is None else sorted(links),
+        "children": [task_to_json(child) for child in task.children],
+        "n_subtasks": task.n_subtasks,
+    }
+
+
+def task_from_json(data: dict, dir: Path) -> ScannedTask:
+    """Turns JSON data made by ``task_to_json`` back into a scanned task.
+
+    The results of the visitors are stored like those of a scan with
+    ``read_task_metadata`` and ``read_task_links``, so the task can be
+    added to both indexes.
+    """
+    links = data["links"]
+    return ScannedTask(
+        name=data["name"],
+        dir=dir,
+        is_directory=data["is_directory"],
+        mtime=data["mtime"],
+        created=data["created"],
+        size=data["size"],
+        children=[
+            task_from_json(child, dir / data["name"])
+            for child in data["children"]
+        ],
+        last_edited=data["last_edited"],
+        n_descendants=data["n_descendants"],
+        suffix=data["suffix"],
+        n_subtasks=data["n_subtasks"],
+        data={
+            "metadata": _metadata_from_json(data["metadata"]),
+            "links": None if links is None else frozenset(links),
+        },
+    )
+
+
+class VaultDaemon:
+    """Serves the scanned tree of a vault to the clients of a socket."""
+
+    def __init__(
+        self, root: Path | None = None, poll_interval: float = POLL_INTERVAL
+    ) -> None:
+        self.root = root or get_root_markdown_dir()
+        self.socket_path = get_socket_path(self.root)
+        self.poll_interval = poll_interval
+        # The scanned tree, in columns instead of objects, so that a large
+        # vault stays small in memory.
+        self._store = NodeStore(self.root)
+        # The (mtime, size) of every note and what the visitors returned for
+        # it, so that unchanged notes are not read again.
+        self._visited: dict[Path, tuple[tuple[int, int], object]] = {}
+        self._scan_lock = asyncio.Lock()
+        # Rescans that clients asked for and that haven't finished yet
+        self._touches: set[asyncio.Task] = set()
+        self._subscribers: set[asyncio.StreamWriter] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopped: asyncio.Event | None = None
+
+    def _visit_cached(
+        self,
+        path: Path,
+        stat: os.stat_result,
+        seen: dict[Path, tuple[int, int]],
+    ) -> object:
+        # The stat is the one the scan listed the note with
+        key = (stat.st_mtime_ns, stat.st_size)
+        seen[path] = key
+        cached = self._visited.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        result = _visit(path)
+        self._visited[path] = (key, result)
+        return result
+
+    def rescan(self) -> set[Path]:
+        """Scans the vault again and returns the notes that changed.
+
+        Runs in a thread, and the visitors run in the threads of the scan.
+        """
+        before = {path: key for path, (key, _) in self._visited.items()}
+        seen: dict[Path, tuple[int, int]] = {}
+        tasks = scan_tree(
+            self.root,
+            visit_with_stat=lambda path, stat: self._visit_cached(
+                path, stat, seen
+            ),
+        )
+
+        store = NodeStore.from_scan(self.root, tasks)
+        changed = {
+            path
+            for path in seen.keys() | before.keys()
+            if seen.get(path) != before.get(path)
+        }
+        # Forget the notes that were removed
+        self._visited = {path: self._visited[path] for path in seen}
+        self._store = store
+        return changed
+
+    async def refresh(self) -> None:
+        """Rescans the vault and tells all subscribers what changed."""
+        async with self._scan_lock:
+            changed = await asyncio.to_thread(self.rescan)
+        if not changed:
+            return
+
+        message = json.dumps({"changed": sorted(map(str, changed))}) + "\n"
+        for writer in list(self._subscribers):
+            try:
+                writer.write(message.encode())
+                await writer.drain()
+            except ConnectionError:
+                self._subscribers.discard(writer)
+
+    def touched(self) -> None:
+        """Starts a rescan after a client changed the vault."""
+        touch = asyncio.create_task(self.refresh())
+        self._touches.add(touch)
+        touch.add_done_callback(self._touches.discard)
+
+    async def _respond(self, request: dict) -> dict:
+        method = request.get("method")
+        if method == "scan":
+            if self._touches:
+                # The client expects to see the changes it reported
+                await asyncio.wait(set(self._touches))
+            store = self._store
+            dir = Path(request["dir"])
+            recursive = bool(request.get("recursive", False))
+            index = store.find_dir(dir)
+            if index is None:
+                return {"error": f"{dir} is not a scanned directory"}
+            return {
+                "tasks": [
+                    task_to_json(store.scanned(child, dir, recursive))
+                    for child in store.children(index)
+                ]
+            }
+        return {"error": f"Unknown method {method!r}"}
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            async for line in reader:
+                request = json.loads(line)
+                if request.get("method") == "touched":
+                    self.touched()
+                    continue
+                if request.get("method") == "subscribe":
+                    self._subscribers.add(writer)
+                    response: dict = {"ok": True}
+                else:
+                    response = await self._respond(request)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self.refresh()
+
+    async def serve(self) -> None:
+        """Scans the vault and serves it until ``stop`` is called.
+
+        Raises
+        ------
+        DaemonError
+            If a daemon for the same vault is already running.
+        """
+        running = _connect(self.root)
+        if running is not None:
+            running.close()
+            raise DaemonError(f"A daemon is already serving {self.root}.")
+        # Left behind by a daemon that didn't shut down cleanly
+        self.socket_path.unlink(missing_ok=True)
+
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        await self.refresh()
+
+        server = await asyncio.start_unix_server(
+            self._handle_client,
+            path=str(self.socket_path),
+        )
+        os.chmod(self.socket_path, 0o600)
+        poll = asyncio.create_task(self._poll())
+        try:
+            async with server:
+                await self._stopped.wait()
+        finally:
+            poll.cancel()
+            for writer in self._subscribers:
+                writer.close()
+            self.socket_path.unlink(missing_ok=True)
+
+    def stop(self) -> None:
+        """Stops serving. Can be called from any thread."""
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+
+class DaemonClient:
+    """A connection to the daemon of a vault.
+
+    Requests can be made from any thread, they are sent one at a time.
+    """
+
+    def __init__(self, root: Path, connection: socket.socket) -> None:
+        self.root = root
+        self._connection = connection
+        self._file = connection.makefile("rwb")
+        # Held from sending a request until its response was read
+        self._lock = threading.Lock()
+        # Held while writing a line, which messages without a response do
+        # without waiting for a request
+        self._write_lock = threading.Lock()
+        self._subscriptions: set[socket.socket] = set()
+
+    def request(self, method: str, **params: object) -> dict:
+        """Sends a request and returns the response.
+
+        Raises
+        ------
+        DaemonError
+            If the daemon could not answer the request.
+        OSError
+            If the connection to the daemon was lost.
+        """
+        with self._lock:
+            self._send(method, **params)
+            line = self._file.readline()
+        if not line:
+            raise ConnectionError("The daemon closed the connection.")
+
+        response = json.loads(line)
+        if "error" in response:
+            raise DaemonError(response["error"])
+        return response
+
+    def _send(self, method: str, **params: object) -> None:
+        with self._write_lock:
+            self._file.write(
+                json.dumps({"method": method, **params}).encode() + b"\n"
+            )
+            self._file.flush()
+
+    def scan(self, dir: Path, recursive: bool = False) -> list[ScannedTask]:
+        """Returns the tasks in a directory, like ``scan_tree`` with the
+        metadata and links visitors.
+
+        Only the number of subtasks of every task is sent, unless
+        ``recursive`` is set, which sends their whole subtrees.
+        """
+        response = self.request("scan", dir=str(dir), recursive=recursive)
+        return [task_from_json(data, dir) for data in response["tasks"]]
+
+    def touched(self) -> None:
+        """Tells the daemon that the vault was changed, without waiting.
+
+        Scans that are requested afterwards include the change.
+        """
+        self._send("touched")
+
+    def subscribe(self) -> Iterator[set[Path]]:
+        """Subscribes to changes and returns an iterator over them.
+
+        The iterator yields the paths of the notes that changed after every
+        rescan, and ends when the client is closed. The subscription uses its
+        own connection, because it blocks while waiting.
+        """
+        connection = _connect(self.root)
+        if connection is None:
+            raise ConnectionError("The daemon is not running anymore.")
+        connection.settimeout(None)
+        file = connection.makefile("rwb")
+        file.write(b'{"method": "subscribe"}\n')
+        file.flush()
+        # Changes are only sent after the subscription was confirmed
+        file.readline()
+        self._subscriptions.add(connection)
+        return self._iter_changes(connection, file)
+
+    def _iter_changes(
+        self, connection: socket.socket, file: BinaryIO
+    ) -> Iterator[set[Path]]:
+        try:
+            with connection, file:
+                for line in file:
+                    yield {Path(path) for path in json.loads(line)["changed"]}
+        finally:
+            self._subscriptions.discard(connection)
+
+    def close(self) -> None:
+        for connection in list(self._subscriptions):
+            # Wakes up the thread that waits for changes
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._file.close()
+        self._connection.close()
+
+
+def _connect(root: Path) -> socket.socket | None:
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    try:
+        socket_path = get_socket_path(root)
+    except OSError:
+        # No private directory to find the socket in
+        return None
+    if not socket_path.exists():
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(CONNECT_TIMEOUT)
+    try:
+        connection.connect(str(socket_path))
+    except OSError:
+        connection.close()
+        return None
+    connection.settimeout(REQUEST_TIMEOUT)
+    return connection
+
+
+def connect_to_daemon(root: Path | None = None) -> DaemonClient | None:
+    """Connects to the daemon of a vault, if one is running."""
+    root = root or get_root_markdown_dir()
+    connection = _connect(root)
+    if connection is None:
+        return None
+    return DaemonClient(root, connection)
@@ -0,0 +1,282 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from enum import StrEnum
+from html import escape
+from pathlib import Path
+
+from markdown_it import MarkdownIt
+
+from terdo.models.metadata import split_front_matter
+from terdo.utils.compression import open_note
+from terdo.utils.scan import ScannedTask, scan_tree
+
+# Records what was exported in the last run, so that the next run can skip
+# the notes that didn't change.
+MANIFEST_FILE_NAME = ".terdo-export.json"
+# Below this number of notes, starting worker processes costs more than it
+# saves.
+MIN_NOTES_FOR_POOL = 64
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+</head>
+<body>
+<nav>{breadcrumbs}</nav>
+<main>
+{body}
+</main>
+{subtasks}
+</body>
+</html>
+"""
+
+
+class ExportFormat(StrEnum):
+    HTML = "html"
+    JSON = "json"
+
+
+@dataclass(frozen=True)
+class ExportJob:
+    """Everything a worker process needs to export a single note."""
+
+    name: str
+    source: str
+    target: str
+    format: ExportFormat
+    mtime: float
+    # The (name, relative link) pairs of the subtasks and the parent tasks
+    subtasks: tuple[tuple[str, str], ...]
+    parents: tuple[tuple[str, str], ...]
+
+    @property
+    def signature(self) -> list[object]:
+        """What the output depends on, besides the content of the note."""
+        return [
+            self.mtime,
+            [name for name, _ in self.subtasks],
+            [name for name, _ in self.parents],
+        ]
+
+
+@dataclass
+class ExportResult:
+    n_rendered: int = 0
+    n_unchanged: int = 0
+    n_removed: int = 0
+
+
+def _json_default(value: object) -> str:
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def render_html(job: ExportJob, content: str) -> str:
+    """Renders a note to a standalone HTML page."""
+    _, body = split_front_matter(content)
+    breadcrumbs = " / ".join(
+        f'<a href="{escape(link)}">{escape(name)}</a>'
+        for name, link in job.parents
+    )
+    subtasks = ""
+    if job.subtasks:
+        items = "\n".join(
+            f'<li><a href="{escape(link)}">{escape(name)}</a></li>'
+            for name, link in job.subtasks
+        )
+        subtasks = (
+            f"<section>\n<h2>Subtasks</h2>\n<ul>\n{items}\n</ul>\n</section>"
+        )
+
+    # Raw HTML in notes is escaped, so an exported page can't run scripts
+    markdown = MarkdownIt("commonmark", {"html": False}).enable("table")
+    return HTML_TEMPLATE.format(
+        title=escape(job.name),
+        breadcrumbs=breadcrumbs,
+        body=markdown.render(body),
+        subtasks=subtasks,
+    )
+
+
+def render_json(job: ExportJob, content: str) -> str:
+    """Dumps a note with its metadata to JSON."""
+    metadata, body = split_front_matter(content)
+    return json.dumps(
+        {
+            "name": job.name,
+            "metadata": metadata,
+            "content": body,
+            "last_edited": job.mtime,
+            "subtasks": [link for _, link in job.subtasks],
+        },
+        default=_json_default,
+        ensure_ascii=False,
+        indent=2,
+    )
+
+
+def export_note(job: ExportJob) -> str:
+    """Exports a single note. Runs in the worker processes."""
+    with open_note(Path(job.source)) as file:
+        content = file.read()
+
+    if job.format == ExportFormat.HTML:
+        output = render_html(job, content)
+    else:
+        output = render_json(job, content)
+
+    os.makedirs(os.path.dirname(job.target), exist_ok=True)
+    with open(job.target, "w", encoding="utf-8") as file:
+        file.write(output)
+    return job.target
+
+
+def _target_path(task: ScannedTask, root: Path, format: ExportFormat) -> Path:
+    """Returns where a task is exported to, relative to the output directory.
+
+    Tasks with subtasks become an ``index`` page in their own directory, so
+    that the output mirrors the hierarchy of the vault.
+    """
+    relative_dir = task.dir.relative_to(root)
+    if task.is_directory:
+        return relative_dir / task.name / f"index.{format}"
+    return relative_dir / f"{task.name}.{format}"
+
+
+def _relative_link(source: Path, target: Path) -> str:
+    return Path(os.path.relpath(target, source.parent)).as_posix()
+
+
+def collect_export_jobs(
+    root: Path, output_dir: Path, format: ExportFormat
+) -> list[ExportJob]:
+    """Walks the hierarchy below the root and plans the export of every note."""
+    jobs: list[ExportJob] = []
+    # Pairs of a scanned task and the (name, target) pairs of its parents
+    pending: list[tuple[ScannedTask, tuple[tuple[str, Path], ...]]] = [
+        (task, ()) for task in scan_tree(root)
+    ]
+
+    while pending:
+        task, parents = pending.pop()
+        target = _target_path(task, root, format)
+        children = [
+            (child, _target_path(child, root, format))
+            for child in task.children
+        ]
+
+        jobs.append(
+            ExportJob(
+                name=task.name,
+                source=str(task.path),
+                target=str(output_dir / target),
+                format=format,
+                mtime=task.mtime,
+                subtasks=tuple(
+                    (child.name, _relative_link(target, child_target))
+                    for child, child_target in children
+                ),
+                parents=tuple(
+                    (name, _relative_link(target, parent_target))
+                    for name, parent_target in parents
+                ),
+            )
+        )
+        pending.extend(
+            (child, parents + ((task.name, target),)) for child, _ in children
+        )
+
+    return jobs
+
+
+def _read_manifest(output_dir: Path, format: ExportFormat) -> dict[str, object]:
+    try:
+        manifest = json.loads((output_dir / MANIFEST_FILE_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("format") != format:
+        return {}
+    return manifest.get("notes", {})
+
+
+def export_vault(
+    root: Path,
+    output_dir: Path,
+    format: ExportFormat = ExportFormat.HTML,
+    max_workers: int | None = None,
+) -> ExportResult:
+    """Exports all notes below the root to HTML pages or JSON files.
+
+    Only the notes that changed since the last export to the same directory
+    are rendered again, spread over a pool of worker processes. Output of
+    notes that no longer exist is removed.
+
+    Parameters
+    ----------
+    root
+        The directory with the tasks to export.
+    output_dir
+        The directory to write the exported files to.
+    format
+        Whether to render the notes to HTML or to dump them to JSON.
+    max_workers
+        The number of worker processes, defaults to the number of CPUs.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    previous = _read_manifest(output_dir, format)
+    jobs = collect_export_jobs(root, output_dir, format)
+    result = ExportResult()
+
+    manifest: dict[str, object] = {}
+    changed: list[ExportJob] = []
+    for job in jobs:
+        key = os.path.relpath(job.target, output_dir)
+        manifest[key] = job.signature
+        if previous.get(key) == job.signature and os.path.exists(job.target):
+            result.n_unchanged += 1
+        else:
+            changed.append(job)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if len(changed) < MIN_NOTES_FOR_POOL or max_workers == 1:
+        for job in changed:
+            export_note(job)
+    else:
+        # Spawned instead of forked, because the app runs exports next to
+        # other threads.
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            chunksize = max(1, len(changed) // (4 * max_workers))
+            for _ in executor.map(export_note, changed, chunksize=chunksize):
+                pass
+    result.n_rendered = len(changed)
+
+    for key in previous.keys() - manifest.keys():
+        target = output_dir / key
+        try:
+            target.unlink()
+            result.n_removed += 1
+        except FileNotFoundError:
+            continue
+        if target.parent != output_dir:
+            try:
+                # Removes the directories of moved or removed tasks, up to
+                # the first one that is not empty.
+                os.removedirs(target.parent)
+            except OSError:
+                pass
+
+    (output_dir / MANIFEST_FILE_NAME).write_text(
+        json.dumps({"format": format, "notes": manifest})
+    )
+    return result
@@ -0,0 +1,198 @@
+import mmap
+import os
+import re
+from collections.abc import Callable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
+from pathlib import Path
+
+from terdo.utils.compression import is_compressed, note_suffix, open_note_binary
+from terdo.utils.instrumentation import increment
+from terdo.utils.scan import get_scan_workers
+
+# A search stops after this many notes matched, however large the vault is
+MAX_GREP_RESULTS = 500
+# Matched lines are cut to this length
+MAX_CONTEXT_CHARS = 200
+# Newlines before a match are counted in windows of this size, so a match
+# deep in a large note doesn't copy everything before it.
+LINE_COUNT_WINDOW = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class GrepResult:
+    """The first matching line of a note, and how many lines matched."""
+
+    path: Path
+    line_number: int
+    line: str
+    n_matches: int
+
+
+def compile_grep_pattern(query: str) -> re.Pattern[bytes]:
+    """Compiles a search into a pattern for the raw bytes of notes.
+
+    Like in Vim with ``smartcase``, the search ignores case unless it
+    contains an uppercase letter. Invalid regular expressions are searched
+    for literally.
+    """
+    flags = re.MULTILINE
+    if query == query.lower():
+        flags |= re.IGNORECASE
+    try:
+        return re.compile(query.encode("utf-8"), flags)
+    except re.error:
+        return re.compile(re.escape(query.encode("utf-8")), flags)
+
+
+def _context(line: bytes) -> str:
+    return line.decode("utf-8", errors="replace").strip()[:MAX_CONTEXT_CHARS]
+
+
+def _count_newlines(buffer: mmap.mmap, start: int, end: int) -> int:
+    return sum(
+        buffer[offset : min(offset + LINE_COUNT_WINDOW, end)].count(b"\n")
+        for offset in range(start, end, LINE_COUNT_WINDOW)
+    )
+
+
+def _grep_mapped(
+    path: Path, pattern: re.Pattern[bytes], mapped: mmap.mmap
+) -> GrepResult | None:
+    first: tuple[int, bytes] | None = None
+    n_matches = 0
+    position = 0
+    while position < len(mapped):
+        match = pattern.search(mapped, position)
+        if match is None:
+            break
+        line_start = mapped.rfind(b"\n", 0, match.start()) + 1
+        line_end = mapped.find(b"\n", match.end())
+        if line_end == -1:
+            line_end = len(mapped)
+        if first is None:
+            line_number = _count_newlines(mapped, 0, line_start) + 1
+            first = (line_number, mapped[line_start:line_end])
+        n_matches += 1
+        # Every line is counted once, however often it matches
+        position = line_end + 1
+
+    if first is None:
+        return None
+    return GrepResult(path, first[0], _context(first[1]), n_matches)
+
+
+def _grep_lines(
+    path: Path, pattern: re.Pattern[bytes], lines: Iterator[bytes]
+) -> GrepResult | None:
+    first: tuple[int, bytes] | None = None
+    n_matches = 0
+    for line_number, line in enumerate(lines, start=1):
+        if pattern.search(line) is not None:
+            if first is None:
+                first = (line_number, line)
+            n_matches += 1
+
+    if first is None:
+        return None
+    return GrepResult(path, first[0], _context(first[1]), n_matches)
+
+
+def grep_note(path: Path, pattern: re.Pattern[bytes]) -> GrepResult | None:
+    """Searches a note for a pattern, without reading it into memory.
+
+    Plain notes are memory-mapped. Compressed notes are decompressed line
+    by line while they are searched.
+    """
+    try:
+        if is_compressed(path):
+            with open_note_binary(path) as file:
+                return _grep_lines(path, pattern, iter(file.readline, b""))
+
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return _grep_mapped(path, pattern, mapped)
+    except OSError:
+        return None
+
+
+def iter_note_paths(root: Path) -> Iterator[Path]:
+    """Yields every note below root, skipping hidden directories."""
+    for dir, subdirs, files in os.walk(root):
+        subdirs[:] = [name for name in subdirs if not name.startswith(".")]
+        for name in files:
+            if note_suffix(name) is not None:
+                yield Path(dir) / name
+
+
+def iter_grep(
+    root: Path,
+    pattern: re.Pattern[bytes],
+    is_cancelled: Callable[[], bool] = lambda: False,
+    max_results: int = MAX_GREP_RESULTS,
+    max_workers: int | None = None,
+) -> Iterator[GrepResult]:
+    """Searches all notes below root, yielding every match on its own.
+
+    See ``iter_grep_rounds`` for the parameters.
+    """
+    for results in iter_grep_rounds(
+        root, pattern, is_cancelled, max_results, max_workers
+    ):
+        yield from results
+
+
+def iter_grep_rounds(
+    root: Path,
+    pattern: re.Pattern[bytes],
+    is_cancelled: Callable[[], bool] = lambda: False,
+    max_results: int = MAX_GREP_RESULTS,
+    max_workers: int | None = None,
+) -> Iterator[list[GrepResult]]:
+    """Searches all notes below root in a pool of threads.
+
+    Every time notes finish, their matches are yielded together, in no
+    particular order. A round without matches yields an empty list, so the
+    caller regularly gets to run, e.g. to show what it has so far. Only a
+    few notes per thread are in flight at any time, so memory use doesn't
+    depend on the size of the vault. The search stops when ``is_cancelled``
+    returns True.
+    """
+    if max_workers is None:
+        max_workers = get_scan_workers()
+
+    paths = iter_note_paths(root)
+    n_results = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: set[Future[GrepResult | None]] = set()
+        try:
+            while True:
+                while len(pending) < 2 * max_workers:
+                    path = next(paths, None)
+                    if path is None:
+                        break
+                    pending.add(executor.submit(grep_note, path, pattern))
+                if not pending:
+                    return
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                increment("grep.notes", len(done))
+                results = [
+                    result
+                    for future in done
+                    if (result := future.result()) is not None
+                ][: max_results - n_results]
+                n_results += len(results)
+                yield results
+                if n_results >= max_results or is_cancelled():
+                    return
+        finally:
+            for future in pending:
+                future.cancel()
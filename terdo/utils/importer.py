@@ -0,0 +1,187 @@
+import csv
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from terdo.models.task import INDEX_FILE_NAME
+from terdo.utils.io import (
+    NameAllocator,
+    add_markdown_extension,
+    sanitize_task_name,
+)
+
+_LIST_ITEM_PATTERN = re.compile(
+    r"^(?P<indent>[ \t]*)(?:[-*+]|\d+[.)])\s+(?:\[[ xX]\]\s+)?(?P<text>.*)$"
+)
+_HEADING_PATTERN = re.compile(r"^(?P<level>#{1,6})\s+(?P<text>.*?)\s*#*\s*$")
+_TODO_TXT_DONE_PATTERN = re.compile(r"^x\s+(?:\d{4}-\d{2}-\d{2}\s+){0,2}")
+_TODO_TXT_PRIORITY_PATTERN = re.compile(
+    r"^\([A-Z]\)\s+(?:\d{4}-\d{2}-\d{2}\s+)?"
+)
+_TODO_TXT_PROJECT_PATTERN = re.compile(r"(?:^|\s)\+(\S+)")
+
+
+@dataclass
+class OutlineItem:
+    """A task in an outline that is about to be imported."""
+
+    name: str
+    content: str = ""
+    children: list["OutlineItem"] = field(default_factory=list)
+
+
+def parse_markdown_outline(text: str) -> list[OutlineItem]:
+    """Parses a (nested) markdown list into a tree of outline items.
+
+    Headings group the list items that follow them, and list items are
+    nested based on their indentation. Any other non-empty lines are added to
+    the content of the item above them.
+    """
+    root = OutlineItem(name="")
+    # The stack holds (nesting key, item) pairs. Headings get a negative key
+    # so that they always contain the list items that follow them.
+    stack: list[tuple[int, OutlineItem]] = [(-100, root)]
+    last_item: OutlineItem | None = None
+
+    for line in text.splitlines():
+        heading = _HEADING_PATTERN.match(line)
+        list_item = _LIST_ITEM_PATTERN.match(line)
+
+        if heading is not None:
+            key = len(heading.group("level")) - 7
+            name = heading.group("text")
+        elif list_item is not None:
+            key = len(list_item.group("indent").expandtabs(4))
+            name = list_item.group("text")
+        else:
+            if last_item is not None and line.strip():
+                last_item.content += line.strip() + "\n"
+            continue
+
+        while stack[-1][0] >= key:
+            stack.pop()
+
+        item = OutlineItem(name=name.strip())
+        stack[-1][1].children.append(item)
+        stack.append((key, item))
+        last_item = item
+
+    return root.children
+
+
+def parse_todo_txt(text: str) -> list[OutlineItem]:
+    """Parses a todo.txt file into outline items.
+
+    Tasks are grouped into a parent task per ``+project``, and the original
+    line is kept as the content of the task so that no metadata is lost.
+    """
+    items: list[OutlineItem] = []
+    projects: dict[str, OutlineItem] = {}
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        description = _TODO_TXT_DONE_PATTERN.sub("", line)
+        description = _TODO_TXT_PRIORITY_PATTERN.sub("", description)
+        item = OutlineItem(name=description, content=line + "\n")
+
+        project = _TODO_TXT_PROJECT_PATTERN.search(description)
+        if project is None:
+            items.append(item)
+            continue
+
+        project_name = project.group(1)
+        if project_name not in projects:
+            projects[project_name] = OutlineItem(name=project_name)
+            items.append(projects[project_name])
+        projects[project_name].children.append(item)
+
+    return items
+
+
+def parse_csv_outline(text: str) -> list[OutlineItem]:
+    """Parses a CSV file with a header row into outline items.
+
+    The ``name`` column is required. The optional ``content`` column is used
+    as the note of the task, and the optional ``depth`` column (0 for top
+    level tasks) nests a row under the closest preceding row of lower depth.
+    """
+    reader = csv.DictReader(text.splitlines())
+    if reader.fieldnames is None or "name" not in reader.fieldnames:
+        raise ValueError("CSV file must have a header with a 'name' column.")
+
+    root = OutlineItem(name="")
+    stack: list[tuple[int, OutlineItem]] = [(-1, root)]
+
+    for row in reader:
+        depth = int(row.get("depth") or 0)
+        item = OutlineItem(
+            name=(row["name"] or "").strip(),
+            content=row.get("content") or "",
+        )
+
+        while stack[-1][0] >= depth:
+            stack.pop()
+
+        stack[-1][1].children.append(item)
+        stack.append((depth, item))
+
+    return root.children
+
+
+PARSERS = {
+    ".md": parse_markdown_outline,
+    ".markdown": parse_markdown_outline,
+    ".txt": parse_todo_txt,
+    ".csv": parse_csv_outline,
+}
+
+
+def write_outline(items: list[OutlineItem], dir: Path) -> int:
+    """Creates the tasks for a tree of outline items and returns their number.
+
+    Items with children become directories with an ``_index.md`` file, all
+    other items become markdown files. Unique names are computed up front,
+    so every directory is listed at most once.
+    """
+    n_created = 0
+    pending: list[tuple[Path, NameAllocator, list[OutlineItem]]] = [
+        (dir, NameAllocator.for_dir(dir), items)
+    ]
+
+    while pending:
+        current_dir, allocator, current_items = pending.pop()
+        for item in current_items:
+            name = allocator.allocate(sanitize_task_name(item.name))
+
+            if item.children:
+                os.mkdir(current_dir / name)
+                file_path = current_dir / name / INDEX_FILE_NAME
+                # The subtask directory is new, so none of its names are taken
+                pending.append(
+                    (current_dir / name, NameAllocator(), item.children)
+                )
+            else:
+                file_path = current_dir / add_markdown_extension(name)
+
+            with open(file_path, "x") as file:
+                file.write(item.content)
+            n_created += 1
+
+    return n_created
+
+
+def import_outline(source: Path, dir: Path) -> int:
+    """Imports the tasks in a markdown, todo.txt or CSV file into a directory.
+
+    Returns the number of tasks that were created.
+    """
+    parser = PARSERS.get(source.suffix.lower())
+    if parser is None:
+        raise ValueError(f"Unsupported file type for import: {source.suffix}")
+
+    items = parser(source.read_text())
+    return write_outline(items, dir)
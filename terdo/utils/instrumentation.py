@@ -0,0 +1,12 @@
+from collections import Counter
+
+# How often things happened in the app, e.g. for the UI benchmarks
+COUNTERS: Counter[str] = Counter()
+
+
+def increment(name: str, amount: int = 1) -> None:
+    COUNTERS[name] += amount
+
+
+def reset_counters() -> None:
+    COUNTERS.clear()
@@ -1,24 +1,100 @@
+import codecs
+import mmap
+import os
+import stat
+import tempfile
+from collections.abc import Iterable, Iterator, Sequence
 from pathlib import Path
 
+from terdo.utils.compression import (
+    NOTE_SUFFIXES,
+    note_suffix,
+    open_note,
+    replace_atomically,
+    strip_note_suffix,
+)
+
 
 PATH_TO_MARKDOWN_DIR = Path.cwd() / "markdown"
+PATH_TO_EXPORT_DIR = Path.cwd() / "export"
+
+# Notes from this size on are read and written in chunks instead of at once
+LARGE_FILE_BYTES = 1024 * 1024
+CHUNK_BYTES = 256 * 1024
 
 
 def get_root_markdown_dir() -> Path:
     return PATH_TO_MARKDOWN_DIR
 
 
+def set_root_markdown_dir(dir: Path) -> None:
+    """Points the app to another vault, e.g. a generated one in benchmarks."""
+    global PATH_TO_MARKDOWN_DIR
+    PATH_TO_MARKDOWN_DIR = dir
+
+
+def get_default_export_dir() -> Path:
+    return PATH_TO_EXPORT_DIR
+
+
+def get_state_dir() -> Path:
+    """Returns the private directory for runtime files, like sockets.
+
+    This is ``$XDG_RUNTIME_DIR/terdo`` when it is set, and a directory per
+    user in the temporary directory otherwise.
+
+    Raises
+    ------
+    PermissionError
+        If the directory already exists, but is not a directory that only
+        the current user can access, e.g. because another user created it
+        in the shared temporary directory first.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        state_dir = Path(runtime_dir) / "terdo"
+    else:
+        state_dir = Path(tempfile.gettempdir()) / f"terdo-{os.getuid()}"
+    state_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    # Not followed if it is a link, which another user could have placed
+    state = state_dir.lstat()
+    if (
+        not stat.S_ISDIR(state.st_mode)
+        or state.st_uid != os.getuid()
+        or stat.S_IMODE(state.st_mode) & 0o077
+    ):
+        raise PermissionError(
+            f"{state_dir} is not a private directory of the current user."
+        )
+    return state_dir
+
+
 def list_markdown_files_in_dir(dir: Path) -> list[Path]:
-    """Returns the names of all markdown files in a given directory."""
+    """Returns the names of all markdown files in a given directory.
+
+    Compressed notes, like ``name.md.gz``, are included.
+    """
     dir_contents = list(dir.iterdir())
     markdown_files = [
         item
         for item in dir_contents
-        if item.is_file() and item.suffix == ".md" and item.name != "_index.md"
+        if item.is_file()
+        and note_suffix(item.name) is not None
+        and item.name != "_index.md"
     ]
     return markdown_files
 
 
+def find_note_file(dir: Path, name: str) -> Path | None:
+    """Returns the note of a task in a directory, plain or compressed."""
+    for suffix in NOTE_SUFFIXES:
+        path = dir / f"{name}{suffix}"
+        if path.is_file():
+            return path
+    return None
+
+
 def list_markdown_dirs_in_dir(dir: Path) -> list[Path]:
     def dir_contains_index_md(dir: Path) -> bool:
         return any(file.name == "_index.md" for file in dir.iterdir())
@@ -45,21 +121,17 @@ def get_default_new_file_name(dir: Path) -> str:
         return f"{default_name} {int(counter)}"
 
     DEFAULT_NAME: str = "New markdown file"
-    markdown_files_in_dir = [
-        file.name for file in list_markdown_files_in_dir(dir)
+    task_names_in_dir = [
+        strip_note_suffix(file.name) for file in list_markdown_files_in_dir(dir)
     ]
 
     counter = 0
-    candidate_name = add_markdown_extension(
-        generate_candidate_name(DEFAULT_NAME, counter)
-    )
-    while candidate_name in markdown_files_in_dir:
+    candidate_name = generate_candidate_name(DEFAULT_NAME, counter)
+    while candidate_name in task_names_in_dir:
         counter += 1
-        candidate_name = add_markdown_extension(
-            generate_candidate_name(DEFAULT_NAME, counter)
-        )
+        candidate_name = generate_candidate_name(DEFAULT_NAME, counter)
 
-    return candidate_name
+    return add_markdown_extension(candidate_name)
 
 
 def create_new_markdown_file(dir: Path, name: str) -> Path:
@@ -67,3 +139,133 @@ def create_new_markdown_file(dir: Path, name: str) -> Path:
     new_file_path = dir / name
     new_file_path.touch(exist_ok=False)
     return new_file_path
+
+
+def list_task_names_in_dir(dir: Path) -> set[str]:
+    """Returns the names that are taken by files or directories in a directory.
+
+    Both ``name.md`` files, compressed or not, and ``name`` directories
+    claim the task name ``name``, so the extension is removed from every
+    entry.
+    """
+    with os.scandir(dir) as entries:
+        return {strip_note_suffix(entry.name) for entry in entries}
+
+
+def sanitize_task_name(name: str, max_bytes: int = 200) -> str:
+    """Turns arbitrary text into a name that can be used as a task file name."""
+    name = name.replace(os.sep, "-").replace("\0", "").strip()
+    name = name.lstrip(".").strip()
+
+    # Leave room for a counter suffix and the extension within the usual 255
+    # byte file name limit.
+    encoded = name.encode("utf-8")
+    if len(encoded) > max_bytes:
+        name = encoded[:max_bytes].decode("utf-8", errors="ignore").strip()
+
+    return name or "Untitled"
+
+
+class NameAllocator:
+    """Hands out task names that are unique within a single directory.
+
+    The names that are already taken are read once, after which every
+    allocation is a set lookup instead of another directory listing.
+    """
+
+    def __init__(self, taken_names: Iterable[str] = ()) -> None:
+        self._taken: set[str] = set(taken_names)
+        self._taken.add("_index")
+        self._next_counter: dict[str, int] = {}
+
+    @classmethod
+    def for_dir(cls, dir: Path) -> "NameAllocator":
+        """Creates an allocator for the names that are still free in a directory."""
+        return cls(list_task_names_in_dir(dir))
+
+    def allocate(self, name: str) -> str:
+        """Returns the given name, or the name with a counter if it is taken."""
+        if name not in self._taken:
+            self._taken.add(name)
+            return name
+
+        # Remember where the counter stopped for this name, so that importing
+        # many tasks with the same name does not probe all earlier candidates.
+        counter = self._next_counter.get(name, 1)
+        candidate = f"{name} {counter}"
+        while candidate in self._taken:
+            counter += 1
+            candidate = f"{name} {counter}"
+
+        self._next_counter[name] = counter + 1
+        self._taken.add(candidate)
+        return candidate
+
+
+def iter_text_chunks(
+    path: Path, chunk_bytes: int = CHUNK_BYTES
+) -> Iterator[str]:
+    """Reads a text file in chunks that each end at a line boundary.
+
+    The file is memory-mapped, so only the chunk that is being decoded is
+    copied into memory. Splitting at newlines keeps multi-byte characters
+    and ``\\r\\n`` line endings within a single chunk.
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            start = 0
+            while start < len(mapped):
+                end = min(start + chunk_bytes, len(mapped))
+                if end < len(mapped):
+                    newline = mapped.rfind(b"\n", start, end)
+                    if newline != -1:
+                        end = newline + 1
+                yield decoder.decode(
+                    mapped[start:end], final=end == len(mapped)
+                )
+                start = end
+
+
+def strip_lines(lines: Sequence[str]) -> Iterator[str]:
+    """Yields the lines of a text as if the joined text was stripped.
+
+    Leading and trailing blank lines are skipped, without joining the lines
+    into one string first.
+    """
+    first = 0
+    while first < len(lines) and not lines[first].strip():
+        first += 1
+    last = len(lines) - 1
+    while last > first and not lines[last].strip():
+        last -= 1
+
+    for i in range(first, last + 1):
+        line = lines[i]
+        if i == first:
+            line = line.lstrip()
+        if i == last:
+            line = line.rstrip()
+        yield line
+
+
+def write_lines(path: Path, lines: Iterable[str], newline: str = "\n") -> None:
+    """Writes lines to a file without building the whole text in memory.
+
+    The lines go to a temporary file next to the target first, which then
+    replaces it, so the note is never left half written. Compressed notes
+    are compressed while the lines are written.
+    """
+    with (
+        replace_atomically(path) as temporary_path,
+        open_note(
+            temporary_path, "w", suffix=note_suffix(path.name), newline=""
+        ) as file,
+    ):
+        for i, line in enumerate(lines):
+            if i:
+                file.write(newline)
+            file.write(line)
@@ -0,0 +1,49 @@
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+class MutationQueue:
+    """Runs changes to the vault one at a time, away from the event loop.
+
+    A single background thread applies the changes in the order they were
+    submitted, so a rename that is followed by a move of the same task can
+    never overtake it. Changes that are still queued when the app exits are
+    finished before the process ends.
+    """
+
+    def __init__(self) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="terdo-mutations"
+        )
+        self._listeners: list[Callable[[], object]] = []
+
+    def add_listener(self, listener: Callable[[], object]) -> None:
+        """Calls listener in the background thread after every change."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], object]) -> None:
+        self._listeners.remove(listener)
+
+    def _apply(self, mutation: Callable[[], T]) -> T:
+        result = mutation()
+        # A listener may remove itself, e.g. when the daemon went away
+        for listener in list(self._listeners):
+            listener()
+        return result
+
+    async def run(self, mutation: Callable[[], T]) -> T:
+        """Queues a change and waits for it without blocking the event loop."""
+        return await asyncio.wrap_future(
+            self._executor.submit(self._apply, mutation)
+        )
+
+
+_MUTATION_QUEUE = MutationQueue()
+
+
+def get_mutation_queue() -> MutationQueue:
+    return _MUTATION_QUEUE
@@ -0,0 +1,370 @@
+import os
+from collections.abc import Callable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import AbstractContextManager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from pydantic import ValidationError
+
+from terdo.models.task import INDEX_FILE_NAME, Task
+from terdo.utils.compression import (
+    MARKDOWN_SUFFIX,
+    note_size,
+    note_suffix,
+    strip_note_suffix,
+)
+from terdo.utils.instrumentation import increment
+
+DEFAULT_SCAN_WORKERS = 16
+SCAN_WORKERS_ENV_VAR = "TERDO_SCAN_WORKERS"
+
+ScandirFunction = Callable[
+    [Path], AbstractContextManager[Iterator[os.DirEntry[str]]]
+]
+# Called for every note file found by a scan, in the scanning threads
+VisitFunction = Callable[[Path], object]
+# Like a VisitFunction, but also gets the stat of the note that the scan did
+StatVisitFunction = Callable[[Path, os.stat_result], object]
+
+
+def combine_visitors(**visits: VisitFunction) -> VisitFunction:
+    """Returns a visit function that collects the results of several.
+
+    The results are stored under the names the functions were passed with,
+    and are found back with ``ScannedTask.visited``.
+    """
+
+    def visit(path: Path) -> dict[str, object]:
+        return {name: function(path) for name, function in visits.items()}
+
+    return visit
+
+
+def get_scan_workers() -> int:
+    """Returns the number of threads used to scan a tree of tasks.
+
+    Can be configured with the ``TERDO_SCAN_WORKERS`` environment variable.
+    """
+    value = os.environ.get(SCAN_WORKERS_ENV_VAR)
+    if value is None:
+        return DEFAULT_SCAN_WORKERS
+    return max(1, int(value))
+
+
+@dataclass
+class DirListing:
+    """The entries of a single directory, as read by one ``scandir`` call."""
+
+    dir: Path
+    has_index: bool = False
+    index_mtime: float = 0.0
+    index_created: float = 0.0
+    index_size: int = 0
+    # (file name, mtime, created, size) of every note except the index
+    files: list[tuple[str, float, float, int]] = field(default_factory=list)
+    subdirs: list[str] = field(default_factory=list)
+    # Results of the visit function, by file name
+    visited: dict[str, object] = field(default_factory=dict)
+
+
+@dataclass
+class ScannedTask:
+    """A task found by a tree scan, together with its whole subtree."""
+
+    name: str
+    dir: Path
+    is_directory: bool
+    mtime: float
+    created: float
+    # For directories, the size of the whole subtree
+    size: int
+    children: list["ScannedTask"] = field(default_factory=list)
+    last_edited: float = 0.0
+    n_descendants: int = 0
+    # The result of the visit function for the note of the task, if any
+    data: object = None
+    # The extension of the note, which tells whether it is compressed
+    suffix: str = MARKDOWN_SUFFIX
+    # The number of subtasks, for tasks that are sent without their children
+    n_subtasks: int | None = None
+
+    @property
+    def subtask_count(self) -> int:
+        if self.n_subtasks is not None:
+            return self.n_subtasks
+        return len(self.children)
+
+    @property
+    def path(self) -> Path:
+        """Returns the path to the file that holds the note of the task."""
+        if self.is_directory:
+            return self.dir / self.name / INDEX_FILE_NAME
+        return self.dir / f"{self.name}{self.suffix}"
+
+    def visited(self, name: str) -> Any:
+        """Returns the result of a visit function combined under a name."""
+        if not isinstance(self.data, dict):
+            return None
+        return self.data.get(name)
+
+    def to_task(self) -> Task:
+        """Turns the scanned task into a Task, without touching the disk."""
+        if self.is_directory and self.subtask_count == 0:
+            # Task validation turns directories without subtasks back into a
+            # single file, so this rare case goes through the normal route.
+            return Task(name=self.name, dir=self.dir)
+
+        return Task.from_scan(
+            name=self.name,
+            dir=self.dir,
+            is_directory=self.is_directory,
+            last_edited=datetime.fromtimestamp(self.last_edited),
+            n_subtasks=self.subtask_count,
+            created=datetime.fromtimestamp(self.created),
+            size=self.size,
+            suffix=self.suffix,
+        )
+
+
+def _created_time(stat: os.stat_result) -> float:
+    return getattr(stat, "st_birthtime", stat.st_ctime)
+
+
+def _list_dir(
+    dir: Path, scandir: ScandirFunction, visit: StatVisitFunction | None
+) -> DirListing:
+    listing = DirListing(dir=dir)
+    with scandir(dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                # Hidden directories never hold tasks, and skipping them
+                # keeps things like version control folders out of the scan.
+                if not entry.name.startswith("."):
+                    listing.subdirs.append(entry.name)
+            elif entry.name == INDEX_FILE_NAME:
+                stat = entry.stat()
+                listing.has_index = True
+                listing.index_mtime = stat.st_mtime
+                listing.index_created = _created_time(stat)
+                listing.index_size = stat.st_size
+                if visit is not None:
+                    listing.visited[entry.name] = visit(Path(entry.path), stat)
+            elif note_suffix(entry.name) is not None and entry.is_file():
+                stat = entry.stat()
+                listing.files.append(
+                    (
+                        entry.name,
+                        stat.st_mtime,
+                        _created_time(stat),
+                        note_size(Path(entry.path), stat.st_size),
+                    )
+                )
+                if visit is not None:
+                    listing.visited[entry.name] = visit(Path(entry.path), stat)
+    return listing
+
+
+def _list_tree(
+    root: Path,
+    max_workers: int,
+    scandir: ScandirFunction,
+    visit: StatVisitFunction | None,
+) -> dict[Path, DirListing]:
+    """Lists the task directories below root, in parallel.
+
+    Each finished listing immediately schedules its subdirectories, so the
+    number of requests in flight is only limited by the size of the pool.
+    Only the subdirectories of root and of task directories can hold tasks,
+    so other directories, like folders of attachments, are not descended
+    into. Directories that can't be listed are skipped, except for root.
+    """
+    listings: dict[Path, DirListing] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: dict[Future[DirListing], Path] = {
+            executor.submit(_list_dir, root, scandir, visit): root
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dir = pending.pop(future)
+                try:
+                    listing = future.result()
+                except OSError:
+                    if dir == root:
+                        raise
+                    increment("scan.skipped_directories")
+                    continue
+                listings[dir] = listing
+                if dir != root and not listing.has_index:
+                    continue
+                for subdir in listing.subdirs:
+                    subdir_path = dir / subdir
+                    subdir_future = executor.submit(
+                        _list_dir, subdir_path, scandir, visit
+                    )
+                    pending[subdir_future] = subdir_path
+
+    return listings
+
+
+def _build_tasks(
+    dir: Path, listings: dict[Path, DirListing]
+) -> list[ScannedTask]:
+    """Merges the listings below dir into a tree of scanned tasks."""
+    listing = listings[dir]
+    tasks: list[ScannedTask] = []
+
+    for subdir in listing.subdirs:
+        sublisting = listings.get(dir / subdir)
+        if sublisting is None or not sublisting.has_index:
+            continue
+
+        children = _build_tasks(dir / subdir, listings)
+        tasks.append(
+            ScannedTask(
+                name=subdir,
+                dir=dir,
+                is_directory=True,
+                mtime=sublisting.index_mtime,
+                created=sublisting.index_created,
+                size=sublisting.index_size
+                + sum(child.size for child in children),
+                children=children,
+                # Like Task.last_edited, a directory was last edited when its
+                # most recently edited subtask was.
+                last_edited=max(
+                    (child.last_edited for child in children),
+                    default=sublisting.index_mtime,
+                ),
+                n_descendants=sum(
+                    1 + child.n_descendants for child in children
+                ),
+                data=sublisting.visited.get(INDEX_FILE_NAME),
+            )
+        )
+
+    # A task directory takes precedence over a file with the same name
+    task_dirs = {task.name for task in tasks}
+    for file_name, mtime, created, size in listing.files:
+        suffix = note_suffix(file_name) or MARKDOWN_SUFFIX
+        name = file_name.removesuffix(suffix)
+        if name in task_dirs:
+            continue
+        tasks.append(
+            ScannedTask(
+                name=name,
+                dir=dir,
+                is_directory=False,
+                mtime=mtime,
+                created=created,
+                size=size,
+                last_edited=mtime,
+                data=listing.visited.get(file_name),
+                suffix=suffix,
+            )
+        )
+
+    tasks.sort(key=lambda task: task.last_edited, reverse=True)
+    return tasks
+
+
+def scan_tree(
+    root: Path,
+    max_workers: int | None = None,
+    scandir: ScandirFunction = os.scandir,
+    visit: VisitFunction | None = None,
+    visit_with_stat: StatVisitFunction | None = None,
+) -> list[ScannedTask]:
+    """Scans all tasks below root using a pool of threads.
+
+    Returns the tasks in root ordered by their last edited time, like
+    ``load_tasks_in_dir``, each with its complete subtree.
+
+    Parameters
+    ----------
+    root
+        The directory to scan.
+    max_workers
+        The maximum number of directories that are listed at the same time.
+        Defaults to ``get_scan_workers()``.
+    scandir
+        The function used to list a directory.
+    visit
+        Optional function that is called with the path of every note while
+        scanning. Its result is stored in the ``data`` of the task.
+    visit_with_stat
+        Like ``visit``, but also gets the stat of the note that the scan
+        already did. Only one of the two can be given.
+    """
+    if max_workers is None:
+        max_workers = get_scan_workers()
+    if visit is not None:
+        if visit_with_stat is not None:
+            raise ValueError("Pass either visit or visit_with_stat, not both.")
+
+        def visit_with_stat(path: Path, stat: os.stat_result) -> object:
+            return visit(path)
+
+    listings = _list_tree(root, max_workers, scandir, visit_with_stat)
+    increment("scan.directories", len(listings))
+    return _build_tasks(root, listings)
+
+
+def scan_tasks_in_dir(dir: Path, max_workers: int | None = None) -> list[Task]:
+    """Loads the tasks in a directory with a parallel scan of its subtree.
+
+    Returns the same tasks as ``load_tasks_in_dir``, but the last edited
+    times and numbers of subtasks are computed by the scan, instead of by a
+    sequential walk of the subtree of every task.
+    """
+    return [task.to_task() for task in scan_tree(dir, max_workers)]
+
+
+def scan_note_task(path: Path, max_workers: int | None = None) -> Task | None:
+    """Loads the task of a note with all its statistics, e.g. a search match.
+
+    The subtree of a task directory is scanned once, instead of being walked
+    again for every statistic when the task is shown. Returns None if the
+    note is gone.
+    """
+    try:
+        stat = path.stat()
+        if path.name != INDEX_FILE_NAME:
+            suffix = note_suffix(path.name) or MARKDOWN_SUFFIX
+            scanned = ScannedTask(
+                name=strip_note_suffix(path.name),
+                dir=path.parent,
+                is_directory=False,
+                mtime=stat.st_mtime,
+                created=_created_time(stat),
+                size=note_size(path, stat.st_size),
+                last_edited=stat.st_mtime,
+                suffix=suffix,
+            )
+        else:
+            children = scan_tree(path.parent, max_workers)
+            scanned = ScannedTask(
+                name=path.parent.name,
+                dir=path.parent.parent,
+                is_directory=True,
+                mtime=stat.st_mtime,
+                created=_created_time(stat),
+                size=stat.st_size + sum(child.size for child in children),
+                children=children,
+                last_edited=max(
+                    (child.last_edited for child in children),
+                    default=stat.st_mtime,
+                ),
+            )
+        return scanned.to_task()
+    except (OSError, ValidationError):
+        return None
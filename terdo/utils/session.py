@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+
+@dataclass
+class Session:
+    """Where the user was in the app when it was closed.
+
+    The directory is stored relative to the root of the vault, and tasks by
+    their name in that directory.
+    """
+
+    dir: Path = Path(".")
+    highlighted_task: str | None = None
+    task_list_scroll: float = 0.0
+    note_scroll: float = 0.0
+    # Whether the editor was open for the highlighted task, and where in it
+    editing: bool = False
+    editor_cursor: tuple[int, int] = (0, 0)
+    editor_scroll: tuple[float, float] = (0.0, 0.0)
+    preview_open: bool = False
+
+
+def get_session_dir() -> Path:
+    """Returns the directory where sessions are kept between runs.
+
+    This is ``$XDG_STATE_HOME/terdo``, or ``~/.local/state/terdo`` when that
+    is not set. Unlike ``get_state_dir``, it survives a reboot.
+    """
+    state_home = os.environ.get("XDG_STATE_HOME")
+    if state_home:
+        return Path(state_home) / "terdo"
+    return Path.home() / ".local" / "state" / "terdo"
+
+
+def get_session_path(root: Path) -> Path:
+    """Returns the file that holds the session of a vault."""
+    digest = hashlib.sha256(str(root).encode()).hexdigest()[:16]
+    return get_session_dir() / f"session-{digest}.json"
+
+
+def save_session(session: Session, root: Path) -> None:
+    """Stores the session of a vault, replacing the previous one at once."""
+    path = get_session_path(root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = asdict(session)
+    data["dir"] = str(session.dir)
+
+    fd, temporary_path = tempfile.mkstemp(
+        dir=path.parent, prefix=".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def load_session(root: Path) -> Session | None:
+    """Returns the stored session of a vault, or None if there is none.
+
+    A session is ignored if it can't be read, or if its directory is not in
+    the vault anymore.
+    """
+    try:
+        with open(get_session_path(root)) as file:
+            data = json.load(file)
+        session = Session(
+            dir=Path(data["dir"]),
+            highlighted_task=data["highlighted_task"],
+            task_list_scroll=float(data["task_list_scroll"]),
+            note_scroll=float(data["note_scroll"]),
+            editing=bool(data["editing"]),
+            editor_cursor=tuple(data["editor_cursor"]),
+            editor_scroll=tuple(data["editor_scroll"]),
+            preview_open=bool(data["preview_open"]),
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    dir = (root / session.dir).resolve()
+    if not dir.is_relative_to(root.resolve()) or not dir.is_dir():
+        return None
+    return session
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def state_home(tmp_path, monkeypatch):
+    """Keeps the sessions stored by the app out of the home directory."""
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path / "state"))
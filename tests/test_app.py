@@ -1,4 +1,14 @@
+import os
+
+from textual.widgets import TextArea
+
+from terdo import main
+from terdo.components.note import Note
+from terdo.components.task_list import ChangeNameInput, TaskList
+from terdo.components.task_tree import TaskTree
 from terdo.main import Terdo
+from terdo.utils.instrumentation import COUNTERS, reset_counters
+from terdo.utils.io import get_root_markdown_dir, set_root_markdown_dir
 
 
 async def test_app_close():
@@ -11,3 +21,249 @@ async def test_app_close():
         # If the app is not exited the return_code should be None, after
         # succesfull exit it should be 0
         assert pilot.app.return_code == 0
+
+
+async def test_tree_view_loads_children_on_expand(tmp_path):
+    """Test that the tree view only loads subtasks when they are expanded."""
+    (tmp_path / "Project").mkdir()
+    (tmp_path / "Project" / "_index.md").write_text("Project")
+    (tmp_path / "Project" / "Step.md").write_text("Step")
+    (tmp_path / "Other.md").write_text("Other")
+
+    previous_root = get_root_markdown_dir()
+    set_root_markdown_dir(tmp_path)
+    try:
+        app = Terdo(resume_session=False)
+        async with app.run_test() as pilot:
+            await pilot.press("t")
+            task_tree = app.query_one(TaskTree)
+            assert not task_tree.has_class("hidden")
+            assert len(task_tree.root.children) == 2
+            assert all(
+                len(node.children) == 0 for node in task_tree.root.children
+            )
+
+            (project,) = (
+                node
+                for node in task_tree.root.children
+                if node.data.name == "Project"
+            )
+            task_tree.load_children(project)
+            assert [node.data.name for node in project.children] == ["Step"]
+
+            await pilot.press("t")
+            assert task_tree.has_class("hidden")
+    finally:
+        set_root_markdown_dir(previous_root)
+
+
+async def test_app_resumes_session(tmp_path, monkeypatch):
+    """Test that the app starts where the previous session was quit."""
+    (tmp_path / "Project").mkdir()
+    (tmp_path / "Project" / "_index.md").write_text("Project")
+    (tmp_path / "Project" / "First.md").write_text("First")
+    (tmp_path / "Project" / "Second.md").write_text("Second\nnote")
+    (tmp_path / "Other.md").write_text("Other")
+
+    previous_root = get_root_markdown_dir()
+    set_root_markdown_dir(tmp_path)
+    try:
+        app = Terdo()
+        async with app.run_test() as pilot:
+            app.markdown_dir = tmp_path / "Project"
+            await app.set_directory(app.markdown_dir)
+            task_list = app.query_one(TaskList)
+            names = [item.task_instance.name for item in task_list.children]
+            task_list.index = names.index("Second")
+            await pilot.pause()
+            await app.query_one(Note).action_edit()
+            app.query_one("#note-editor", TextArea).cursor_location = (1, 2)
+            await app.action_quit()
+
+        daemon_roots = []
+        monkeypatch.setattr(
+            main, "connect_to_daemon", lambda root: daemon_roots.append(root)
+        )
+        app = Terdo()
+        assert app.markdown_dir == tmp_path / "Project"
+        async with app.run_test() as pilot:
+            await pilot.pause()
+            # The daemon is found by the vault, not by the directory shown
+            assert daemon_roots == [tmp_path]
+            task_list = app.query_one(TaskList)
+            assert task_list.highlighted_child.task_instance.name == "Second"
+            editor = app.query_one("#note-editor", TextArea)
+            assert not editor.has_class("hidden")
+            assert editor.cursor_location == (1, 2)
+    finally:
+        set_root_markdown_dir(previous_root)
+
+
+async def test_rerender_requests_are_coalesced(tmp_path):
+    """Test that a burst of rerender requests reloads the list once."""
+    (tmp_path / "First.md").write_text("First")
+    (tmp_path / "Second.md").write_text("Second")
+
+    previous_root = get_root_markdown_dir()
+    set_root_markdown_dir(tmp_path)
+    try:
+        app = Terdo(resume_session=False)
+        async with app.run_test() as pilot:
+            await pilot.pause()
+            task_list = app.query_one(TaskList)
+            reset_counters()
+
+            task_list.post_message(TaskList.RerenderTaskList(task_list))
+            task_list.post_message(TaskList.RerenderTaskList(task_list))
+            task_list.post_message(
+                TaskList.RerenderTaskList(task_list, rename_first_item=True)
+            )
+            await pilot.pause()
+            await pilot.pause()
+
+            assert COUNTERS["refresh.requested"] == 3
+            assert COUNTERS["refresh.coalesced"] == 2
+            assert COUNTERS["app.set_directory"] == 1
+            # The strongest flags of the burst are kept
+            assert isinstance(app.focused, ChangeNameInput)
+    finally:
+        set_root_markdown_dir(previous_root)
+
+
+async def test_direct_loads_take_over_pending_refreshes(tmp_path):
+    """Test that opening a directory directly drops its pending reload."""
+    (tmp_path / "Project").mkdir()
+    (tmp_path / "Project" / "Step.md").write_text("Step")
+    (tmp_path / "Project.md").write_text("Project")
+
+    previous_root = get_root_markdown_dir()
+    set_root_markdown_dir(tmp_path)
+    try:
+        app = Terdo(resume_session=False)
+        async with app.run_test() as pilot:
+            await pilot.pause()
+            reset_counters()
+
+            app.request_refresh(tmp_path)
+            await app.set_directory(tmp_path)
+            await pilot.pause()
+
+            assert COUNTERS["refresh.coalesced"] == 1
+            assert COUNTERS["refresh.run"] == 0
+            assert COUNTERS["app.set_directory"] == 1
+
+            # The shown directory only changes when the reload runs
+            app.request_refresh(tmp_path / "Project")
+            assert app.markdown_dir == tmp_path
+            app.markdown_dir = tmp_path / "Project"
+            await app.set_directory(app.markdown_dir)
+            await pilot.pause()
+
+            assert COUNTERS["refresh.coalesced"] == 2
+            assert COUNTERS["refresh.run"] == 0
+
+            # A reload of a directory that was left in the meantime is stale
+            app.request_refresh(tmp_path / "Project")
+            app.markdown_dir = tmp_path
+            await app.set_directory(app.markdown_dir)
+            await pilot.pause()
+
+            assert COUNTERS["refresh.stale"] == 1
+            assert COUNTERS["refresh.run"] == 0
+            assert app.markdown_dir == tmp_path
+    finally:
+        set_root_markdown_dir(previous_root)
+
+
+async def test_tree_view_refuses_moving_into_subtask(tmp_path):
+    """Test that a task can't be moved into its own subtree."""
+    (tmp_path / "Project").mkdir()
+    (tmp_path / "Project" / "_index.md").write_text("Project")
+    (tmp_path / "Project" / "Step.md").write_text("Step")
+
+    previous_root = get_root_markdown_dir()
+    set_root_markdown_dir(tmp_path)
+    try:
+        app = Terdo(resume_session=False)
+        async with app.run_test() as pilot:
+            await pilot.press("t")
+            task_tree = app.query_one(TaskTree)
+            (project,) = task_tree.root.children
+            task_tree.load_children(project)
+            project.expand()
+            await pilot.pause()
+            (step,) = project.children
+
+            task_tree.node_to_move = project
+            task_tree.move_cursor(step)
+            task_tree.action_move_task_to()
+
+            assert (tmp_path / "Project" / "Step.md").exists()
+            assert not (tmp_path / "Project" / "Step").exists()
+    finally:
+        set_root_markdown_dir(previous_root)
+
+
+async def test_tree_view_moves_tasks_in_the_background(tmp_path):
+    """Test that a move in the tree view updates the nodes once it is done."""
+    (tmp_path / "Project.md").write_text("Project")
+    (tmp_path / "Step.md").write_text("Step")
+
+    previous_root = get_root_markdown_dir()
+    set_root_markdown_dir(tmp_path)
+    try:
+        app = Terdo(resume_session=False)
+        async with app.run_test() as pilot:
+            await pilot.press("t")
+            task_tree = app.query_one(TaskTree)
+            project, step = sorted(
+                task_tree.root.children, key=lambda node: node.data.name
+            )
+
+            task_tree.node_to_move = step
+            task_tree.move_cursor(project)
+            await pilot.pause()
+            task_tree.action_move_task_to()
+            await app.workers.wait_for_complete()
+
+            assert (tmp_path / "Project" / "Step.md").exists()
+            assert [node.data.name for node in task_tree.root.children] == [
+                "Project"
+            ]
+            assert [node.data.name for node in project.children] == ["Step"]
+            assert project.data.path_to_file == (
+                tmp_path / "Project" / "_index.md"
+            )
+    finally:
+        set_root_markdown_dir(previous_root)
+
+
+async def test_tree_view_reloads_after_saving_a_note(tmp_path):
+    """Test that saving a note from the tree view reorders its siblings."""
+    (tmp_path / "First.md").write_text("First")
+    (tmp_path / "Second.md").write_text("Second")
+    os.utime(tmp_path / "First.md", (1, 1))
+
+    previous_root = get_root_markdown_dir()
+    set_root_markdown_dir(tmp_path)
+    try:
+        app = Terdo(resume_session=False)
+        async with app.run_test() as pilot:
+            await pilot.press("t")
+            task_tree = app.query_one(TaskTree)
+            first = task_tree.root.children[1]
+            assert first.data.name == "First"
+            task_tree.move_cursor(first)
+            await pilot.pause()
+
+            note = app.query_one(Note)
+            await note.action_edit()
+            await pilot.press("ctrl+s", "escape")
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+
+            names = [node.data.name for node in task_tree.root.children]
+            assert names == ["First", "Second"]
+            assert task_tree.cursor_node.data.name == "First"
+    finally:
+        set_root_markdown_dir(previous_root)
@@ -0,0 +1,97 @@
+import os
+import time
+
+import pytest
+
+from terdo.models.metadata import read_task_metadata
+from terdo.models.task import Task, load_tasks_in_dir
+from terdo.utils.compression import (
+    ZSTD_SUFFIX,
+    CompressionUnavailableError,
+    archive_notes,
+    compress_note,
+    read_note,
+    zstandard,
+)
+from terdo.utils.io import list_markdown_files_in_dir
+from terdo.utils.scan import combine_visitors, scan_tree
+
+
+def test_compressed_notes_are_tasks(tmp_path):
+    """Test that compressed notes are read, written and renamed in place."""
+    note = tmp_path / "Old.md"
+    note.write_text("---\nstatus: done\n---\nLong forgotten")
+    os.utime(note, (1_000_000, 1_000_000))
+    compressed = compress_note(note)
+
+    assert compressed == tmp_path / "Old.md.gz"
+    assert not note.exists()
+    assert compressed.stat().st_mtime == 1_000_000
+    assert list_markdown_files_in_dir(tmp_path) == [compressed]
+
+    (task,) = load_tasks_in_dir(tmp_path)
+    assert task.name == "Old"
+    assert task.path_to_file == compressed
+    assert task.content.endswith("Long forgotten")
+    assert read_task_metadata(compressed).status == "done"
+
+    visit = combine_visitors(metadata=read_task_metadata)
+    (scanned,) = scan_tree(tmp_path, visit=visit)
+    assert scanned.path == compressed
+    assert scanned.visited("metadata").excerpt == "Long forgotten"
+    # Sizes are those of the text, like for plain notes
+    text_size = len("---\nstatus: done\n---\nLong forgotten")
+    assert scanned.size == task.size == text_size
+
+    task.write("Updated")
+    task.rename("Renamed")
+    assert Task(name="Renamed", dir=tmp_path).content == "Updated"
+    assert os.listdir(tmp_path) == ["Renamed.md.gz"]
+
+
+def test_archive_notes_compresses_cold_notes(tmp_path):
+    """Test that only notes older than the cutoff are compressed."""
+    (tmp_path / "Project").mkdir()
+    old = time.time() - 40 * 24 * 60 * 60
+    for path in [
+        tmp_path / "Cold.md",
+        tmp_path / "Project" / "_index.md",
+        tmp_path / "Project" / "Step.md",
+    ]:
+        path.write_text(path.stem)
+        os.utime(path, (old, old))
+    (tmp_path / "Hot.md").write_text("Hot")
+
+    archived = archive_notes(tmp_path, days=30)
+
+    assert sorted(archived) == [
+        tmp_path / "Cold.md.gz",
+        tmp_path / "Project" / "Step.md.gz",
+    ]
+    assert (tmp_path / "Project" / "_index.md").exists()
+    assert (tmp_path / "Hot.md").exists()
+
+
+def test_notes_with_a_compressed_version_are_not_compressed(tmp_path):
+    """Test that compressing never makes two notes for one task."""
+    note = tmp_path / "Twice.md"
+    note.write_text("plain")
+    compressed = compress_note(note)
+    note.write_text("plain again")
+    os.utime(note, (0, 0))
+
+    with pytest.raises(FileExistsError):
+        compress_note(note)
+    assert archive_notes(tmp_path, days=30) == []
+    assert note.exists()
+    assert read_note(compressed) == "plain"
+
+
+@pytest.mark.skipif(zstandard is not None, reason="zstandard is installed")
+def test_zstandard_is_optional(tmp_path):
+    """Test that zstandard notes fail clearly when it is not installed."""
+    (tmp_path / "Note.md").write_text("Text")
+
+    with pytest.raises(CompressionUnavailableError):
+        archive_notes(tmp_path, days=0, suffix=ZSTD_SUFFIX)
+    assert (tmp_path / "Note.md").exists()
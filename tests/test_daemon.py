@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+from terdo.utils.daemon import VaultDaemon, connect_to_daemon
+
+
+def start_daemon(root) -> tuple[VaultDaemon, threading.Thread]:
+    daemon = VaultDaemon(root, poll_interval=60)
+    thread = threading.Thread(target=asyncio.run, args=(daemon.serve(),))
+    thread.start()
+    for _ in range(100):
+        client = connect_to_daemon(root)
+        if client is not None:
+            client.close()
+            break
+        time.sleep(0.05)
+    return daemon, thread
+
+
+def test_daemon_serves_scans_and_changes(tmp_path, monkeypatch):
+    """Test that clients get the scanned tree and hear about changes."""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+    root = tmp_path / "vault"
+    (root / "Project").mkdir(parents=True)
+    (root / "Project" / "_index.md").write_text("---\ntags: ops\n---\n")
+    (root / "Project" / "Step.md").write_text("See [[Other]]")
+    (root / "Other.md").write_text("Notes")
+
+    assert connect_to_daemon(root) is None
+    daemon, thread = start_daemon(root)
+    client = connect_to_daemon(root)
+    try:
+        assert client is not None
+        tasks = {task.name: task for task in client.scan(root)}
+        assert set(tasks) == {"Project", "Other"}
+        project = tasks["Project"]
+        assert project.visited("metadata").tags == {"ops"}
+        # Only the number of subtasks is sent, unless the subtree is asked for
+        assert project.children == []
+        assert project.to_task().n_subtasks == 1
+        (project,) = [
+            task
+            for task in client.scan(root, recursive=True)
+            if task.is_directory
+        ]
+        assert [child.name for child in project.children] == ["Step"]
+        (step,) = client.scan(root / "Project")
+        assert step.path == root / "Project" / "Step.md"
+        assert step.visited("links") == {"Other"}
+
+        changes = client.subscribe()
+        (root / "Other.md").write_text("Changed notes")
+        client.touched()
+        assert next(changes) == {root / "Other.md"}
+        (other,) = [task for task in client.scan(root) if task.name == "Other"]
+        assert other.visited("metadata").excerpt == "Changed notes"
+
+        # A scan right after a touch waits for the rescan it started
+        (root / "New.md").write_text("New")
+        client.touched()
+        assert "New" in {task.name for task in client.scan(root)}
+    finally:
+        if client is not None:
+            client.close()
+        daemon.stop()
+        thread.join()
+
+    assert connect_to_daemon(root) is None
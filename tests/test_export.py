@@ -0,0 +1,90 @@
+import json
+import os
+
+from terdo.utils import export
+from terdo.utils.export import ExportFormat, export_vault
+
+
+def make_vault(root):
+    """Creates a small vault with a task that has subtasks."""
+    (root / "Project").mkdir()
+    (root / "Project" / "_index.md").write_text(
+        "---\ntags: [ops]\ndue: 2025-04-01\n---\n# Project"
+    )
+    (root / "Project" / "Step.md").write_text("A *step*")
+    (root / "Loose.md").write_text("loose")
+
+
+def test_export_html_mirrors_hierarchy(tmp_path):
+    """Test that notes become linked HTML pages, in the vault's hierarchy."""
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    make_vault(vault)
+    output = tmp_path / "export"
+
+    result = export_vault(vault, output)
+
+    assert result.n_rendered == 3
+    project = (output / "Project" / "index.html").read_text()
+    assert "<h1>Project</h1>" in project
+    assert 'href="Step.html"' in project
+    step = (output / "Project" / "Step.html").read_text()
+    assert "<em>step</em>" in step
+    assert 'href="index.html">Project' in step
+    assert (output / "Loose.html").exists()
+
+
+def test_export_html_escapes_raw_html(tmp_path):
+    """Test that HTML written in a note is shown instead of included."""
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "Note.md").write_text("<script>alert(1)</script>\n\n*text*")
+    output = tmp_path / "export"
+
+    export_vault(vault, output)
+
+    page = (output / "Note.html").read_text()
+    assert "<script>" not in page
+    assert "&lt;script&gt;" in page
+    assert "<em>text</em>" in page
+
+
+def test_export_is_incremental(tmp_path):
+    """Test that only changed notes are rendered again, and removed ones go."""
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    make_vault(vault)
+    output = tmp_path / "export"
+    export_vault(vault, output)
+
+    result = export_vault(vault, output)
+    assert (result.n_rendered, result.n_unchanged) == (0, 3)
+
+    loose = vault / "Loose.md"
+    loose.write_text("changed")
+    os.utime(loose, (0, 12345))
+    (vault / "Project" / "Step.md").unlink()
+    (vault / "Project" / "Other.md").write_text("other")
+
+    result = export_vault(vault, output)
+    assert result.n_rendered == 3
+    assert result.n_removed == 1
+    assert not (output / "Project" / "Step.html").exists()
+    assert "changed" in (output / "Loose.html").read_text()
+
+
+def test_export_json_in_worker_processes(tmp_path, monkeypatch):
+    """Test the JSON export with metadata, rendered by a process pool."""
+    monkeypatch.setattr(export, "MIN_NOTES_FOR_POOL", 0)
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    make_vault(vault)
+    output = tmp_path / "export"
+
+    result = export_vault(vault, output, ExportFormat.JSON, max_workers=2)
+
+    assert result.n_rendered == 3
+    project = json.loads((output / "Project" / "index.json").read_text())
+    assert project["metadata"] == {"tags": ["ops"], "due": "2025-04-01"}
+    assert project["content"] == "# Project"
+    assert project["subtasks"] == ["Step.json"]
@@ -0,0 +1,144 @@
+from textual.app import App, ComposeResult
+
+from terdo.components.task_list import TaskList
+from terdo.components.task_overview import TaskOverview, load_matches
+from terdo.models.metadata import TaskMetadata, get_metadata_index
+from terdo.models.task import Task
+from terdo.utils.compression import compress_note
+from terdo.utils.grep import (
+    GrepResult,
+    compile_grep_pattern,
+    grep_note,
+    iter_grep,
+    iter_grep_rounds,
+)
+from terdo.utils.io import get_root_markdown_dir, set_root_markdown_dir
+
+
+class OverviewApp(App):
+    def __init__(self, markdown_dir) -> None:
+        self.markdown_dir = markdown_dir
+        super().__init__()
+
+    def compose(self) -> ComposeResult:
+        yield TaskOverview(markdown_dir=self.markdown_dir)
+
+
+class FakeWorker:
+    is_cancelled = False
+
+
+def test_grep_note_finds_first_line_and_counts(tmp_path):
+    """Test that a note reports its first matching line and all matches."""
+    note = tmp_path / "Note.md"
+    note.write_text("intro\nsee Deploy\nnothing\ndeploy deploy again\n")
+
+    result = grep_note(note, compile_grep_pattern("deploy"))
+    assert result.line_number == 2
+    assert result.line == "see Deploy"
+    assert result.n_matches == 2
+
+    # Like smartcase, an uppercase letter makes the search case sensitive
+    assert grep_note(note, compile_grep_pattern("Deploy")).n_matches == 1
+    assert grep_note(note, compile_grep_pattern("missing")) is None
+
+    compressed = compress_note(note)
+    result = grep_note(compressed, compile_grep_pattern("again$"))
+    assert (result.line_number, result.n_matches) == (4, 1)
+
+
+def test_iter_grep_caps_and_cancels(tmp_path):
+    """Test that a vault search stops at the cap or when cancelled."""
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "Hidden.md").write_text("match")
+    (tmp_path / "Project").mkdir()
+    for i in range(10):
+        (tmp_path / "Project" / f"Step {i}.md").write_text("match")
+    (tmp_path / "Other.md").write_text("other")
+
+    pattern = compile_grep_pattern("match")
+    results = list(iter_grep(tmp_path, pattern, max_workers=2))
+    assert len(results) == 10
+    assert all(result.path.parent.name == "Project" for result in results)
+
+    assert len(list(iter_grep(tmp_path, pattern, max_results=3))) == 3
+    # Rounds without matches are yielded too, so callers can flush
+    other = compile_grep_pattern("other")
+    rounds = list(iter_grep_rounds(tmp_path, other, max_workers=1))
+    assert sum(map(len, rounds)) == 1
+    assert [] in rounds
+    cancelled = iter_grep(tmp_path, pattern, lambda: True, max_workers=1)
+    assert len(list(cancelled)) < 10
+
+
+async def test_overview_streams_grep_results(tmp_path):
+    """Test that a content search shows every matching note with context."""
+    (tmp_path / "Project").mkdir()
+    (tmp_path / "Project" / "_index.md").write_text("plan\nthe release\n")
+    (tmp_path / "Project" / "Step.md").write_text("release notes")
+    (tmp_path / "Other.md").write_text("nothing here")
+
+    previous_root = get_root_markdown_dir()
+    set_root_markdown_dir(tmp_path)
+    app = OverviewApp(tmp_path)
+    try:
+        async with app.run_test() as pilot:
+            overview = app.query_one(TaskOverview)
+            task_list = app.query_one(TaskList)
+
+            await overview.search_tasks("/releas")
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            names = {item.task_instance.name for item in task_list.children}
+            assert names == {"Project", "Step"}
+            rows = list(task_list.children)
+
+            # Later matches are added below the rows that are shown
+            other = GrepResult(tmp_path / "Other.md", 1, "nothing here", 1)
+            await overview.show_grep_results(
+                FakeWorker(), load_matches([other]), tmp_path
+            )
+            assert list(task_list.children)[:2] == rows
+            assert task_list.children[2].task_instance.name == "Other"
+            project = tmp_path / "Project"
+            assert task_list.match_context[project] == (
+                "Project/_index.md:2: the release"
+            )
+
+            await overview.search_tasks("Other")
+            assert task_list.match_context == {}
+            assert overview.grep_tasks == []
+    finally:
+        set_root_markdown_dir(previous_root)
+
+
+async def test_overview_loads_matches_off_the_event_loop(tmp_path, monkeypatch):
+    """Test that rows of matches in other directories don't walk subtrees."""
+    (tmp_path / "Project" / "Phase").mkdir(parents=True)
+    (tmp_path / "Project" / "_index.md").write_text("release plan")
+    (tmp_path / "Project" / "Phase" / "_index.md").write_text("phase")
+    (tmp_path / "Project" / "Phase" / "Step.md").write_text("step")
+    index_path = tmp_path / "Project" / "_index.md"
+    get_metadata_index().update(index_path, TaskMetadata(tags={"ops"}))
+
+    previous_root = get_root_markdown_dir()
+    set_root_markdown_dir(tmp_path)
+    app = OverviewApp(tmp_path)
+    try:
+        async with app.run_test() as pilot:
+            overview = app.query_one(TaskOverview)
+            task_list = app.query_one(TaskList)
+            monkeypatch.setattr(Task, "children", property(lambda task: 1 / 0))
+
+            await overview.search_tasks("/release")
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            (row,) = task_list.children
+            assert row.task_instance.n_subtasks == 1
+
+            await overview.search_tasks("tag:ops proj")
+            (row,) = task_list.children
+            assert row.task_instance.size == len("release planphasestep")
+    finally:
+        get_metadata_index().remove(index_path)
+        set_root_markdown_dir(previous_root)
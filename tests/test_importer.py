@@ -0,0 +1,59 @@
+from terdo.models.task import load_tasks_in_dir
+from terdo.utils.importer import (
+    import_outline,
+    parse_csv_outline,
+    parse_markdown_outline,
+    parse_todo_txt,
+)
+
+
+def test_parse_markdown_outline_nesting():
+    """Test that headings and indented list items become subtasks."""
+    outline = (
+        "# Project\n- First\n  - Nested\n    Some notes\n- [x] Second\n# Other"
+    )
+
+    items = parse_markdown_outline(outline)
+
+    assert [item.name for item in items] == ["Project", "Other"]
+    first, second = items[0].children
+    assert first.name == "First"
+    assert first.children[0].name == "Nested"
+    assert first.children[0].content == "Some notes\n"
+    assert second.name == "Second"
+
+
+def test_parse_todo_txt_groups_projects():
+    """Test that todo.txt lines are grouped by their project."""
+    items = parse_todo_txt(
+        "(A) 2024-01-01 Call mom +family\nx 2024-01-02 Pay rent\n"
+    )
+
+    assert [item.name for item in items] == ["family", "Pay rent"]
+    assert items[0].children[0].name == "Call mom +family"
+    assert items[1].content == "x 2024-01-02 Pay rent\n"
+
+
+def test_parse_csv_outline_depth():
+    """Test that the depth column nests CSV rows."""
+    items = parse_csv_outline("name,depth\nA,0\nB,1\nC,0\n")
+
+    assert [item.name for item in items] == ["A", "C"]
+    assert items[0].children[0].name == "B"
+
+
+def test_import_outline_creates_unique_tasks(tmp_path):
+    """Test that importing creates task files and directories."""
+    target_dir = tmp_path / "tasks"
+    target_dir.mkdir()
+    (target_dir / "Same.md").touch()
+
+    source = tmp_path / "outline.md"
+    source.write_text("- Same\n- Parent\n  - Child\n  - Child\n")
+
+    assert import_outline(source, target_dir) == 4
+
+    tasks = {task.name: task for task in load_tasks_in_dir(target_dir)}
+    assert set(tasks) == {"Same", "Same 1", "Parent"}
+    children = {task.name for task in tasks["Parent"].children}
+    assert children == {"Child", "Child 1"}
@@ -1,4 +1,16 @@
-from terdo.utils.io import add_markdown_extension
+import os
+from pathlib import Path
+
+import pytest
+
+from terdo.utils.io import (
+    NameAllocator,
+    add_markdown_extension,
+    get_state_dir,
+    iter_text_chunks,
+    strip_lines,
+    write_lines,
+)
 
 
 def test_add_markdown_extension():
@@ -8,3 +20,49 @@ def test_add_markdown_extension():
 
     result = add_markdown_extension(before)
     assert result == expected
+
+
+def test_name_allocator_adds_counter_to_taken_names():
+    """Test that names that are taken get a unique counter suffix."""
+    allocator = NameAllocator(["Groceries", "Groceries 1"])
+
+    assert allocator.allocate("Groceries") == "Groceries 2"
+    assert allocator.allocate("Groceries") == "Groceries 3"
+    assert allocator.allocate("Laundry") == "Laundry"
+    assert allocator.allocate("_index") == "_index 1"
+
+
+def test_iter_text_chunks_splits_at_line_boundaries(tmp_path: Path):
+    """Test that a file is read in chunks that each end with a newline."""
+    text = "".join(f"Regel {i} met een ë\r\n" for i in range(100))
+    path = tmp_path / "note.md"
+    path.write_bytes(text.encode("utf-8"))
+
+    chunks = list(iter_text_chunks(path, chunk_bytes=64))
+
+    assert len(chunks) > 1
+    assert all(chunk.endswith("\r\n") for chunk in chunks)
+    assert "".join(chunks) == text
+
+
+def test_write_lines_matches_stripped_text(tmp_path: Path):
+    """Test that streaming stripped lines gives the same file as strip()."""
+    text = "\n  \n  First line\nSecond line  \n\n"
+    path = tmp_path / "note.md"
+    path.write_text("old content")
+
+    write_lines(path, strip_lines(text.split("\n")))
+
+    assert path.read_text() == text.strip()
+    assert list(strip_lines(["", "   "])) == []
+
+
+def test_state_dir_must_be_private(tmp_path, monkeypatch):
+    """Test that a state directory others can access is not used."""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    state_dir = get_state_dir()
+    assert state_dir == tmp_path / "terdo"
+
+    os.chmod(state_dir, 0o777)
+    with pytest.raises(PermissionError):
+        get_state_dir()
@@ -0,0 +1,85 @@
+from terdo.models.links import (
+    LinkIndex,
+    get_link_index,
+    parse_wikilinks,
+    read_task_links,
+    replace_wikilinks,
+    wikilink_target,
+    wikilinks_to_markdown,
+)
+from terdo.models.metadata import read_task_metadata
+from terdo.models.task import Task
+from terdo.utils.scan import combine_visitors, scan_tree
+
+
+def test_parse_and_replace_wikilinks():
+    """Test finding links, with shown texts and headings, and renaming them."""
+    content = "See [[Groceries]], [[groceries|the list]] and [[Plan#Week]]."
+
+    assert parse_wikilinks(content) == {"Groceries", "groceries", "Plan"}
+    assert replace_wikilinks(content, "Groceries", "Shopping") == (
+        "See [[Shopping]], [[Shopping|the list]] and [[Plan#Week]]."
+    )
+
+    markdown = wikilinks_to_markdown("Go to [[Weekly plan|plan]]")
+    assert markdown == "Go to [plan](wikilink:Weekly%20plan)"
+    assert wikilink_target("wikilink:Weekly%20plan") == "Weekly plan"
+    assert wikilink_target("https://example.com") is None
+
+
+def test_link_index_backlinks(tmp_path):
+    """Test that backlinks follow updates, moves of directories and removals."""
+    index = LinkIndex()
+    note = tmp_path / "Note.md"
+    project = tmp_path / "Project" / "_index.md"
+    index.update(note, frozenset({"Project"}))
+    index.update(project, frozenset({"note"}))
+
+    assert index.backlinks("project") == {note}
+    assert index.backlinks("Note") == {project}
+    assert index.resolve("PROJECT") == project
+
+    index.move(tmp_path / "Project", tmp_path / "Renamed")
+    renamed = tmp_path / "Renamed" / "_index.md"
+    assert index.resolve("Project") is None
+    assert index.resolve("Renamed") == renamed
+    assert index.backlinks("Note") == {renamed}
+
+    index.remove(note)
+    assert index.backlinks("Project") == set()
+
+
+def test_scan_builds_both_indexes(tmp_path):
+    """Test that one scan with combined visitors fills the link index."""
+    (tmp_path / "A.md").write_text("---\nstatus: open\n---\nLinks to [[B]]")
+    (tmp_path / "B.md").write_text("No links")
+
+    tasks = scan_tree(
+        tmp_path,
+        visit=combine_visitors(
+            metadata=read_task_metadata, links=read_task_links
+        ),
+    )
+    index = LinkIndex()
+    index.add_scanned(tasks)
+
+    assert index.backlinks("B") == {tmp_path / "A.md"}
+    assert index.resolve("B") == tmp_path / "B.md"
+    by_name = {task.name: task for task in tasks}
+    assert by_name["A"].visited("metadata").status == "open"
+
+
+def test_task_changes_update_link_index(tmp_path):
+    """Test that writing and renaming a task keeps the global index current."""
+    (tmp_path / "Source.md").touch()
+    (tmp_path / "Target.md").touch()
+    source = Task(name="Source", dir=tmp_path)
+    source.write("Depends on [[Target]]")
+
+    assert get_link_index().backlinks("Target") == {tmp_path / "Source.md"}
+
+    source.rename("Renamed")
+    assert get_link_index().backlinks("Target") == {tmp_path / "Renamed.md"}
+
+    source.delete()
+    assert get_link_index().backlinks("Target") == set()
@@ -0,0 +1,182 @@
+import os
+from datetime import date
+
+from terdo.models import metadata
+from terdo.models.metadata import (
+    EXCERPT_SOURCE_CHARS,
+    MetadataIndex,
+    MetadataQuery,
+    TaskMetadata,
+    get_metadata_index,
+    make_excerpt,
+    read_front_matter,
+    read_note_head,
+    read_task_metadata,
+    split_front_matter,
+)
+from terdo.models.task import Task
+from terdo.utils.scan import combine_visitors, scan_tree
+
+
+def test_split_front_matter():
+    """Test parsing scalars, flow lists and block lists in front matter."""
+    content = (
+        "---\n"
+        "tags: [ops, Infra]\n"
+        "due: 2025-03-01\n"
+        "owners:\n"
+        "  - alice\n"
+        "  - bob\n"
+        "---\n"
+        "# Body"
+    )
+
+    front_matter, body = split_front_matter(content)
+
+    assert front_matter == {
+        "tags": ["ops", "Infra"],
+        "due": date(2025, 3, 1),
+        "owners": ["alice", "bob"],
+    }
+    assert body == "# Body"
+
+
+def test_read_front_matter_without_front_matter(tmp_path):
+    """Test that notes without front matter have no metadata."""
+    path = tmp_path / "note.md"
+    path.write_text("# Just a note\n---\n")
+
+    assert read_front_matter(path) == {}
+
+
+def test_read_note_head_excerpt(tmp_path):
+    """Test that the excerpt skips markup and only the head is read."""
+    assert make_excerpt("# Title\n\n- [ ] **Buy** milk\n") == "**Buy** milk"
+    assert make_excerpt("# Only a heading\n") == "Only a heading"
+
+    path = tmp_path / "note.md"
+    path.write_text(
+        "---\nstatus: open\n---\n\n"
+        + "\n" * EXCERPT_SOURCE_CHARS
+        + "Too far down\n"
+    )
+    assert read_note_head(path) == ({"status": "open"}, "")
+
+    index = MetadataIndex()
+    path.write_text("> Quoted first line\n")
+    assert index.get_or_read(path).excerpt == "Quoted first line"
+
+    # Changes outside of the app are read again
+    path.write_text("Changed")
+    assert index.get_or_read(path).excerpt == "Changed"
+
+
+def test_get_or_read_only_reads_changed_notes(tmp_path, monkeypatch):
+    """Test that an unchanged note is not read again."""
+    path = tmp_path / "note.md"
+    path.write_text("First")
+    index = MetadataIndex()
+    index.update(path, TaskMetadata(excerpt="Indexed"))
+    reads = []
+
+    def read(path):
+        reads.append(path)
+        return TaskMetadata(excerpt=path.read_text())
+
+    monkeypatch.setattr(metadata, "read_task_metadata", read)
+
+    assert index.get_or_read(path).excerpt == "Indexed"
+    assert index.get_or_read(path).excerpt == "Indexed"
+    assert reads == []
+
+    os.utime(path, ns=(0, 0))
+    assert index.get_or_read(path).excerpt == "First"
+    assert index.get_or_read(path).excerpt == "First"
+    assert reads == [path]
+
+
+def test_metadata_query_parse():
+    """Test parsing filters and free text from a search query."""
+    query = MetadataQuery.parse(
+        "deploy tag:ops due:<7d status:Open", today=date(2025, 1, 1)
+    )
+
+    assert query.text == "deploy"
+    assert query.tags == ["ops"]
+    assert query.status == "open"
+    assert query.due_from is None
+    assert query.due_until == date(2025, 1, 7)
+
+
+def test_metadata_index_query(tmp_path):
+    """Test that queries combine tag and due date filters."""
+    index = MetadataIndex()
+    a, b, c = tmp_path / "a.md", tmp_path / "b.md", tmp_path / "c.md"
+    index.update(a, TaskMetadata(tags=frozenset({"ops"}), due=date(2025, 1, 3)))
+    index.update(b, TaskMetadata(tags=frozenset({"ops"}), due=date(2025, 2, 1)))
+    index.update(c, TaskMetadata(due=date(2025, 1, 2)))
+
+    today = date(2025, 1, 1)
+    assert index.query(MetadataQuery.parse("tag:ops", today)) == {a, b}
+    assert index.query(MetadataQuery.parse("due:<7d", today)) == {a, c}
+    assert index.query(MetadataQuery.parse("tag:ops due:<7d", today)) == {a}
+
+    index.move(a, tmp_path / "d.md")
+    assert index.query(MetadataQuery.parse("tag:ops due:<7d", today)) == {
+        tmp_path / "d.md"
+    }
+
+
+def test_task_write_updates_index(tmp_path):
+    """Test that writing a note updates the global metadata index."""
+    (tmp_path / "note.md").touch()
+    task = Task(name="note", dir=tmp_path)
+
+    task.write("---\ntags: urgent\n---\nbody")
+
+    query = MetadataQuery.parse("tag:urgent")
+    assert get_metadata_index().query(query) == {tmp_path / "note.md"}
+
+    task.delete()
+    assert get_metadata_index().query(query) == set()
+
+
+def test_metadata_index_moves_directories(tmp_path):
+    """Test that moving a directory moves the notes below it only."""
+    index = MetadataIndex()
+    inside = tmp_path / "Project" / "Phase" / "Step.md"
+    sibling = tmp_path / "Projects.md"
+    index.update(inside, TaskMetadata(status="open"))
+    index.update(sibling, TaskMetadata(status="open"))
+
+    index.move(tmp_path / "Project", tmp_path / "Renamed")
+
+    moved = tmp_path / "Renamed" / "Phase" / "Step.md"
+    assert index.query(MetadataQuery.parse("status:open")) == {moved, sibling}
+    assert inside not in index
+
+
+def test_replace_scanned_keeps_changes_made_during_the_scan(tmp_path):
+    """Test that a vault scan doesn't undo changes that it overlapped."""
+    index = MetadataIndex()
+    saved, gone, renamed = (tmp_path / f"{name}.md" for name in "abc")
+    for path in (saved, gone, renamed):
+        path.write_text("---\nstatus: old\n---\n")
+        index.update(path, TaskMetadata(status="old"))
+
+    visit = combine_visitors(metadata=read_task_metadata)
+    with index.track_changes() as changed:
+        tasks = scan_tree(tmp_path, visit=visit)
+        # Changes made by the app after the scan read the notes
+        index.update(saved, TaskMetadata(status="new"))
+        index.move(renamed, tmp_path / "d.md")
+        gone.unlink()
+        index.replace_scanned(tasks, changed)
+
+    assert index.get(saved).status == "new"
+    assert renamed not in index
+    assert index.get(tmp_path / "d.md").status == "old"
+    # Removed from disk without the app knowing, so the scan decides
+    assert gone in index
+    index.replace_scanned(scan_tree(tmp_path, visit=visit), set())
+    assert gone not in index
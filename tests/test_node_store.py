@@ -0,0 +1,56 @@
+from terdo.models.node_store import ROOT_INDEX, NodeStore
+from terdo.utils.scan import scan_tasks_in_dir, scan_tree
+
+
+def test_node_store_materializes_tasks(tmp_path):
+    """Test that tasks are rebuilt with the right location and stats."""
+    (tmp_path / "Project" / "Phase").mkdir(parents=True)
+    (tmp_path / "Project" / "_index.md").write_text("project")
+    (tmp_path / "Project" / "Phase" / "_index.md").write_text("phase")
+    (tmp_path / "Project" / "Phase" / "Step.md").write_text("step")
+    (tmp_path / "Project" / "Other.md").write_text("other")
+    (tmp_path / "Loose.md").write_text("loose")
+
+    store = NodeStore.scan(tmp_path, max_workers=2)
+
+    assert len(store) == 5
+    root_tasks = list(store.tasks())
+    expected = scan_tasks_in_dir(tmp_path)
+    assert [task.name for task in root_tasks] == [t.name for t in expected]
+
+    project = next(i for i in store.children() if store.names[i] == "Project")
+    assert store.n_subtasks[project] == 2
+    phase = next(
+        i for i in store.children(project) if store.names[i] == "Phase"
+    )
+    (step,) = store.tasks(phase)
+    assert step.dir == tmp_path / "Project" / "Phase"
+    assert step.content == "step"
+
+
+def test_node_store_finds_dirs_and_rebuilds_scans(tmp_path):
+    """Test that the scanned tree of a directory can be rebuilt."""
+    (tmp_path / "Project" / "Phase").mkdir(parents=True)
+    (tmp_path / "Project" / "_index.md").write_text("project")
+    (tmp_path / "Project" / "Phase" / "_index.md").write_text("phase")
+    (tmp_path / "Project" / "Phase" / "Step.md").write_text("step")
+    (tmp_path / "Loose.md.gz").write_bytes(b"")
+
+    scanned = scan_tree(tmp_path)
+    store = NodeStore.from_scan(tmp_path, scanned)
+
+    assert store.find_dir(tmp_path) == ROOT_INDEX
+    assert store.find_dir(tmp_path / "Loose") is None
+    assert store.find_dir(tmp_path / "Elsewhere") is None
+    phase = store.find_dir(tmp_path / "Project" / "Phase")
+    assert store.names[phase] == "Phase"
+
+    rebuilt = [store.scanned(index) for index in store.children()]
+    assert rebuilt == scanned
+    project = next(task for task in rebuilt if task.name == "Project")
+    shallow = store.scanned(
+        store.find_dir(tmp_path / "Project"), tmp_path, False
+    )
+    assert shallow.children == []
+    assert shallow.to_task().n_subtasks == 1
+    assert shallow.to_task().size == project.size
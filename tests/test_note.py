@@ -0,0 +1,112 @@
+import asyncio
+
+from textual.app import App, ComposeResult
+from textual.widgets import Markdown, TextArea
+
+from terdo.components.note import (
+    Note,
+    NoteEditor,
+    NotePreview,
+    split_markdown_blocks,
+)
+from terdo.models.links import get_link_index
+from terdo.models.task import Task
+from terdo.utils.instrumentation import COUNTERS, reset_counters
+from terdo.utils.io import LARGE_FILE_BYTES
+
+
+class PreviewApp(App):
+    def compose(self) -> ComposeResult:
+        yield NotePreview()
+
+
+class NoteApp(App):
+    def compose(self) -> ComposeResult:
+        yield Note()
+
+
+def test_split_markdown_blocks():
+    """Test that every top-level block keeps its own source text."""
+    content = (
+        "# Title\n\nFirst paragraph\nstill first\n\n"
+        "- a\n- b\n\n```\ncode\n\n```\n"
+    )
+
+    assert split_markdown_blocks(content) == [
+        "# Title\n",
+        "First paragraph\nstill first\n",
+        "- a\n- b\n\n",
+        "```\ncode\n\n```\n",
+    ]
+
+
+async def test_preview_renders_only_changed_blocks():
+    """Test that unchanged blocks keep their widgets."""
+    app = PreviewApp()
+
+    async with app.run_test():
+        preview = app.query_one(NotePreview)
+        await preview.show_blocks(["# A\n", "B\n", "C\n"])
+        first, _, last = preview.query_children(Markdown)
+
+        reset_counters()
+        await preview.show_blocks(["# A\n", "Changed\n", "New\n", "C\n"])
+
+        widgets = list(preview.query_children(Markdown))
+        assert len(widgets) == 4
+        assert widgets[0] is first
+        assert widgets[3] is last
+        assert COUNTERS["preview.blocks_rendered"] == 2
+
+        await preview.show_blocks(["C\n"])
+        assert list(preview.query_children(Markdown)) == [last]
+
+
+async def test_large_note_is_not_saved_while_loading(tmp_path):
+    """Test that saving waits for all chunks and keeps the line endings."""
+    line = "A line of a large note\r\n"
+    path = tmp_path / "Large.md"
+    path.write_bytes((line * (LARGE_FILE_BYTES // len(line) + 1)).encode())
+    original = path.read_bytes()
+    app = NoteApp()
+
+    async with app.run_test():
+        note = app.query_one(Note)
+        # Without rendering the whole note in the viewer
+        note.set_reactive(Note.task_item, Task(name="Large", dir=tmp_path))
+        editor = note.query_one("#note-editor", TextArea)
+
+        note.run_worker(note.action_edit())
+        while not note.loading_note:
+            await asyncio.sleep(0)
+        await note.save(NoteEditor.Save(editor, close_editor=False))
+        await app.workers.wait_for_complete()
+        assert path.read_bytes() == original
+
+        assert not note.loading_note
+        await note.save(NoteEditor.Save(editor, close_editor=False))
+        await app.workers.wait_for_complete()
+        # The space typed at the end is stripped with the last line ending
+        assert path.read_bytes() == original.removesuffix(b"\r\n")
+
+
+async def test_saving_a_note_updates_its_links(tmp_path):
+    """Test that links typed in the editor are indexed when it is saved."""
+    path = tmp_path / "A.md"
+    path.write_text("No links yet")
+    app = NoteApp()
+
+    try:
+        async with app.run_test():
+            note = app.query_one(Note)
+            note.task_item = Task(name="A", dir=tmp_path)
+            await note.action_edit()
+            editor = note.query_one("#note-editor", TextArea)
+            editor.text = "See [[B]]"
+
+            await note.save(NoteEditor.Save(editor, close_editor=True))
+            await app.workers.wait_for_complete()
+
+            assert get_link_index().backlinks("B") == {path}
+    finally:
+        get_link_index().remove(path)
@@ -0,0 +1,123 @@
+import os
+
+import pytest
+
+from terdo.models.task import Task, load_tasks_in_dir
+from terdo.utils.scan import scan_note_task, scan_tasks_in_dir, scan_tree
+
+
+def make_tree(root):
+    """Creates a small tree of tasks with nested subtasks."""
+    (root / "Project" / "Phase").mkdir(parents=True)
+    (root / "Project" / "_index.md").write_text("project")
+    (root / "Project" / "Phase" / "_index.md").write_text("phase")
+    (root / "Project" / "Phase" / "Step.md").write_text("step")
+    (root / "Project" / "Other.md").write_text("other")
+    (root / "Loose.md").write_text("loose")
+    (root / ".hidden").mkdir()
+    (root / "not a task").mkdir()
+
+
+def test_scan_tree_matches_sequential_loading(tmp_path):
+    """Test that a parallel scan finds the same tasks as loading them."""
+    make_tree(tmp_path)
+
+    scanned = scan_tasks_in_dir(tmp_path, max_workers=4)
+    loaded = load_tasks_in_dir(tmp_path)
+
+    assert [task.name for task in scanned] == [task.name for task in loaded]
+    for scanned_task, loaded_task in zip(scanned, loaded):
+        assert scanned_task.last_edited == loaded_task.last_edited
+        assert scanned_task.n_subtasks == loaded_task.n_subtasks
+        assert scanned_task.content == loaded_task.content
+
+
+def test_unscanned_task_walks_its_subtree_once(tmp_path, monkeypatch):
+    """Test that a task that wasn't scanned keeps the stats it computed."""
+    make_tree(tmp_path)
+    task = Task.from_note_path(tmp_path / "Project" / "_index.md")
+    size = task.size
+    last_edited = task.last_edited
+    assert size == sum(map(len, ["project", "phase", "step", "other"]))
+
+    monkeypatch.setattr(Task, "children", property(lambda task: 1 / 0))
+    assert (task.size, task.last_edited) == (size, last_edited)
+
+
+def test_scan_note_task_has_all_statistics(tmp_path, monkeypatch):
+    """Test that the task of a single note is loaded like a scanned one."""
+    make_tree(tmp_path)
+    loaded = {
+        task.name: (task.n_subtasks, task.size, task.last_edited)
+        for task in load_tasks_in_dir(tmp_path)
+    }
+
+    monkeypatch.setattr(Task, "children", property(lambda task: 1 / 0))
+    project = scan_note_task(tmp_path / "Project" / "_index.md")
+    loose = scan_note_task(tmp_path / "Loose.md")
+    assert scan_note_task(tmp_path / "Gone.md") is None
+
+    assert project.path_to_file == tmp_path / "Project" / "_index.md"
+    for task in (project, loose):
+        stats = (task.n_subtasks, task.size, task.last_edited)
+        assert stats == loaded[task.name]
+
+
+def test_scan_tree_counts_descendants(tmp_path):
+    """Test that the scan keeps the complete subtree of every task."""
+    make_tree(tmp_path)
+
+    tasks = {task.name: task for task in scan_tree(tmp_path, max_workers=1)}
+
+    assert tasks["Project"].n_descendants == 3
+    assert {child.name for child in tasks["Project"].children} == {
+        "Phase",
+        "Other",
+    }
+
+
+def test_scan_tree_passes_its_stats_to_visitors(tmp_path):
+    """Test that visitors get the stat of the note that the scan listed."""
+    make_tree(tmp_path)
+    visited = {}
+
+    def visit(path, stat):
+        visited[path] = stat.st_mtime_ns
+        return stat.st_size
+
+    tasks = {
+        task.name: task
+        for task in scan_tree(tmp_path, max_workers=1, visit_with_stat=visit)
+    }
+
+    assert tasks["Loose"].data == len("loose")
+    assert visited == {
+        path: path.stat().st_mtime_ns for path in tmp_path.rglob("*.md")
+    }
+    with pytest.raises(ValueError):
+        scan_tree(tmp_path, visit=print, visit_with_stat=visit)
+
+
+def test_scan_tree_skips_non_task_trees(tmp_path):
+    """Test that directories without an index are not descended into, and
+    that a directory that can't be listed doesn't stop the scan."""
+    make_tree(tmp_path)
+    (tmp_path / "not a task" / "assets" / "images").mkdir(parents=True)
+    (tmp_path / "Project" / "Locked").mkdir()
+    (tmp_path / "Project" / "Locked" / "_index.md").write_text("locked")
+    listed = []
+
+    def scandir(dir):
+        listed.append(dir)
+        if dir.name == "Locked":
+            raise PermissionError(dir)
+        return os.scandir(dir)
+
+    tasks = {task.name: task for task in scan_tree(tmp_path, scandir=scandir)}
+
+    assert tmp_path / "not a task" in listed
+    assert tmp_path / "not a task" / "assets" not in listed
+    assert {child.name for child in tasks["Project"].children} == {
+        "Phase",
+        "Other",
+    }
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from terdo.models.metadata import TaskMetadata, get_metadata_index
+from terdo.models.sorting import SortOrder, sort_tasks
+from terdo.utils.scan import scan_tasks_in_dir
+
+
+def make_tasks(dir):
+    for i, (name, content) in enumerate(
+        [("b", "x" * 10), ("a", "x"), ("c", "x" * 5)]
+    ):
+        path = dir / f"{name}.md"
+        path.write_text(content)
+        os.utime(path, (1000 + i, 1000 + i))
+    return scan_tasks_in_dir(dir)
+
+
+def test_sort_orders(tmp_path):
+    """Test sorting scanned tasks in different orders."""
+    tasks = make_tasks(tmp_path)
+
+    def names(order, limit=None):
+        return [task.name for task in sort_tasks(tasks, order, limit)]
+
+    assert names(SortOrder.LAST_EDITED) == ["c", "a", "b"]
+    assert names(SortOrder.NAME) == ["a", "b", "c"]
+    assert names(SortOrder.SIZE) == ["b", "c", "a"]
+    assert names(SortOrder.NAME, limit=2) == ["a", "b"]
+
+
+@pytest.fixture
+def pinned(tmp_path):
+    """Pins notes in the global metadata index, unpinning them afterwards."""
+    index = get_metadata_index()
+    paths = []
+
+    def pin(path, number):
+        index.update(path, TaskMetadata(pin=number))
+        paths.append(path)
+
+    yield pin
+    for path in paths:
+        index.remove(path)
+
+
+def test_sort_pinned_first(tmp_path, pinned):
+    """Test that pinned tasks come first, in the order of their pins."""
+    tasks = make_tasks(tmp_path)
+    pinned(tmp_path / "b.md", 2)
+    pinned(tmp_path / "a.md", 1)
+
+    names = [task.name for task in sort_tasks(tasks, SortOrder.PINNED)]
+
+    assert names == ["a", "b", "c"]
+
+
+def test_sort_order_cycles():
+    """Test that cycling through the sort orders wraps around."""
+    order = SortOrder.LAST_EDITED
+    for _ in SortOrder:
+        order = order.next()
+    assert order == SortOrder.LAST_EDITED
+    assert SortOrder("last-edited").label == "last edited"
@@ -0,0 +1,217 @@
+import asyncio
+import threading
+
+from textual import on
+from textual.app import App, ComposeResult
+
+from terdo.components import task_overview
+from terdo.components.task_list import (
+    ChangeNameInput,
+    TaskList,
+    offer_to_rewrite_links,
+)
+from terdo.components.task_overview import TaskOverview
+from terdo.models.links import get_link_index
+from terdo.models.sorting import SortOrder
+from terdo.models.task import Task
+from terdo.utils.mutations import get_mutation_queue
+
+
+class TaskListApp(App):
+    def __init__(self, markdown_dir) -> None:
+        self.markdown_dir = markdown_dir
+        self.n_rerenders = 0
+        self.highlighted = []
+        super().__init__()
+
+    def compose(self) -> ComposeResult:
+        yield TaskList(markdown_dir=self.markdown_dir)
+
+    @on(TaskList.RerenderTaskList)
+    def count_rerender(self) -> None:
+        self.n_rerenders += 1
+
+    @on(TaskList.Highlighted)
+    def record_highlight(self, event: TaskList.Highlighted) -> None:
+        self.highlighted.append(
+            None if event.item is None else event.item.task_instance.name
+        )
+
+
+class OverviewApp(App):
+    def __init__(self, markdown_dir) -> None:
+        self.markdown_dir = markdown_dir
+        super().__init__()
+
+    def compose(self) -> ComposeResult:
+        yield TaskOverview(markdown_dir=self.markdown_dir)
+
+
+def make_tasks(dir, names: list[str]) -> list[Task]:
+    for name in names:
+        (dir / f"{name}.md").touch()
+    return [Task(name=name, dir=dir) for name in names]
+
+
+async def test_reconcile_tasks_keeps_rows_and_highlight(tmp_path):
+    """Test that reconciling reuses rows and keeps the highlighted task."""
+    app = TaskListApp(tmp_path)
+
+    async with app.run_test():
+        task_list = app.query_one(TaskList)
+        a, b, c, d = make_tasks(tmp_path, ["a", "b", "c", "d"])
+
+        await task_list.reconcile_tasks([a, b, c])
+        rows = {item.task_instance.name: item for item in task_list.children}
+        task_list.index = 1
+
+        await task_list.reconcile_tasks([c, d, a, b])
+
+        names = [item.task_instance.name for item in task_list.children]
+        assert names == ["c", "d", "a", "b"]
+        for name in ["a", "b", "c"]:
+            assert task_list.children[names.index(name)] is rows[name]
+        assert task_list.highlighted_child is rows["b"]
+        assert [item.highlighted for item in task_list.children].count(
+            True
+        ) == 1
+
+        await task_list.reconcile_tasks([d])
+
+        assert [item.task_instance.name for item in task_list.children] == ["d"]
+        assert task_list.index == 0
+
+
+async def test_reconcile_tasks_to_empty_list(tmp_path):
+    """Test that an empty result removes all rows and the highlight."""
+    app = TaskListApp(tmp_path)
+
+    async with app.run_test() as pilot:
+        task_list = app.query_one(TaskList)
+        await task_list.reconcile_tasks(make_tasks(tmp_path, ["a", "b"]))
+        task_list.index = 1
+        await pilot.pause()
+
+        await task_list.reconcile_tasks([])
+        await pilot.pause()
+
+        assert len(task_list.children) == 0
+        assert task_list.index is None
+        assert app.highlighted[-1] is None
+
+        # Nothing was highlighted, but whoever shows the highlighted task
+        # still hears that there is none.
+        await task_list.reconcile_tasks([])
+        await pilot.pause()
+        assert app.highlighted[-2:] == [None, None]
+
+
+async def test_run_mutation_rolls_back_on_failure(tmp_path):
+    """Test that a failed change reloads the list, and others complete."""
+    app = TaskListApp(tmp_path)
+
+    async with app.run_test() as pilot:
+        task_list = app.query_one(TaskList)
+        (task,) = make_tasks(tmp_path, ["a"])
+        await task_list.reconcile_tasks([task])
+
+        # The directory doesn't exist, so the rename fails
+        task_list.run_mutation(
+            "rename the task", lambda: task.rename("missing/b")
+        )
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+
+        assert app.n_rerenders == 1
+        assert task.name == "a"
+        assert (tmp_path / "a.md").exists()
+
+        deleted = []
+        task_list.run_mutation(
+            "delete the task", task.delete, lambda: deleted.append(True)
+        )
+        await app.workers.wait_for_complete()
+
+        assert deleted == [True]
+        assert not (tmp_path / "a.md").exists()
+        assert app.n_rerenders == 1
+
+
+async def test_overview_shows_large_directories_a_page_at_a_time(
+    tmp_path, monkeypatch
+):
+    """Test that only the first page of a directory is sorted and shown."""
+    monkeypatch.setattr(task_overview, "TASK_PAGE_SIZE", 3)
+    monkeypatch.setattr(task_overview, "TASK_PAGE_MARGIN", 1)
+    app = OverviewApp(tmp_path)
+
+    async with app.run_test() as pilot:
+        overview = app.query_one(TaskOverview)
+        task_list = app.query_one(TaskList)
+        tasks = make_tasks(tmp_path, ["e", "c", "a", "d", "b", "g", "f"])
+
+        overview.task_sort_order = SortOrder.NAME
+        await overview.set_tasks(tasks)
+        names = [item.task_instance.name for item in task_list.children]
+        assert names == ["a", "b", "c"]
+
+        task_list.index = 2
+        await pilot.pause()
+        assert len(task_list.children) == 6
+
+        await overview.highlight_task(tasks[-2])
+        assert len(task_list.children) == 7
+        assert task_list.highlighted_child.task_instance.name == "g"
+
+
+async def test_rewriting_links_reports_back(tmp_path):
+    """Test that links are rewritten on confirmation, and the caller told."""
+    source = tmp_path / "A.md"
+    source.write_text("See [[B]]")
+    get_link_index().update(source, frozenset({"B"}))
+    app = TaskListApp(tmp_path)
+    rewritten = []
+
+    try:
+        async with app.run_test() as pilot:
+            task_list = app.query_one(TaskList)
+            offer_to_rewrite_links(
+                task_list, "B", "C", lambda: rewritten.append(True)
+            )
+            await pilot.pause()
+            await pilot.click("#rewrite")
+            await app.workers.wait_for_complete()
+    finally:
+        get_link_index().remove(source)
+
+    assert source.read_text() == "See [[C]]"
+    assert rewritten == [True]
+
+
+async def test_rename_changes_the_task_once_the_files_are_renamed(tmp_path):
+    """Test that the task of a row only changes after it was renamed."""
+    app = TaskListApp(tmp_path)
+
+    async with app.run_test() as pilot:
+        task_list = app.query_one(TaskList)
+        (task,) = make_tasks(tmp_path, ["a"])
+        await task_list.reconcile_tasks([task])
+        task_list.index = 0
+
+        # Holds up the mutations that are queued after this one
+        release = threading.Event()
+        blocker = asyncio.ensure_future(get_mutation_queue().run(release.wait))
+        task_list.action_rename_task()
+        await pilot.pause()
+        task_list.query_one(ChangeNameInput).value = "b"
+        await task_list.query_one(ChangeNameInput).action_submit()
+        await pilot.pause()
+
+        assert task.name == "a"
+        release.set()
+        await blocker
+        await app.workers.wait_for_complete()
+
+        assert task.name == "b"
+        assert task.path_to_file == tmp_path / "b.md"
+        assert (tmp_path / "b.md").exists()